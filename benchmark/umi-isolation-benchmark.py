@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+# Imports:
+import os
+import sys
+import argparse
+import functools
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import random
+import resource
+import shlex
+import shutil
+import tempfile
+import threading
+import time
+
+# The default primers and scaffolds of the generated reads. The reads are
+# built as SCAFFOLDF-UMI-PRIMERF-PRODUCT-PRIMERR-UMI-SCAFFOLDR, the reverse
+# primer and scaffold are added as their reverse complement.
+FORWARD_PRIMER = "GTGCCAGCAGCCGCGGTAA"
+REVERSE_PRIMER = "GGACTACCAGGGTATCTAAT"
+FORWARD_SCAFFOLD = "ACACTCTTTCCCTACACGACGCTCTTCCGATCT"
+REVERSE_SCAFFOLD = "GTGACTGGAGTTCAGACGTGTGCTCTTCCGATCT"
+
+# The functions of umi-isolation.py that are timed as separate stages. Older
+# versions of the script collect the umis in get_umi_collection itself, for
+# these the umi collection is not timed as a stage.
+STAGE_FUNCTIONS = [
+    "get_umi_buckets",
+    "restore_umi_collection",
+    "create_trivial_centroids",
+    "get_vsearch_derep",
+    "get_vsearch_sort_by_size",
+    "get_vsearch_cluster_size",
+    "get_native_derep_cluster_size",
+    "get_sorted_cluster_size",
+    "create_output_files",
+    "create_zip_archive",
+]
+
+
+def create_reverse_complement(line):
+    """
+    The create_reverse_complement function:
+        This function returns the reverse complement of a sequence of A, C, G
+        and T nucleotides.
+    """
+    return line[::-1].translate(str.maketrans("ACGT", "TGCA"))
+
+
+def create_random_sequence(generator, length):
+    """
+    The create_random_sequence function:
+        This function returns a random sequence of nucleotides.
+    """
+    return "".join(generator.choice("ACGT") for position in range(length))
+
+
+def add_read_errors(generator, read, error_rate):
+    """
+    The add_read_errors function:
+        This function replaces nucleotides of a read by another nucleotide,
+        every position has a chance of error_rate to be replaced. The distance
+        to the next error is drawn at once, so not every position needs its
+        own random number.
+    """
+    if error_rate > 0:
+        read = list(read)
+        position = int(generator.expovariate(error_rate))
+        while position < len(read):
+            read[position] = generator.choice(
+                "ACGT".replace(read[position], "")
+            )
+            position += 1 + int(generator.expovariate(error_rate))
+        return "".join(read)
+    else:
+        return read
+
+
+def create_amplicon_reads(
+    output_file,
+    format_string,
+    read_count,
+    umi_count,
+    umi_length,
+    product_length,
+    error_rate,
+    seed,
+    scaffolds,
+):
+    """
+    The create_amplicon_reads function:
+        This function writes a fasta or fastq file with read_count reads of
+        umi_count molecules. Every molecule has its own forward and reverse
+        umi and product. The number of reads per molecule follows a Zipf like
+        distribution, so there are a few abundant umis and many rare ones.
+        The reads are built as SCAFFOLDF-UMI-PRIMERF-PRODUCT-PRIMERR-UMI-
+        SCAFFOLDR, without the scaffolds when scaffolds is False, and get
+        sequencing errors at error_rate. The same seed always gives the same
+        reads.
+    """
+    generator = random.Random(seed)
+    molecules = []
+    for molecule_number in range(umi_count):
+        molecules.append(
+            (
+                create_random_sequence(generator, umi_length),
+                create_random_sequence(
+                    generator,
+                    max(1, product_length + generator.randint(-10, 10)),
+                ),
+                create_random_sequence(generator, umi_length),
+            )
+        )
+    weights = [
+        1 / (molecule_number + 1) for molecule_number in range(umi_count)
+    ]
+    reverse_primer = create_reverse_complement(REVERSE_PRIMER)
+    reverse_scaffold = create_reverse_complement(REVERSE_SCAFFOLD)
+    with open(output_file, "w") as read_file:
+        for read_number, molecule in enumerate(
+            generator.choices(molecules, weights=weights, k=read_count)
+        ):
+            forward_umi, product, reverse_umi = molecule
+            read = (
+                forward_umi
+                + FORWARD_PRIMER
+                + product
+                + reverse_primer
+                + reverse_umi
+            )
+            if scaffolds:
+                read = FORWARD_SCAFFOLD + read + reverse_scaffold
+            else:
+                pass
+            read = add_read_errors(generator, read, error_rate)
+            if format_string == "fastq":
+                read_file.write(
+                    "@read"
+                    + str(read_number)
+                    + "\n"
+                    + read
+                    + "\n+\n"
+                    + "I" * len(read)
+                    + "\n"
+                )
+            else:
+                read_file.write(
+                    ">read" + str(read_number) + "\n" + read + "\n"
+                )
+
+
+def load_umi_isolation(script_file):
+    """
+    The load_umi_isolation function:
+        This function imports umi-isolation.py from its file location, the
+        hyphen in its name prevents a normal import. The script loads the
+        umi_isolation package next to it, the stage functions live in its
+        isolation module. Older versions of the script hold the stage
+        functions themselves. It returns the loaded script and the module
+        with the stage functions.
+    """
+    specification = importlib.util.spec_from_file_location(
+        "umi_isolation_script", script_file
+    )
+    umi_isolation = importlib.util.module_from_spec(specification)
+    sys.modules["umi_isolation_script"] = umi_isolation
+    specification.loader.exec_module(umi_isolation)
+    return umi_isolation, sys.modules.get(
+        "umi_isolation.isolation", umi_isolation
+    )
+
+
+def get_timed_function(
+    stage_times, background_times, stage_name, stage_function
+):
+    """
+    The get_timed_function function:
+        This function wraps a stage function of umi-isolation.py, the time
+        spent in every call is added to stage_times. Calls in a background
+        thread, like the zip archive that is written while the umis are
+        clustered, overlap the other stages and are added to background_times
+        instead.
+    """
+
+    @functools.wraps(stage_function)
+    def timed_function(*arguments, **keyword_arguments):
+        if threading.current_thread() is threading.main_thread():
+            times = stage_times
+        else:
+            times = background_times
+        start_time = time.perf_counter()
+        try:
+            return stage_function(*arguments, **keyword_arguments)
+        finally:
+            times[stage_name] = (
+                times.get(stage_name, 0) + time.perf_counter() - start_time
+            )
+
+    return timed_function
+
+
+def get_file_digest(file_names):
+    """
+    The get_file_digest function:
+        This function returns a sha256 digest of the content of files, so the
+        output of two runs can be compared.
+    """
+    digest = hashlib.sha256()
+    for file_name in file_names:
+        with open(file_name, "rb") as digest_file:
+            digest.update(digest_file.read())
+    return digest.hexdigest()
+
+
+def run_case(script_file, case_arguments, work_directory, result_queue):
+    """
+    The run_case function:
+        This function runs umi-isolation.py once in a separate process, with
+        the stage functions wrapped by get_timed_function. It puts the total
+        time, the time of every stage and of every stage that ran in the
+        background, the peak memory use of the script and
+        of the vsearch processes, the number of files that were written and a
+        digest of the output files on result_queue.
+    """
+    umi_isolation, stage_module = load_umi_isolation(script_file)
+    stage_times = {}
+    background_times = {}
+    for stage_name in STAGE_FUNCTIONS:
+        if hasattr(stage_module, stage_name):
+            setattr(
+                stage_module,
+                stage_name,
+                get_timed_function(
+                    stage_times,
+                    background_times,
+                    stage_name,
+                    getattr(stage_module, stage_name),
+                ),
+            )
+        else:
+            pass
+    sys.argv = ["umi-isolation.py"] + case_arguments
+    start_time = time.perf_counter()
+    umi_isolation.main()
+    total_time = time.perf_counter() - start_time
+    file_count = sum(
+        len(files) for directory, directories, files in os.walk(work_directory)
+    )
+    result_queue.put(
+        {
+            "seconds": total_time,
+            "stages": stage_times,
+            "background_stages": background_times,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / 1024,
+            "vsearch_peak_rss_mb": resource.getrusage(
+                resource.RUSAGE_CHILDREN
+            ).ru_maxrss
+            / 1024,
+            "file_count": file_count,
+            "digest": get_file_digest(
+                [
+                    work_directory + "/output.tabular",
+                    work_directory + "/output.blast",
+                ]
+            ),
+        }
+    )
+
+
+def get_case_arguments(argvs, input_file, work_directory, process, method):
+    """
+    The get_case_arguments function:
+        This function returns the command line arguments of umi-isolation.py
+        for a single process and search method combination.
+    """
+    if process == "scaffold":
+        forward = FORWARD_SCAFFOLD
+        reverse = REVERSE_SCAFFOLD
+    else:
+        forward = FORWARD_PRIMER
+        reverse = REVERSE_PRIMER
+    return [
+        "-i",
+        input_file,
+        "-o",
+        work_directory + "/output.tabular",
+        "-z",
+        work_directory + "/zip/",
+        "-q",
+        work_directory + "/output.blast",
+        "-c",
+        work_directory + "/cluster/",
+        "-f",
+        argvs.format,
+        "-p",
+        process,
+        "-l",
+        str(argvs.umi_length),
+        "-s",
+        method,
+        "-a",
+        forward,
+        "-b",
+        reverse,
+        "-d",
+        str(argvs.identity_score),
+        "-u",
+        str(argvs.abundance),
+        "-t",
+        str(argvs.threads),
+    ] + shlex.split(argvs.tool_arguments)
+
+
+def run_benchmark(argvs):
+    """
+    The run_benchmark function:
+        This function generates the reads for every process, once with and
+        once without scaffolds, and runs every process and search method
+        combination in a separate process, so the peak memory use is measured
+        per run. It returns the results by case name.
+    """
+    spawn_context = multiprocessing.get_context("spawn")
+    results = {}
+    temporary_directory = tempfile.mkdtemp(prefix="umi-isolation-benchmark-")
+    try:
+        input_files = {}
+        for scaffolds in (True, False):
+            input_file = (
+                temporary_directory
+                + "/reads_"
+                + str(scaffolds).lower()
+                + "."
+                + argvs.format
+            )
+            create_amplicon_reads(
+                input_file,
+                argvs.format,
+                argvs.reads,
+                argvs.umis,
+                argvs.umi_length,
+                argvs.product_length,
+                argvs.error_rate,
+                argvs.seed,
+                scaffolds,
+            )
+            input_files[scaffolds] = input_file
+        for process in argvs.processes:
+            for method in argvs.search_methods:
+                case_name = process + "/" + method
+                work_directory = temporary_directory + "/" + process + method
+                os.makedirs(work_directory + "/zip")
+                os.makedirs(work_directory + "/cluster")
+                result_queue = spawn_context.Queue()
+                case_process = spawn_context.Process(
+                    target=run_case,
+                    args=(
+                        argvs.script,
+                        get_case_arguments(
+                            argvs,
+                            input_files[process == "scaffold"],
+                            work_directory,
+                            process,
+                            method,
+                        ),
+                        work_directory,
+                        result_queue,
+                    ),
+                )
+                case_process.start()
+                case_process.join()
+                if case_process.exitcode != 0:
+                    raise RuntimeError(
+                        "The benchmark case "
+                        + case_name
+                        + " failed with exit status "
+                        + str(case_process.exitcode)
+                    )
+                else:
+                    pass
+                result = result_queue.get()
+                result["reads_per_second"] = argvs.reads / result["seconds"]
+                results[case_name] = result
+                shutil.rmtree(work_directory)
+    finally:
+        shutil.rmtree(temporary_directory)
+    return results
+
+
+def print_results(results):
+    """
+    The print_results function:
+        This function prints the results of every case and the time of every
+        stage that was used.
+    """
+    print(
+        "{:<20}{:>10}{:>12}{:>10}{:>12}{:>8}".format(
+            "case", "seconds", "reads/s", "rss mb", "vsearch mb", "files"
+        )
+    )
+    for case_name, result in results.items():
+        print(
+            "{:<20}{:>10.2f}{:>12.0f}{:>10.1f}{:>12.1f}{:>8}".format(
+                case_name,
+                result["seconds"],
+                result["reads_per_second"],
+                result["peak_rss_mb"],
+                result["vsearch_peak_rss_mb"],
+                result["file_count"],
+            )
+        )
+        for stage_name, stage_time in sorted(
+            result["stages"].items(), key=lambda stage: -stage[1]
+        ):
+            print("    {:<36}{:>10.2f}".format(stage_name, stage_time))
+        for stage_name, stage_time in sorted(
+            result.get("background_stages", {}).items(),
+            key=lambda stage: -stage[1],
+        ):
+            print(
+                "    {:<36}{:>10.2f}".format(
+                    stage_name + " (background)", stage_time
+                )
+            )
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    The compare_results function:
+        This function compares the results with a stored baseline. A case is
+        a regression when its output differs from the baseline or when its
+        number of reads per second dropped by more than the tolerance. It
+        prints every regression and returns the number of regressions.
+    """
+    regressions = 0
+    for case_name, result in results.items():
+        if case_name in baseline:
+            baseline_result = baseline[case_name]
+            if result["digest"] != baseline_result["digest"]:
+                print(case_name + ": the output differs from the baseline")
+                regressions += 1
+            else:
+                pass
+            minimal_speed = baseline_result["reads_per_second"] * (
+                1 - tolerance
+            )
+            if result["reads_per_second"] < minimal_speed:
+                print(
+                    "{}: {:.0f} reads/s, baseline {:.0f} reads/s".format(
+                        case_name,
+                        result["reads_per_second"],
+                        baseline_result["reads_per_second"],
+                    )
+                )
+                regressions += 1
+            else:
+                pass
+        else:
+            print(case_name + ": not in the baseline")
+    return regressions
+
+
+def parse_argvs():
+    """
+    The parse_argvs function:
+        This function handles all positional arguments that the script accepts,
+        including version and help pages.
+    """
+    description = "A python script to benchmark umi-isolation.py on generated\
+                 amplicon reads."
+    epilog = "This python script runs umi-isolation.py, which depends on\
+              vsearch"
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--script",
+        action="store",
+        dest="script",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "..",
+            "src",
+            "umi-isolation.py",
+        ),
+        help="The location of the umi-isolation.py script to benchmark.",
+    )
+    parser.add_argument(
+        "--reads",
+        action="store",
+        dest="reads",
+        type=int,
+        default=100000,
+        help="The number of generated reads.",
+    )
+    parser.add_argument(
+        "--umis",
+        action="store",
+        dest="umis",
+        type=int,
+        default=5000,
+        help="The number of molecules with their own umis.",
+    )
+    parser.add_argument(
+        "--umi-length",
+        action="store",
+        dest="umi_length",
+        type=int,
+        default=8,
+        help="The length of the umi sequences.",
+    )
+    parser.add_argument(
+        "--product-length",
+        action="store",
+        dest="product_length",
+        type=int,
+        default=250,
+        help="The average length of the product between the primers.",
+    )
+    parser.add_argument(
+        "--error-rate",
+        action="store",
+        dest="error_rate",
+        type=float,
+        default=0.001,
+        help="The chance of a sequencing error at every read position.",
+    )
+    parser.add_argument(
+        "--seed",
+        action="store",
+        dest="seed",
+        type=int,
+        default=1,
+        help="The seed of the read generator.",
+    )
+    parser.add_argument(
+        "--format",
+        action="store",
+        dest="format",
+        choices=["fasta", "fastq"],
+        default="fasta",
+        help="The format of the generated reads.",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store",
+        dest="processes",
+        nargs="+",
+        choices=["primer", "scaffold", "zero"],
+        default=["primer", "scaffold", "zero"],
+        help="The umi search approaches to benchmark.",
+    )
+    parser.add_argument(
+        "--search-methods",
+        action="store",
+        dest="search_methods",
+        nargs="+",
+        choices=["umi5", "umi3", "umidouble"],
+        default=["umi5", "umi3", "umidouble"],
+        help="The umi search methods to benchmark.",
+    )
+    parser.add_argument(
+        "--identity-score",
+        action="store",
+        dest="identity_score",
+        default="0.97",
+        help="The identity percentage of the vsearch clustering.",
+    )
+    parser.add_argument(
+        "--abundance",
+        action="store",
+        dest="abundance",
+        type=int,
+        default=1,
+        help="The minimum abundance of a read.",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        action="store",
+        dest="threads",
+        type=int,
+        default=1,
+        help="The number of threads of umi-isolation.py.",
+    )
+    parser.add_argument(
+        "--tool-arguments",
+        action="store",
+        dest="tool_arguments",
+        default="",
+        help="Other arguments that are passed to umi-isolation.py, for\
+              example '--bucket-mode sort'.",
+    )
+    parser.add_argument(
+        "--output",
+        action="store",
+        dest="output",
+        help="The location of a json file to write the results to, it can be\
+              used as baseline of a later benchmark.",
+    )
+    parser.add_argument(
+        "--baseline",
+        action="store",
+        dest="baseline",
+        help="The location of a json file with the results of an earlier\
+              benchmark to compare with.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        action="store",
+        dest="tolerance",
+        type=float,
+        default=0.2,
+        help="The fraction of reads per second a case can lose compared to\
+              the baseline before it is a regression.",
+    )
+    parser.add_argument(
+        "-v", "--version", action="version", version="%(prog)s [1.0]"
+    )
+    argvs = parser.parse_args()
+    return argvs
+
+
+def main():
+    """
+    The main function:
+        This function runs the benchmark, prints the results, writes them to
+        the output file and compares them with the baseline. It exits with a
+        non-zero status when a regression is found.
+    """
+    argvs = parse_argvs()
+    results = run_benchmark(argvs)
+    print_results(results)
+    if argvs.output != None:
+        with open(argvs.output, "w") as output_file:
+            json.dump(results, output_file, indent=4, sort_keys=True)
+    else:
+        pass
+    if argvs.baseline != None:
+        with open(argvs.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare_results(results, baseline, argvs.tolerance) > 0:
+            sys.exit(1)
+        else:
+            pass
+    else:
+        pass
+
+
+if __name__ == "__main__":
+    main()
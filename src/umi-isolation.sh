@@ -22,54 +22,41 @@
 
 format_flow() {
     # The format_flow function.
-    #     This function creates two temporary storage directories in the output
-    #     directory. It then calls the umi-isolation.py script with the correct
-    #     input values. The output tabular file is copied to the expected
-    #     location and removed. The output blast file is copies to the expected
-    #     location and removed. A zip file is created of the generated
-    #     prevsearch fasta file and copied to the expected location. After that
-    #     the temporary storage directories are removed.
+    #     This function creates a temporary directory in the working directory
+    #     of the job, with two storage directories in it. It then calls the
+    #     umi-isolation.py script with the correct input values, the script
+    #     writes the pre-vsearch zip file to the expected location itself. The
+    #     output tabular file is copied to the expected location and removed.
+    #     The output blast file is copies to the expected location and
+    #     removed. After that the temporary directory is removed.
     script_directory=$(dirname "$(readlink -f "$0")")
-    directory_name=$(mktemp -d /media/GalaxyData/database/files/XXXXXX)
+    directory_name=$(mktemp -d "${PWD}/umi-isolation.XXXXXX")
     mkdir \
-        -p "${directory_name}_temp"
+        -p "${directory_name}/temp"
     mkdir \
-        -p "${directory_name}_cluster_check"
+        -p "${directory_name}/cluster_check"
     python3 \
         $script_directory"/umi-isolation.py" \
             -i ${input_file} \
-            -o ${directory_name}_temp/csv_temp_file.csv \
-            -z ${directory_name}_temp/ \
-            -q ${directory_name}_temp/blast_temp_file.fasta \
+            -o ${directory_name}/temp/csv_temp_file.csv \
+            -z ${directory_name}/temp/ \
+            -q ${directory_name}/temp/blast_temp_file.fasta \
             -f ${format} -p ${process} \
             -l ${umi_length} -s ${search_method} \
             -a ${forward} -b ${reverse} \
-            -c ${directory_name}_cluster_check/ \
+            -c ${directory_name}/cluster_check/ \
             -d ${identity_score} \
-            -u ${abundance}
-    cat ${directory_name}_temp/csv_temp_file.csv \
+            -u ${abundance} \
+            -t ${threads:-1} \
+            --zip-archive ${output_zip_file}
+    cat ${directory_name}/temp/csv_temp_file.csv \
         > ${output_tabular_file}
-    rm ${directory_name}_temp/csv_temp_file.csv
-    cat ${directory_name}_temp/blast_temp_file.fasta \
+    rm ${directory_name}/temp/csv_temp_file.csv
+    cat ${directory_name}/temp/blast_temp_file.fasta \
         > ${output_blast_file}
-    rm ${directory_name}_temp/blast_temp_file.fasta
-    find ${directory_name}_temp/ \
-        -name "derep*" \
-        -delete
-    find ${directory_name}_temp/ \
-        -name "sorted*" \
-        -delete
-    find ${directory_name}_temp/ \
-        -name "UMI#*" \
-        -print \
-        | zip \
-              -jqr ${directory_name}_temp/zip_temp_file.zip -@
-    cat ${directory_name}_temp/zip_temp_file.zip \
-        > ${output_zip_file}
+    rm ${directory_name}/temp/blast_temp_file.fasta
     rm \
-        -rf ${directory_name}_temp
-    rm \
-        -rf ${directory_name}_cluster_check
+        -rf ${directory_name}
 }
 
 main() {
@@ -80,7 +67,7 @@ main() {
 
 # The getopts function.
 # https://kodekloud.com/blog/bash-getopts/
-OPT_STRING=":i:o:z:q:p:f:l:s:a:b:d:u:vh"
+OPT_STRING=":i:o:z:q:p:f:l:s:a:b:d:u:t:vh"
 while getopts ${OPT_STRING} option;
 do
     case ${option} in
@@ -120,6 +107,9 @@ do
         u)
             abundance=${OPTARG}
             ;;
+        t)
+            threads=${OPTARG}
+            ;;
         v)
             echo ""
             echo "umi-isolation.sh [0.1.0]"
@@ -133,6 +123,8 @@ do
             echo "                        [-z ZIP] [-q BLAST] [-p PROCESS]"
             echo "                        [-f FORMAT] [-l LENGTH] [-s SEARCH]"
             echo "                        [-a FORWARD] [-b REVERSE]"
+            echo "                        [-d IDENTITY] [-u ABUNDANCE]"
+            echo "                        [-t THREADS]"
             echo ""
             echo "Optional arguments:"
             echo " -h          Show this help page and exit"
@@ -154,6 +146,7 @@ do
             echo "             the final vsearch check"
             echo " -u          The minimum abundance a read has to be order to"
             echo "             be part of the final vsearch check present in"
+            echo " -t          The number of threads the vsearch steps can use"
             echo ""
             echo "Use a python script to accumulate all umis and output a"
             echo "tabular file, a blast file and a zip file. The tabular file"
@@ -198,7 +191,6 @@ main
 # Prequisites:
 # - sudo apt-get install python3
 # - sudo apt-get install python3-pip
-# - sudo pip3 install pandas
 # - sudo apt-get install libargtable2-dev
 # - Download vsearch from GitHub
 # - Unpack downloaded file
@@ -0,0 +1,54 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+# Imports:
+from umi_isolation.api import (
+    iterate_records,
+    iterate_umi_buckets,
+    iterate_umi_centroids,
+    iterate_umi_reads,
+)
+from umi_isolation.isolation import (
+    RunOptions,
+    UmiMatcher,
+    create_reverse_complement,
+    get_target_behind,
+    get_target_front,
+    get_target_zero,
+    get_umi_code,
+    get_umi_collection,
+)
+
+__all__ = [
+    "iterate_records",
+    "iterate_umi_buckets",
+    "iterate_umi_centroids",
+    "iterate_umi_reads",
+    "RunOptions",
+    "UmiMatcher",
+    "create_reverse_complement",
+    "get_target_behind",
+    "get_target_front",
+    "get_target_zero",
+    "get_umi_code",
+    "get_umi_collection",
+]
+
+__version__ = "0.1.0"
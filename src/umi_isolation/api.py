@@ -0,0 +1,126 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+from umi_isolation.isolation import (
+    UmiMatcher,
+    get_input_compression,
+    get_umi_centroids,
+    get_umi_reads,
+    get_umi_string,
+    open_input,
+    read_records,
+)
+
+
+def iterate_records(input_file, format_string="fasta"):
+    """
+    The iterate_records function:
+        This function yields the (header, read, quality) records of a fasta or
+        fastq file, as bytes. Gzip, BGZF and zstandard compressed files are
+        decompressed on the way. The read header keeps its first character,
+        fasta records have no quality.
+    """
+    if format_string == "fastq":
+        operand = "@"
+    else:
+        operand = ">"
+    with open_input(input_file, get_input_compression(input_file)) as input:
+        yield from read_records(input, operand)
+
+
+def iterate_umi_reads(
+    records,
+    process,
+    umi_length,
+    search_method,
+    forward,
+    reverse,
+    max_mismatches=0,
+    distance_method="hamming",
+    both_strands=False,
+):
+    """
+    The iterate_umi_reads function:
+        This function searches the umis of records like iterate_records
+        yields them, with a UmiMatcher of the process, search method and
+        primers/scaffolds. It yields the umi, the read header and the read of
+        every read that contains a umi, reads without a umi are skipped. With
+        both_strands the reads of the minus strand are yielded as their
+        reverse complement.
+    """
+    umi_matcher = UmiMatcher(
+        process,
+        umi_length,
+        search_method,
+        forward,
+        reverse,
+        max_mismatches,
+        distance_method,
+        both_strands,
+    )
+    for umi_key, header, read in get_umi_reads(records, umi_matcher):
+        yield get_umi_string(umi_key), header, read
+
+
+def iterate_umi_buckets(umi_reads):
+    """
+    The iterate_umi_buckets function:
+        This function groups the reads of iterate_umi_reads by umi in memory.
+        It yields every umi with the list of its (header, read) pairs, in the
+        order in which the umis were first found.
+    """
+    umi_buckets = {}
+    for umi, header, read in umi_reads:
+        if umi in umi_buckets:
+            umi_buckets[umi].append((header, read))
+        else:
+            umi_buckets[umi] = [(header, read)]
+    yield from umi_buckets.items()
+
+
+def iterate_umi_centroids(
+    umi_buckets, identity_score, minimal_size_abundance=1, vsearch_threads=1
+):
+    """
+    The iterate_umi_centroids function:
+        This function makes the centroids of every umi of umi_buckets, pairs of
+        a umi and its (header, read) pairs like iterate_umi_buckets yields
+        them, with get_umi_centroids. It yields the umi, the centroid header
+        with its size annotation and the centroid read of every centroid.
+        Umis with more than one distinct read need vsearch.
+    """
+    for umi, umi_records in umi_buckets:
+        centroid_lines = iter(
+            get_umi_centroids(
+                umi_records,
+                str(identity_score),
+                str(minimal_size_abundance),
+                vsearch_threads,
+            )
+        )
+        for line in centroid_lines:
+            if line.startswith(">"):
+                centroid_header = line[1:].rstrip("\n")
+                centroid_read = next(centroid_lines).rstrip("\n")
+                yield umi, centroid_header, centroid_read
+            else:
+                pass
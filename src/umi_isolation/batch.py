@@ -0,0 +1,408 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import os
+import argparse
+import csv
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from umi_isolation import isolation
+
+# The columns every sample of a sample sheet needs, the identity score and
+# abundance columns are optional and default to the batch options. The
+# optional mate column holds the R2 input file of paired-end samples.
+SAMPLE_COLUMNS = [
+    "sample",
+    "input",
+    "format",
+    "process",
+    "umi_length",
+    "search_method",
+    "forward",
+    "reverse",
+]
+
+
+def is_identity_score(value):
+    """
+    The is_identity_score function:
+        This function checks that a value is a number from 0 to 1, the
+        identity vsearch accepts.
+    """
+    try:
+        return 0 <= float(value) <= 1
+    except ValueError:
+        return False
+
+
+def get_sample_option(sample, column_name, default):
+    """
+    The get_sample_option function:
+        This function returns the value of an optional column of a sample as
+        a string, or the default when the sample leaves it empty.
+    """
+    if sample.get(column_name) in [None, ""]:
+        return str(default)
+    else:
+        return str(sample[column_name])
+
+
+def read_sample_sheet(sample_sheet):
+    """
+    The read_sample_sheet function:
+        This function reads a tab separated sample sheet with a header line.
+        Every line is a sample with its input file, format, umi search
+        approach, umi length, search method and primers/scaffolds. It returns
+        the samples as dictionaries of the columns. A missing column, a
+        format, umi search approach or search method that the command line
+        does not accept, a umi length that is not a positive number, a
+        primer/scaffold with other characters than iupac nucleotide codes, an
+        identity score that is not a number from 0 to 1, an abundance that is
+        not a positive number, a missing input or mate file, a sample name that
+        is not a plain file name or a sample name that is used twice raises a
+        ValueError, before any sample is started.
+    """
+    with open(sample_sheet, newline="") as input:
+        samples = list(csv.DictReader(input, delimiter="\t"))
+    sample_names = set()
+    for line_number, sample in enumerate(samples, 2):
+        missing_columns = [
+            column_name
+            for column_name in SAMPLE_COLUMNS
+            if not sample.get(column_name)
+        ]
+        invalid_columns = [
+            column_name
+            for column_name, choices in [
+                ("format", isolation.FORMAT_CHOICES),
+                ("process", isolation.PROCESS_CHOICES),
+                ("search_method", isolation.SEARCH_METHOD_CHOICES),
+            ]
+            if sample.get(column_name) not in choices
+        ]
+        umi_length = sample.get("umi_length") or ""
+        if not umi_length.isdigit() or int(umi_length) == 0:
+            invalid_columns.append("umi_length")
+        else:
+            pass
+        for column_name in ["forward", "reverse"]:
+            primer = (sample.get(column_name) or "").upper()
+            if primer.strip(isolation.PRIMER_NUCLEOTIDES):
+                invalid_columns.append(column_name)
+            else:
+                pass
+        if not is_identity_score(sample.get("identity_score") or "0"):
+            invalid_columns.append("identity_score")
+        else:
+            pass
+        abundance = sample.get("abundance") or "1"
+        if not abundance.isdigit() or int(abundance) == 0:
+            invalid_columns.append("abundance")
+        else:
+            pass
+        if missing_columns:
+            raise ValueError(
+                "Line "
+                + str(line_number)
+                + " of the sample sheet has no "
+                + ", ".join(missing_columns)
+                + "."
+            )
+        elif invalid_columns:
+            raise ValueError(
+                "Line "
+                + str(line_number)
+                + " of the sample sheet has an invalid "
+                + ", ".join(invalid_columns)
+                + "."
+            )
+        elif (
+            "/" in sample["sample"]
+            or os.sep in sample["sample"]
+            or ".." in sample["sample"]
+        ):
+            raise ValueError(
+                "The sample name "
+                + sample["sample"]
+                + " of line "
+                + str(line_number)
+                + " of the sample sheet is not a plain file name."
+            )
+        elif not os.path.isfile(sample["input"]):
+            raise ValueError(
+                "The input file "
+                + sample["input"]
+                + " of line "
+                + str(line_number)
+                + " of the sample sheet does not exist."
+            )
+        elif sample.get("mate") and not os.path.isfile(sample["mate"]):
+            raise ValueError(
+                "The mate file "
+                + sample["mate"]
+                + " of line "
+                + str(line_number)
+                + " of the sample sheet does not exist."
+            )
+        elif sample["sample"] in sample_names:
+            raise ValueError(
+                "The sample "
+                + sample["sample"]
+                + " is in the sample sheet more than once."
+            )
+        else:
+            sample_names.add(sample["sample"])
+    return samples
+
+
+def get_sample_files(output_directory, sample_name):
+    """
+    The get_sample_files function:
+        This function returns the locations of the tabular, blast and zip
+        output files of a sample in the output directory.
+    """
+    sample_prefix = os.path.join(output_directory, sample_name)
+    return (
+        sample_prefix + ".tabular",
+        sample_prefix + ".blast.fasta",
+        sample_prefix + ".zip",
+    )
+
+
+def run_sample(
+    sample,
+    output_directory,
+    identity_score,
+    minimal_size_abundance,
+    derep_method,
+    vsearch_threads,
+):
+    """
+    The run_sample function:
+        This function runs get_umi_collection for a single sample of the
+        sample sheet, in a worker process of the batch. The umi files and
+        cluster files are written to a work directory of the sample, which is
+        removed when the tabular, blast and zip output files are written, or
+        when the sample fails. The
+        identity score and abundance of the sample sheet are used when the
+        sample has them. It returns the name of the sample.
+    """
+    tabular_file, output_blast_file, zip_archive = get_sample_files(
+        output_directory, sample["sample"]
+    )
+    work_directory = os.path.join(output_directory, sample["sample"] + "_work")
+    zip_file = os.path.join(work_directory, "temp") + "/"
+    cluster_directory = os.path.join(work_directory, "cluster_check") + "/"
+    shutil.rmtree(work_directory, ignore_errors=True)
+    os.makedirs(zip_file)
+    os.makedirs(cluster_directory)
+    if os.path.exists(output_blast_file):
+        os.remove(output_blast_file)
+    else:
+        pass
+    if sample["format"] == "fastq":
+        operand = "@"
+    else:
+        operand = ">"
+    try:
+        isolation.get_umi_collection(
+            sample["input"],
+            cluster_directory,
+            tabular_file,
+            zip_file,
+            output_blast_file,
+            sample["process"],
+            sample["umi_length"],
+            sample["search_method"],
+            sample["forward"],
+            sample["reverse"],
+            sample["format"],
+            operand,
+            get_sample_option(sample, "identity_score", identity_score),
+            get_sample_option(sample, "abundance", minimal_size_abundance),
+            isolation.RunOptions(
+                derep_method=derep_method,
+                threads=vsearch_threads,
+                vsearch_threads=vsearch_threads,
+            ),
+            zip_archive=zip_archive,
+            mate_file=sample.get("mate") or None,
+        )
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+    return sample["sample"]
+
+
+def run_batch(
+    samples,
+    output_directory,
+    processes,
+    identity_score,
+    minimal_size_abundance,
+    derep_method="vsearch",
+    vsearch_threads=1,
+):
+    """
+    The run_batch function:
+        This function runs every sample of the sample sheet on one shared pool
+        of worker processes, so Python is started and imported once per
+        worker instead of once per sample. The samples are started in the
+        order of decreasing input file size, the largest samples first, so
+        the small samples fill up the workers at the end of the batch. A
+        sample that fails does not stop the other samples, the failed samples
+        are raised as a RuntimeError when all samples are done.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    sample_jobs = []
+    with ProcessPoolExecutor(max_workers=max(1, int(processes))) as executor:
+        for sample in sorted(
+            samples,
+            key=lambda sample: os.path.getsize(sample["input"]),
+            reverse=True,
+        ):
+            sample_jobs.append(
+                (
+                    sample["sample"],
+                    executor.submit(
+                        run_sample,
+                        sample,
+                        output_directory,
+                        identity_score,
+                        minimal_size_abundance,
+                        derep_method,
+                        vsearch_threads,
+                    ),
+                )
+            )
+        failed_samples = []
+        for sample_name, sample_job in sample_jobs:
+            try:
+                sample_job.result()
+            except Exception as error:
+                failed_samples.append(sample_name + ": " + str(error))
+    if failed_samples:
+        raise RuntimeError(
+            "The following samples failed:\n" + "\n".join(failed_samples)
+        )
+    else:
+        pass
+
+
+def parse_argvs():
+    """
+    The parse_argvs function:
+        This function handles all positional arguments that the script accepts,
+        including version and help pages.
+    """
+    description = "A python script to run the umi isolation of every sample\
+                 of a sample sheet on one shared pool of worker processes."
+    epilog = "The sample sheet is a tab separated file with the columns\
+              sample, input, format, process, umi_length, search_method,\
+              forward and reverse, and optionally identity_score and\
+              abundance. This python script has one dependency: vsearch"
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-s",
+        "--sample-sheet",
+        action="store",
+        dest="sample_sheet",
+        required=True,
+        help="The location of the sample sheet.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-directory",
+        action="store",
+        dest="output_directory",
+        required=True,
+        help="The location of the directory to write the tabular, blast and\
+              zip output files of every sample to.",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        action="store",
+        dest="processes",
+        type=int,
+        default=os.cpu_count(),
+        help="The number of worker processes that run the samples.",
+    )
+    parser.add_argument(
+        "-d",
+        action="store",
+        dest="identity_score",
+        default="0.97",
+        help="The identity percentage of the vsearch check of samples without\
+              an identity_score column.",
+    )
+    parser.add_argument(
+        "-u",
+        action="store",
+        dest="abundance",
+        default="1",
+        help="The minimum abundance of samples without an abundance column.",
+    )
+    parser.add_argument(
+        "--derep",
+        action="store",
+        dest="derep_method",
+        choices=["vsearch", "native"],
+        default="vsearch",
+        help="Dereplicate and sort the reads of every umi with vsearch\
+              [vsearch] or in the python script itself [native].",
+    )
+    parser.add_argument(
+        "--vsearch-threads",
+        action="store",
+        dest="vsearch_threads",
+        type=int,
+        default=1,
+        help="The number of threads of the vsearch processes of every worker.",
+    )
+    argvs = parser.parse_args()
+    return argvs
+
+
+def main():
+    """
+    The main function:
+        This function handles the arguments parsed to the script, reads the
+        sample sheet and calls run_batch.
+    """
+    argvs = parse_argvs()
+    run_batch(
+        read_sample_sheet(argvs.sample_sheet),
+        argvs.output_directory,
+        argvs.processes,
+        argvs.identity_score,
+        argvs.abundance,
+        argvs.derep_method,
+        argvs.vsearch_threads,
+    )
+
+
+if __name__ == "__main__":
+    main()
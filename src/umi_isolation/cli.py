@@ -0,0 +1,430 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+# Imports:
+import argparse
+from umi_isolation import isolation
+
+
+def parse_argvs():
+    """
+    The parse_argvs function:
+        This function handles all positional arguments that the script accepts,
+        including version and help pages.
+    """
+    description = "A python script to accumulate all umis and output a\
+                 tabular file, a blast file and a zip file."
+    epilog = "This python script has one dependency: vsearch"
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-i",
+        action="store",
+        dest="input_file",
+        help="The location of the input file(s).",
+    )
+    parser.add_argument(
+        "--mate-file",
+        action="store",
+        dest="mate_file",
+        help="The location of the R2 input file of paired-end reads, the\
+              input file then holds the R1 reads. The 5' umi is taken from\
+              R1 and the 3' umi from R2.",
+    )
+    parser.add_argument(
+        "--both-strands",
+        action="store_true",
+        dest="both_strands",
+        help="Search the reads without a umi on the minus strand as well, the\
+              reads that are found there are reverse complemented, so all\
+              reads and umis are in the orientation of the\
+              primers/scaffolds.",
+    )
+    parser.add_argument(
+        "-c",
+        action="store",
+        dest="cluster_directory",
+        help="The location of the clustering output file(s).",
+    )
+    parser.add_argument(
+        "-o",
+        action="store",
+        dest="output_tabular_file",
+        help="The location of the tabular output file(s).",
+    )
+    parser.add_argument(
+        "-z",
+        action="store",
+        dest="output_zip_file",
+        help="The location of the pre-vsearch zip output file(s).",
+    )
+    parser.add_argument(
+        "-q",
+        action="store",
+        dest="output_blast_file",
+        help="The location of the blast output file(s).",
+    )
+    parser.add_argument(
+        "-p",
+        action="store",
+        dest="process",
+        choices=isolation.PROCESS_CHOICES,
+        help="The umi search approach [primer/scaffold(adapter)/zero].",
+    )
+    parser.add_argument(
+        "-f",
+        action="store",
+        dest="format",
+        choices=isolation.FORMAT_CHOICES,
+        help="The format of the input file(s) [fasta/fastq].",
+    )
+    parser.add_argument(
+        "-l",
+        action="store",
+        dest="umi_length",
+        help="The length of the umi sequences.",
+    )
+    parser.add_argument(
+        "-s",
+        action="store",
+        dest="search_method",
+        choices=isolation.SEARCH_METHOD_CHOICES,
+        help="Search umis at 5'-end [umi5], 3'-end [umi3] or at 5'-end and\
+              3'-end [umidouble].",
+    )
+    parser.add_argument(
+        "-a",
+        action="store",
+        dest="forward",
+        help="The 5'-end search nucleotides.",
+    )
+    parser.add_argument(
+        "-b",
+        action="store",
+        dest="reverse",
+        help="The 3'-end search nucleotides.",
+    )
+    parser.add_argument(
+        "-d",
+        action="store",
+        dest="identity_score",
+        help="The identity percentage with which to perform the final vsearch\
+              check.",
+    )
+    parser.add_argument(
+        "-u",
+        action="store",
+        dest="abundance",
+        help="The minimum abundance a read has to be present in order to be\
+              part of the final vsearch check.",
+    )
+    parser.add_argument(
+        "--max-open-files",
+        action="store",
+        dest="max_open_files",
+        type=int,
+        default=256,
+        help="The maximum number of umi files that are kept open at the same\
+              time, or of sorted runs that are merged at once in the sort\
+              bucket mode.",
+    )
+    parser.add_argument(
+        "--buffer-size",
+        action="store",
+        dest="max_buffer_size",
+        type=int,
+        default=33554432,
+        help="The number of bytes of reads that are buffered before they are\
+              written to the umi files.",
+    )
+    parser.add_argument(
+        "--bucket-mode",
+        action="store",
+        dest="bucket_mode",
+        choices=["disk", "memory", "sort"],
+        default="disk",
+        help="Write the reads of every umi to disk as they are found [disk],\
+              keep them in memory until all reads are processed [memory] or\
+              sort them on umi in runs of the memory budget, without a file\
+              for every umi [sort]. The sort mode always dereplicates the\
+              reads in the python script itself and writes all pre-vsearch\
+              reads to a single fasta file.",
+    )
+    parser.add_argument(
+        "--bucket-storage",
+        action="store",
+        dest="bucket_storage",
+        choices=["files", "container"],
+        default="files",
+        help="Write a fasta file for every umi [files] or write the reads of\
+              all umis to a single container file with an index [container].",
+    )
+    parser.add_argument(
+        "--zip-archive",
+        action="store",
+        dest="zip_archive",
+        help="The location of a pre-vsearch zip archive that is written by\
+              the python script itself.",
+    )
+    parser.add_argument(
+        "--zip-level",
+        action="store",
+        dest="zip_level",
+        type=int,
+        choices=range(10),
+        default=6,
+        help="The compression level of the pre-vsearch zip archive, 0\
+              stores the umi files without compression.",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        action="store",
+        dest="max_memory_size",
+        type=int,
+        default=268435456,
+        help="The approximate number of bytes of reads that are kept in memory\
+              in the memory bucket mode before the largest umis are written\
+              to disk, or in the sort bucket mode before they are written to\
+              a sorted run.",
+    )
+    parser.add_argument(
+        "--derep",
+        action="store",
+        dest="derep_method",
+        choices=["vsearch", "native"],
+        default="vsearch",
+        help="Dereplicate and sort the reads of every umi with vsearch\
+              [vsearch] or in the python script itself [native].",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        action="store",
+        dest="threads",
+        type=int,
+        default=1,
+        help="The number of threads that the vsearch steps can use in total.",
+    )
+    parser.add_argument(
+        "--vsearch-threads",
+        action="store",
+        dest="vsearch_threads",
+        type=int,
+        default=1,
+        help="The number of threads of every vsearch process, the remaining\
+              threads are used to run vsearch processes at the same time.",
+    )
+    parser.add_argument(
+        "--parse-processes",
+        action="store",
+        dest="parse_processes",
+        type=int,
+        default=1,
+        help="The number of processes that search the input file for umis,\
+              independent of the number of vsearch threads. Paired-end input\
+              is always searched by one process.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        action="store",
+        dest="chunk_size",
+        type=int,
+        default=67108864,
+        help="The number of bytes of the input file that a parse process\
+              handles at once.",
+    )
+    parser.add_argument(
+        "--mismatches",
+        action="store",
+        dest="max_mismatches",
+        type=int,
+        default=0,
+        help="The number of differences that are allowed between the search\
+              nucleotides and a read, reads without an exact match are\
+              searched again allowing this many differences.",
+    )
+    parser.add_argument(
+        "--distance",
+        action="store",
+        dest="distance_method",
+        choices=["hamming", "edit"],
+        default="hamming",
+        help="Count the differences as mismatches only [hamming] or as\
+              mismatches, insertions and deletions [edit].",
+    )
+    parser.add_argument(
+        "--umi-correction",
+        action="store",
+        dest="umi_correction",
+        choices=["none", "directional"],
+        default="none",
+        help="Keep every distinct umi [none] or collapse umis with\
+              sequencing errors into a more abundant umi [directional].",
+    )
+    parser.add_argument(
+        "--umi-distance",
+        action="store",
+        dest="umi_distance",
+        type=int,
+        default=1,
+        help="The number of positions in which two umis can differ to be\
+              collapsed by the umi correction.",
+    )
+    parser.add_argument(
+        "--abundance-filter",
+        action="store",
+        dest="abundance_filter",
+        choices=["none", "count", "stream"],
+        default="none",
+        help="Write the reads of every umi [none] or only of umis with at\
+              least the minimum abundance of reads, counted in a first pass\
+              over the input [count] or while the reads of every umi are held\
+              back in memory [stream]. With the umi correction the counts of\
+              its first pass are used.",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store",
+        dest="metrics_file",
+        help="The location of a json file to write the run metrics to: the\
+              time of every step, the number of reads and the reasons reads\
+              have no umi, the number of reads per umi and the vsearch runs.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store",
+        dest="profile_file",
+        help="The location of a file to write a cProfile profile of the\
+              collection of the umis to, the parse processes are not part of\
+              it.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        help="Keep a manifest of the finished steps in the zip directory and\
+              skip the steps and umi files that finished in an earlier run\
+              with the same input file and parameters. When the collection of\
+              the umis has to be done again, the umi files of the earlier run\
+              and the files in the cluster directory are removed first. Not\
+              available with the sort bucket mode or the container bucket\
+              storage.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        action="store",
+        dest="cache_directory",
+        help="The location of a directory to keep the umi files and output\
+              files of runs in, addressed by the content of the input file\
+              and the parameters they depend on. A rerun of the same input\
+              file restores them instead of collecting or clustering the\
+              umis again. Not available with the sort bucket mode.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        action="store",
+        dest="max_cache_size",
+        type=int,
+        default=10737418240,
+        help="The maximum number of bytes of the cache directory, the least\
+              recently used results are removed when it is exceeded.",
+    )
+    parser.add_argument(
+        "-v", "--version", action="version", version="%(prog)s [1.0]]"
+    )
+    argvs = parser.parse_args()
+    if argvs.mate_file != None and argvs.parse_processes > 1:
+        parser.error(
+            "--parse-processes can not be used with --mate-file, the read"
+            " pairs are searched by one process."
+        )
+    else:
+        pass
+    return argvs
+
+
+def main():
+    """
+    The main function:
+        This function handles the arguments parsed to the script, puts the
+        tuning options in a RunOptions object and calls the first function
+        set_format.
+    """
+    argvs = parse_argvs()
+    options = isolation.RunOptions(
+        max_open_files=argvs.max_open_files,
+        max_buffer_size=argvs.max_buffer_size,
+        bucket_mode=argvs.bucket_mode,
+        max_memory_size=argvs.max_memory_size,
+        bucket_storage=argvs.bucket_storage,
+        derep_method=argvs.derep_method,
+        threads=argvs.threads,
+        vsearch_threads=argvs.vsearch_threads,
+        parse_processes=argvs.parse_processes,
+        chunk_size=argvs.chunk_size,
+        max_mismatches=argvs.max_mismatches,
+        distance_method=argvs.distance_method,
+        both_strands=argvs.both_strands,
+        umi_correction=argvs.umi_correction,
+        umi_distance=argvs.umi_distance,
+        abundance_filter=argvs.abundance_filter,
+        zip_level=argvs.zip_level,
+        resume=argvs.resume,
+        cache_directory=argvs.cache_directory,
+        max_cache_size=argvs.max_cache_size,
+    )
+    isolation.set_format(
+        argvs.input_file,
+        argvs.cluster_directory,
+        argvs.output_tabular_file,
+        argvs.output_zip_file,
+        argvs.output_blast_file,
+        argvs.process,
+        argvs.format,
+        argvs.umi_length,
+        argvs.search_method,
+        argvs.forward,
+        argvs.reverse,
+        argvs.identity_score,
+        argvs.abundance,
+        options,
+        zip_archive=argvs.zip_archive,
+        mate_file=argvs.mate_file,
+        metrics_file=argvs.metrics_file,
+        profile_file=argvs.profile_file,
+    )
+
+
+if __name__ == "__main__":
+    main()
+
+# Additional information:
+# =======================
+# Prequisites:
+# * sudo apt-get install python3
+# * sudo apt-get install python3-pip
+# * sudo apt-get install libargtable2-dev
+# * Download VSEARCH from GitHub
+# * Unpack downloaded file
+# * sudo ./autogen.sh
+# * sudo ./configure && sudo make && sudo make install
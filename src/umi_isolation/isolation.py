@@ -0,0 +1,4820 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+# Imports:
+import os
+import array
+import collections
+import contextlib
+import csv
+import cProfile
+import functools
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import mmap
+import multiprocessing
+import queue
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import subprocess as sp
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The approximate memory use of a read header and of a distinct read in a
+# UmiBucket, on top of the length of the strings themselves.
+UMI_RECORD_OVERHEAD = 60
+UMI_READ_OVERHEAD = 120
+
+# The shortest exact part of a primer/scaffold that is searched for before
+# the bit-parallel search, shorter parts are found in nearly every read.
+MIN_PART_LENGTH = 4
+
+# The base 4 digits of the nucleotides of a packed umi key, every other byte
+# is translated to x so it can not be parsed as a base 4 number.
+UMI_DIGITS = bytes(
+    [
+        b"0123"[b"ACGT".index(byte)] if byte in b"ACGT" else ord("x")
+        for byte in range(256)
+    ]
+)
+UMI_NUCLEOTIDES = {"00": "A", "01": "C", "10": "G", "11": "T"}
+
+# The values the input format, umi search approach and search method can
+# take, on the command line and in a sample sheet.
+FORMAT_CHOICES = ["fasta", "fastq"]
+PROCESS_CHOICES = ["primer", "scaffold", "zero"]
+SEARCH_METHOD_CHOICES = ["umi5", "umi3", "umidouble"]
+
+# The iupac nucleotide codes a primer/scaffold can be made of, the codes
+# generate_regex and create_reverse_complement know.
+PRIMER_NUCLEOTIDES = "ACGTMRWSYKVHDBN"
+
+# The complement of every iupac nucleotide code of a read, in upper and lower
+# case, as a translation table for bytes.translate.
+READ_COMPLEMENT = bytes.maketrans(
+    b"ACGTUMRWSYKVHDBNacgtumrwsykvhdbn", b"TGCAAKYWSRMBDHVNtgcaakywsrmbdhvn"
+)
+
+# The length of the exact seeds that place the reverse complement of an R2
+# read on its R1 read, the shortest overlap of a read pair that is merged and
+# the largest percentage of differing nucleotides in that overlap.
+PAIR_SEED_LENGTH = 8
+MIN_PAIR_OVERLAP = 20
+MAX_PAIR_DIFFERENCES = 10
+
+
+def add_cluster_rows(
+    umi_number, umi_string, lines, output_columns, output_file
+):
+    """
+    The add_cluster_rows function:
+        This function adds the centroids of a single cluster file to the
+        output columns and writes them to the blast file. A cluster file with a
+        single centroid gives one row with the umi number as id, the centroids
+        of a cluster file with more centroids are numbered as versions of the
+        umi number.
+    """
+    if len(lines) >= 2:
+        version_count = 1
+        umi_file = iter(lines)
+        for line in umi_file:
+            if line.startswith(">"):
+                header = line.split("=")[1].strip("\n")
+                read = next(umi_file).strip("\n").upper()
+                if len(lines) == 2:
+                    umi_version = umi_number
+                else:
+                    umi_version = umi_number + "." + str(version_count)
+                output_columns["UMI ID"].append(umi_version)
+                output_columns["UMI SEQ"].append(umi_string)
+                output_columns["READ COUNT"].append(header)
+                output_columns["CENTROID READ"].append(read)
+                output_file.write(">" + umi_version + "\n" + read + "\n")
+                version_count += 1
+            else:
+                pass
+    else:
+        pass
+
+
+def create_tabular_file(output_columns, tabular_file):
+    """
+    The create_tabular_file function:
+        This function creates the tabular output file from the output columns
+        in one step.
+    """
+    column_names = ["UMI ID", "UMI SEQ", "READ COUNT", "CENTROID READ"]
+    with open(tabular_file, "w", encoding="utf-8", newline="") as output:
+        tabular_writer = csv.writer(
+            output, delimiter="\t", lineterminator="\n"
+        )
+        tabular_writer.writerow(column_names)
+        tabular_writer.writerows(
+            zip(*[output_columns[column_name] for column_name in column_names])
+        )
+
+
+def create_output_files(cluster_directory, output_blast_file, tabular_file):
+    """
+    The create_output_files function:
+        This function creates the tabular and blast output files. Every
+        cluster file is read once and its centroids are added to the output
+        columns by add_cluster_rows, in the order of the umi numbers. The
+        centroids are written to the blast file through a single file handle
+        and the tabular file is created from the columns by
+        create_tabular_file.
+    """
+    output_columns = {
+        "UMI ID": [],
+        "UMI SEQ": [],
+        "READ COUNT": [],
+        "CENTROID READ": [],
+    }
+    with open(output_blast_file, "a") as output_file:
+        for file_name in sorted(
+            os.listdir(cluster_directory),
+            key=lambda file_name: int(file_name.split("_")[0][4:]),
+        ):
+            with open(cluster_directory + file_name) as cluster_file:
+                lines = cluster_file.readlines()
+            add_cluster_rows(
+                file_name.split("_")[0],
+                file_name.split("_")[1][:-6],
+                lines,
+                output_columns,
+                output_file,
+            )
+    create_tabular_file(output_columns, tabular_file)
+
+
+def create_zip_archive(
+    zip_archive, zip_file, bucket_container=None, zip_level=6
+):
+    """
+    The create_zip_archive function:
+        This function writes the pre-vsearch zip archive with every umi file
+        as an entry. The umi files are added one at a time, from the
+        bucket_container when it is given or from the zip_file directory. The
+        umi files are stored without compression when zip_level is 0, else
+        they are deflated with zip_level as compression level. Python 3.6 can
+        not set the level and always uses the default level of zlib.
+    """
+    if int(zip_level) == 0:
+        compression = zipfile.ZIP_STORED
+    else:
+        compression = zipfile.ZIP_DEFLATED
+    try:
+        archive = zipfile.ZipFile(
+            zip_archive, "w", compression, compresslevel=int(zip_level)
+        )
+    except TypeError:
+        archive = zipfile.ZipFile(zip_archive, "w", compression)
+    with archive:
+        if bucket_container != None:
+            for file_name in bucket_container.get_file_names():
+                archive.writestr(
+                    file_name, bucket_container.get_fasta(file_name)
+                )
+        else:
+            for file_name in sorted(os.listdir(zip_file)):
+                if file_name.startswith("UMI#"):
+                    archive.write(zip_file + file_name, file_name)
+                else:
+                    pass
+
+
+class VsearchError(RuntimeError):
+    """
+    The VsearchError class:
+        This class is the error that is raised when vsearch fails. It keeps
+        the exit status of vsearch, so it can be reported in the run metrics.
+        When it is raised by run_vsearch_pool, exit_statuses holds the exit
+        statuses of all vsearch runs of the step that were started.
+    """
+
+    def __init__(self, message, returncode):
+        RuntimeError.__init__(self, message)
+        self.returncode = returncode
+        self.exit_statuses = None
+
+
+def run_vsearch(vsearch_command, input_fasta=None):
+    """
+    The run_vsearch function:
+        This function runs a single vsearch command. When input_fasta is given
+        it is passed to vsearch through stdin, as a string or as bytes. The
+        output of vsearch is collected, when vsearch fails a VsearchError is
+        raised that contains the error message vsearch wrote to stderr,
+        otherwise the output vsearch wrote to stdout is returned.
+    """
+    if input_fasta != None:
+        vsearch_process = sp.Popen(
+            vsearch_command, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.PIPE
+        )
+        if isinstance(input_fasta, str):
+            input_fasta = input_fasta.encode()
+        else:
+            pass
+        out, error = vsearch_process.communicate(input_fasta)
+    else:
+        vsearch_process = sp.Popen(
+            vsearch_command, stdout=sp.PIPE, stderr=sp.PIPE
+        )
+        out, error = vsearch_process.communicate()
+    if vsearch_process.returncode != 0:
+        raise VsearchError(
+            "vsearch "
+            + vsearch_command[1]
+            + " "
+            + vsearch_command[2]
+            + " failed with exit status "
+            + str(vsearch_process.returncode)
+            + ":\n"
+            + error.decode(errors="replace").strip(),
+            vsearch_process.returncode,
+        )
+    else:
+        return out
+
+
+def get_exit_statuses(futures):
+    """
+    The get_exit_statuses function:
+        This function waits for the vsearch jobs of futures that were not
+        cancelled and counts them per exit status, 0 for a job that finished
+        and the exit status of the VsearchError for a job that failed. Jobs
+        that failed with another error did not give an exit status. It
+        returns a Counter with the exit statuses as strings.
+    """
+    exit_statuses = collections.Counter()
+    for future in futures:
+        if future.cancelled():
+            pass
+        elif future.exception() == None:
+            exit_statuses["0"] += 1
+        elif isinstance(future.exception(), VsearchError):
+            exit_statuses[str(future.exception().returncode)] += 1
+        else:
+            pass
+    return exit_statuses
+
+
+def run_vsearch_pool(
+    vsearch_function,
+    vsearch_jobs,
+    threads,
+    vsearch_threads,
+    stage_checkpoint=None,
+    unit_names=None,
+):
+    """
+    The run_vsearch_pool function:
+        This function runs vsearch_function for every job in vsearch_jobs
+        using a pool of worker threads. The thread budget is split between the
+        concurrent vsearch processes and the threads of every vsearch process,
+        so threads // vsearch_threads jobs run at the same time. The results
+        are checked in the order of the jobs, the first job that failed stops
+        the jobs that did not start yet and its error is raised, after the
+        jobs that are running finished. The exit statuses of get_exit_statuses
+        are added to a VsearchError that is raised. When a stage_checkpoint is
+        given, the name in unit_names of every job that finished is added to
+        it. It returns a Counter of the exit statuses of the jobs, which are
+        all 0.
+    """
+    workers = max(1, int(threads) // max(1, int(vsearch_threads)))
+    exit_statuses = collections.Counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(vsearch_function, *vsearch_job)
+            for vsearch_job in vsearch_jobs
+        ]
+        for job_index, future in enumerate(futures):
+            try:
+                future.result()
+            except Exception as error:
+                for pending_future in futures:
+                    pending_future.cancel()
+                if isinstance(error, VsearchError):
+                    error.exit_statuses = get_exit_statuses(futures)
+                else:
+                    pass
+                raise
+            exit_statuses["0"] += 1
+            if stage_checkpoint != None:
+                stage_checkpoint.add(unit_names[job_index])
+            else:
+                pass
+    return exit_statuses
+
+
+def get_vsearch_cluster_command(
+    input_command, output_command, identity_score, vsearch_threads
+):
+    """
+    The get_vsearch_cluster_command function:
+        This function returns the vsearch command that clusters a fasta file
+        with size annotated reads into centroid sequences. The input command
+        can be "-" to read the fasta file from stdin.
+    """
+    return [
+        "vsearch",
+        "--cluster_size",
+        input_command,
+        "--fasta_width",
+        "0",
+        "--id",
+        identity_score,
+        "--sizein",
+        "--minseqlength",
+        "1",
+        "--centroids",
+        output_command,
+        "--sizeout",
+        "--threads",
+        str(vsearch_threads),
+    ]
+
+
+def get_vsearch_cluster_size(
+    zip_file,
+    cluster_directory,
+    identity_score,
+    threads,
+    vsearch_threads,
+    stage_checkpoint=None,
+):
+    """
+    The get_vsearch_cluster_size function:
+        This function controls the vsearch clustering. Every fasta file created
+        by get_vsearch_sort_by_size is clustered using vsearch. The expected
+        result is a single centroid sequence. This is checked in the
+        create_output_files function. Files that are already finished in the
+        stage_checkpoint are skipped. It returns the exit statuses of the
+        vsearch runs.
+    """
+    vsearch_jobs = []
+    unit_names = []
+    for file_name in sorted(os.listdir(zip_file)):
+        if file_name.startswith("sorted") and (
+            stage_checkpoint == None or file_name not in stage_checkpoint.units
+        ):
+            unit_names.append(file_name)
+            input_command = zip_file + file_name
+            output_command = cluster_directory + file_name[11:]
+            vsearch_jobs.append(
+                (
+                    get_vsearch_cluster_command(
+                        input_command,
+                        output_command,
+                        identity_score,
+                        vsearch_threads,
+                    ),
+                )
+            )
+        else:
+            pass
+    return run_vsearch_pool(
+        run_vsearch,
+        vsearch_jobs,
+        threads,
+        vsearch_threads,
+        stage_checkpoint,
+        unit_names,
+    )
+
+
+def get_vsearch_sort_by_size(
+    zip_file,
+    minimal_size_abundance,
+    threads,
+    vsearch_threads,
+    stage_checkpoint=None,
+):
+    """
+    The get_vsearch_sort_by_size function:
+        This function controls the vsearch sorting. Every fasta file created by
+        get_vsearch_derep is sorted based on abundance. Any reads with a
+        abundance lower than minimal_size_abundance will be discarded. Files
+        that are already finished in the stage_checkpoint are skipped. It
+        returns the exit statuses of the vsearch runs.
+    """
+    vsearch_jobs = []
+    unit_names = []
+    for file_name in sorted(os.listdir(zip_file)):
+        if file_name.startswith("derep") and (
+            stage_checkpoint == None or file_name not in stage_checkpoint.units
+        ):
+            unit_names.append(file_name)
+            input_command = zip_file + file_name
+            output_command = zip_file + "sorted" + file_name
+            vsearch_jobs.append(
+                (
+                    [
+                        "vsearch",
+                        "--sortbysize",
+                        input_command,
+                        "--output",
+                        output_command,
+                        "--minseqlength",
+                        "1",
+                        "--minsize",
+                        minimal_size_abundance,
+                        "--threads",
+                        str(vsearch_threads),
+                    ],
+                )
+            )
+        else:
+            pass
+    return run_vsearch_pool(
+        run_vsearch,
+        vsearch_jobs,
+        threads,
+        vsearch_threads,
+        stage_checkpoint,
+        unit_names,
+    )
+
+
+def get_vsearch_derep(
+    zip_file,
+    threads,
+    vsearch_threads,
+    trivial_files,
+    bucket_container=None,
+    stage_checkpoint=None,
+):
+    """
+    The get_vsearch_derep function:
+        This function controls the vsearch dereplication. Every fasta file
+        created by get_fasta_files is dereplicated, except for the umi files
+        in trivial_files, which already have a centroid, and the umi files
+        that are already finished in the stage_checkpoint. When the reads are
+        written to a UmiBucketContainer, the umi files are taken from the
+        container and passed to vsearch through stdin. This step is necessary
+        for the sorting step to work. It returns the exit statuses of the
+        vsearch runs.
+    """
+    if bucket_container != None:
+        file_names = bucket_container.get_file_names()
+        vsearch_function = bucket_container.run_vsearch
+    else:
+        file_names = sorted(os.listdir(zip_file))
+        vsearch_function = run_vsearch
+    vsearch_jobs = []
+    unit_names = []
+    for file_name in file_names:
+        if (
+            file_name.endswith(".fasta")
+            and file_name not in trivial_files
+            and (
+                stage_checkpoint == None
+                or file_name not in stage_checkpoint.units
+            )
+        ):
+            unit_names.append(file_name)
+            output_command = zip_file + "derep" + file_name
+            if bucket_container != None:
+                input_command = "-"
+            else:
+                input_command = zip_file + file_name
+            vsearch_job = (
+                [
+                    "vsearch",
+                    "--derep_fulllength",
+                    input_command,
+                    "--output",
+                    output_command,
+                    "--minseqlength",
+                    "1",
+                    "--sizeout",
+                    "--threads",
+                    str(vsearch_threads),
+                ],
+            )
+            if bucket_container != None:
+                vsearch_jobs.append(vsearch_job + (file_name,))
+            else:
+                vsearch_jobs.append(vsearch_job)
+        else:
+            pass
+    return run_vsearch_pool(
+        vsearch_function,
+        vsearch_jobs,
+        threads,
+        vsearch_threads,
+        stage_checkpoint,
+        unit_names,
+    )
+
+
+def get_read_label(header):
+    """
+    The get_read_label function:
+        This function returns the label of a read header the way vsearch
+        reads it, without the first character and cut at the first
+        whitespace.
+    """
+    return header[1:].split(None, 1)[0]
+
+
+def create_trivial_centroids(
+    bucket_summary, umi_table, cluster_directory, minimal_size_abundance
+):
+    """
+    The create_trivial_centroids function:
+        This function writes the centroid of every umi file in which all reads
+        are identical. Dereplication, sorting and clustering of such a umi
+        file can only result in that read with the number of reads as size,
+        so the centroid file is written directly in the format that vsearch
+        --cluster_size --sizeout uses. When the number of reads is lower than
+        minimal_size_abundance no centroid is written, like vsearch
+        --sortbysize would discard the read. It returns the names of these umi
+        files, so the vsearch steps can skip them.
+    """
+    trivial_files = set()
+    for umi_number, trivial_read in bucket_summary.buckets.items():
+        if trivial_read != None:
+            file_identifier = umi_table.get_file_identifier(umi_number)
+            label, read, size = trivial_read
+            if read and size >= int(minimal_size_abundance):
+                with open(
+                    cluster_directory + file_identifier, "w"
+                ) as centroid_file:
+                    centroid_file.write(
+                        ">" + label + ";size=" + str(size) + "\n"
+                    )
+                    centroid_file.write(read.decode() + "\n")
+            else:
+                pass
+            trivial_files.add(file_identifier)
+        else:
+            pass
+    return trivial_files
+
+
+def get_native_derep(umi_file, minimal_size_abundance):
+    """
+    The get_native_derep function:
+        This function dereplicates and sorts the reads of a umi file without
+        vsearch. Identical reads are counted using a dictionary, comparing
+        them case insensitive like vsearch --derep_fulllength does. Every
+        distinct read keeps the label of the first read header it was found
+        with, cut at the first whitespace. Reads with an abundance lower than
+        minimal_size_abundance are discarded and the remaining reads are
+        sorted on decreasing abundance, ties keep the order in which they were
+        first found. It returns a fasta string with size annotated read
+        headers, the same input that vsearch --cluster_size expects.
+    """
+    reads = {}
+    for header in umi_file:
+        read = next(umi_file).strip()
+        if read:
+            read_key = read.upper()
+            if read_key in reads:
+                reads[read_key][2] += 1
+            else:
+                reads[read_key] = [get_read_label(header), read, 1]
+        else:
+            pass
+    sorted_reads = sorted(
+        [
+            derep_read
+            for derep_read in reads.values()
+            if derep_read[2] >= int(minimal_size_abundance)
+        ],
+        key=lambda derep_read: derep_read[2],
+        reverse=True,
+    )
+    return "".join(
+        [
+            ">" + label + ";size=" + str(size) + "\n" + read + "\n"
+            for label, read, size in sorted_reads
+        ]
+    )
+
+
+def get_native_cluster_size(
+    umi_file_name,
+    output_command,
+    identity_score,
+    minimal_size_abundance,
+    vsearch_threads,
+    bucket_container=None,
+):
+    """
+    The get_native_cluster_size function:
+        This function dereplicates and sorts a single umi file with
+        get_native_derep and passes the result to vsearch --cluster_size
+        through stdin. The umi file is read from the bucket_container when it
+        is given.
+    """
+    if bucket_container != None:
+        umi_file = bucket_container.open_umi_file(umi_file_name)
+    else:
+        umi_file = open(umi_file_name)
+    with umi_file:
+        sorted_fasta = get_native_derep(umi_file, minimal_size_abundance)
+    return run_vsearch(
+        get_vsearch_cluster_command(
+            "-", output_command, identity_score, vsearch_threads
+        ),
+        sorted_fasta,
+    )
+
+
+def get_native_derep_cluster_size(
+    zip_file,
+    cluster_directory,
+    identity_score,
+    minimal_size_abundance,
+    threads,
+    vsearch_threads,
+    trivial_files,
+    bucket_container=None,
+    stage_checkpoint=None,
+):
+    """
+    The get_native_derep_cluster_size function:
+        This function replaces the vsearch dereplication and sorting. Every
+        fasta file created by get_fasta_files, except for the umi files in
+        trivial_files, is dereplicated and sorted by get_native_derep. The
+        umi files are taken from the bucket_container when it is given. The
+        result is not written to a derep or sorted file, it is passed to
+        vsearch --cluster_size through stdin. The expected result is a single
+        centroid sequence. This is checked in the create_output_files
+        function. Files that are already finished in the stage_checkpoint are
+        skipped. It returns the exit statuses of the vsearch runs.
+    """
+    if bucket_container != None:
+        file_names = bucket_container.get_file_names()
+        file_directory = ""
+    else:
+        file_names = sorted(os.listdir(zip_file))
+        file_directory = zip_file
+    vsearch_jobs = []
+    unit_names = []
+    for file_name in file_names:
+        if (
+            file_name.startswith("UMI#")
+            and file_name.endswith(".fasta")
+            and file_name not in trivial_files
+            and (
+                stage_checkpoint == None
+                or file_name not in stage_checkpoint.units
+            )
+        ):
+            unit_names.append(file_name)
+            vsearch_jobs.append(
+                (
+                    file_directory + file_name,
+                    cluster_directory + file_name,
+                    identity_score,
+                    minimal_size_abundance,
+                    vsearch_threads,
+                    bucket_container,
+                )
+            )
+        else:
+            pass
+    return run_vsearch_pool(
+        get_native_cluster_size,
+        vsearch_jobs,
+        threads,
+        vsearch_threads,
+        stage_checkpoint,
+        unit_names,
+    )
+
+
+def get_umi_centroids(
+    umi_records, identity_score, minimal_size_abundance, vsearch_threads
+):
+    """
+    The get_umi_centroids function:
+        This function dereplicates and sorts the read headers and reads of a
+        single umi with get_native_derep. When more than one distinct read is
+        left they are clustered by vsearch --cluster_size, which gets them
+        through stdin and writes the centroids to stdout. A single distinct
+        read is its own centroid. It returns the lines of the centroids.
+    """
+    sorted_fasta = get_native_derep(
+        iter(
+            [
+                line.decode()
+                for umi_record in umi_records
+                for line in umi_record
+            ]
+        ),
+        minimal_size_abundance,
+    )
+    if sorted_fasta.count("\n") > 2:
+        return (
+            run_vsearch(
+                get_vsearch_cluster_command(
+                    "-", "/dev/stdout", identity_score, vsearch_threads
+                ),
+                sorted_fasta,
+            )
+            .decode()
+            .splitlines(True)
+        )
+    else:
+        return sorted_fasta.splitlines(True)
+
+
+def get_sorted_cluster_size(
+    umi_runs,
+    umi_table,
+    zip_file,
+    output_blast_file,
+    tabular_file,
+    identity_score,
+    minimal_size_abundance,
+    threads,
+    vsearch_threads,
+):
+    """
+    The get_sorted_cluster_size function:
+        This function replaces the umi files, the vsearch steps and the
+        cluster files in the sort bucket mode. The reads of every umi are
+        taken from the merged UmiSortedRuns and written to a single
+        pre-vsearch fasta file, every read header is followed by the name of
+        its umi. The centroids of every umi are made by get_umi_centroids in a
+        pool of worker threads, at most twice the number of workers are
+        waiting at a time. The centroids are added to the output columns by
+        add_cluster_rows in the order of the umi numbers, so the tabular and
+        blast output files are the same as with the other bucket modes.
+    """
+    workers = max(1, int(threads) // max(1, int(vsearch_threads)))
+    output_columns = {
+        "UMI ID": [],
+        "UMI SEQ": [],
+        "READ COUNT": [],
+        "CENTROID READ": [],
+    }
+    umi_jobs = collections.deque()
+    with open(zip_file + "UMI#sorted.fasta", "wb") as reads_file, open(
+        output_blast_file, "a"
+    ) as output_file, ThreadPoolExecutor(max_workers=workers) as executor:
+        for umi_number, umi_records in umi_runs.get_umi_groups():
+            umi_string = get_umi_string(umi_table.umi_keys[umi_number - 1])
+            umi_name = (
+                b" umi=UMI#"
+                + str(umi_number).encode()
+                + b"_"
+                + umi_string.encode()
+            )
+            reads_file.write(
+                b"".join(
+                    [
+                        header + umi_name + b"\n" + read + b"\n"
+                        for header, read in umi_records
+                    ]
+                )
+            )
+            umi_jobs.append(
+                (
+                    umi_number,
+                    umi_string,
+                    executor.submit(
+                        get_umi_centroids,
+                        umi_records,
+                        identity_score,
+                        minimal_size_abundance,
+                        vsearch_threads,
+                    ),
+                )
+            )
+            while len(umi_jobs) > 2 * workers or (
+                umi_jobs and umi_jobs[0][2].done()
+            ):
+                umi_number, umi_string, umi_job = umi_jobs.popleft()
+                add_cluster_rows(
+                    "UMI#" + str(umi_number),
+                    umi_string,
+                    umi_job.result(),
+                    output_columns,
+                    output_file,
+                )
+        while umi_jobs:
+            umi_number, umi_string, umi_job = umi_jobs.popleft()
+            add_cluster_rows(
+                "UMI#" + str(umi_number),
+                umi_string,
+                umi_job.result(),
+                output_columns,
+                output_file,
+            )
+    create_tabular_file(output_columns, tabular_file)
+
+
+class UmiBucketWriter:
+    """
+    The UmiBucketWriter class:
+        This class collects the reads of every umi file before they are
+        written to disk. Reads are buffered per umi file and written in one
+        batch when the buffered reads exceed max_buffer_size. A pool of at most
+        max_open_files file handles is kept open, when the pool is full the
+        least recently used file is closed. The files are opened in binary
+        append mode, so a file that was closed can be reopened for the next
+        batch. The umi files are identified by their umi number, the name of
+        a umi file is taken from the UmiTable when the file is opened.
+    """
+
+    def __init__(self, zip_file, umi_table, max_open_files, max_buffer_size):
+        self.zip_file = zip_file
+        self.umi_table = umi_table
+        self.max_open_files = max(1, int(max_open_files))
+        self.max_buffer_size = int(max_buffer_size)
+        self.open_files = collections.OrderedDict()
+        self.buffers = {}
+        self.buffer_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, umi_number, header, read):
+        """
+        The write method:
+            This method adds a read header and read, both without line ending,
+            to the buffer of a umi file. The buffers are flushed when they
+            exceed max_buffer_size.
+        """
+        if umi_number in self.buffers:
+            self.buffers[umi_number].extend((header, b"\n", read, b"\n"))
+        else:
+            self.buffers[umi_number] = [header, b"\n", read, b"\n"]
+        self.buffer_size += len(header) + len(read) + 2
+        if self.buffer_size > self.max_buffer_size:
+            self.flush()
+        else:
+            pass
+
+    def write_fasta(self, umi_number, fasta):
+        """
+        The write_fasta method:
+            This method adds a block of read headers and reads to the buffer of
+            a umi file. The buffers are flushed when they exceed
+            max_buffer_size.
+        """
+        if umi_number in self.buffers:
+            self.buffers[umi_number].append(fasta)
+        else:
+            self.buffers[umi_number] = [fasta]
+        self.buffer_size += len(fasta)
+        if self.buffer_size > self.max_buffer_size:
+            self.flush()
+        else:
+            pass
+
+    def get_file(self, umi_number):
+        """
+        The get_file method:
+            This method returns an open handle of a umi file. A handle that is
+            already open is marked as most recently used, otherwise the least
+            recently used handle is closed when the pool is full and the umi
+            file is opened in append mode.
+        """
+        if umi_number in self.open_files:
+            self.open_files.move_to_end(umi_number)
+            return self.open_files[umi_number]
+        else:
+            if len(self.open_files) >= self.max_open_files:
+                self.open_files.popitem(last=False)[1].close()
+            else:
+                pass
+            output_file = open(
+                self.zip_file + self.umi_table.get_file_identifier(umi_number),
+                "ab",
+            )
+            self.open_files[umi_number] = output_file
+            return output_file
+
+    def flush(self):
+        """
+        The flush method:
+            This method writes all buffered reads to their umi files. Umi
+            files that are still open are written first, so they are not
+            closed by the pool before their batch is written.
+        """
+        umi_numbers = sorted(
+            self.buffers,
+            key=lambda umi_number: umi_number not in self.open_files,
+        )
+        for umi_number in umi_numbers:
+            self.get_file(umi_number).write(b"".join(self.buffers[umi_number]))
+        self.buffers = {}
+        self.buffer_size = 0
+
+    def close(self):
+        """
+        The close method:
+            This method writes all remaining buffered reads and closes every
+            open umi file.
+        """
+        self.flush()
+        while self.open_files:
+            self.open_files.popitem(last=False)[1].close()
+
+
+class UmiBucketContainer(UmiBucketWriter):
+    """
+    The UmiBucketContainer class:
+        This class writes the reads of every umi to a single container file
+        instead of a file for every umi. Reads are buffered per umi like in
+        the UmiBucketWriter and every flushed batch is appended to the
+        container as a block. The offset and length of every block are kept in
+        an index by umi number, which is written next to the container with
+        the name of the umi file of every block. When the container is
+        closed it is memory mapped, so the content of any umi file can be
+        sliced from it without reading the container again.
+    """
+
+    def __init__(self, zip_file, umi_table, max_buffer_size):
+        UmiBucketWriter.__init__(self, zip_file, umi_table, 1, max_buffer_size)
+        self.container_file = open(zip_file + "buckets.fasta", "wb")
+        self.container_size = 0
+        self.container_map = None
+        self.umi_blocks = {}
+
+    def flush(self):
+        """
+        The flush method:
+            This method appends the buffered reads of every umi to the
+            container file as a block and adds the block to the index.
+        """
+        for umi_number, buffer in self.buffers.items():
+            block = b"".join(buffer)
+            self.container_file.write(block)
+            if umi_number in self.umi_blocks:
+                self.umi_blocks[umi_number].append(
+                    (self.container_size, len(block))
+                )
+            else:
+                self.umi_blocks[umi_number] = [
+                    (self.container_size, len(block))
+                ]
+            self.container_size += len(block)
+        self.buffers = {}
+        self.buffer_size = 0
+
+    def close(self):
+        """
+        The close method:
+            This method writes the remaining buffered reads, closes the
+            container file, writes the index and memory maps the container.
+        """
+        self.flush()
+        self.container_file.close()
+        with open(self.zip_file + "buckets.index", "w") as index_file:
+            for umi_number, umi_blocks in sorted(self.umi_blocks.items()):
+                file_identifier = self.umi_table.get_file_identifier(
+                    umi_number
+                )
+                for block_start, block_length in umi_blocks:
+                    index_file.write(
+                        file_identifier
+                        + "\t"
+                        + str(block_start)
+                        + "\t"
+                        + str(block_length)
+                        + "\n"
+                    )
+        if self.container_size > 0:
+            with open(self.zip_file + "buckets.fasta", "rb") as map_file:
+                self.container_map = mmap.mmap(
+                    map_file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        else:
+            pass
+
+    def get_file_names(self):
+        """
+        The get_file_names method:
+            This method returns the names of the umi files in the container,
+            in the order of the umi numbers.
+        """
+        return [
+            self.umi_table.get_file_identifier(umi_number)
+            for umi_number in sorted(self.umi_blocks)
+        ]
+
+    def get_fasta(self, file_name):
+        """
+        The get_fasta method:
+            This method returns the content of a umi file, the umi number is
+            taken from the start of the file name. A umi with a single block
+            is returned as a memoryview of the memory mapped container, so its
+            reads are not copied, a umi with more blocks is joined into bytes.
+        """
+        umi_blocks = self.umi_blocks[int(file_name.split("_")[0][4:])]
+        container_view = memoryview(self.container_map)
+        if len(umi_blocks) == 1:
+            block_start, block_length = umi_blocks[0]
+            return container_view[block_start : block_start + block_length]
+        else:
+            return b"".join(
+                [
+                    container_view[block_start : block_start + block_length]
+                    for block_start, block_length in umi_blocks
+                ]
+            )
+
+    def open_umi_file(self, file_name):
+        """
+        The open_umi_file method:
+            This method returns the content of a umi file as a text file
+            object, so it can be read like the umi file itself.
+        """
+        return io.TextIOWrapper(io.BytesIO(self.get_fasta(file_name)))
+
+    def run_vsearch(self, vsearch_command, file_name):
+        """
+        The run_vsearch method:
+            This method runs a vsearch command that reads the content of a umi
+            file from stdin.
+        """
+        return run_vsearch(vsearch_command, self.get_fasta(file_name))
+
+    def close_map(self):
+        """
+        The close_map method:
+            This method closes the memory map of the container. When a
+            memoryview of the container is still in use, the map is closed
+            when the last memoryview is released.
+        """
+        if self.container_map != None:
+            try:
+                self.container_map.close()
+            except BufferError:
+                pass
+            self.container_map = None
+        else:
+            pass
+
+
+class UmiBucket:
+    """
+    The UmiBucket class:
+        This class holds the reads of a single umi in memory. Every distinct
+        read is stored once together with the number of times it was seen,
+        every read header keeps the index of its read. This keeps the order of
+        the reads intact, so the umi file can be written exactly as it would
+        have been written read by read.
+    """
+
+    __slots__ = ("headers", "read_indices", "reads", "read_counts")
+
+    def __init__(self):
+        self.headers = []
+        self.read_indices = array.array("I")
+        self.reads = {}
+        self.read_counts = []
+
+    def add(self, header, read):
+        """
+        The add method:
+            This method adds a read header and read to the umi bucket. It
+            returns the approximate number of bytes of memory that were added.
+        """
+        size = len(header) + UMI_RECORD_OVERHEAD
+        if read in self.reads:
+            read_index = self.reads[read]
+            self.read_counts[read_index] += 1
+        else:
+            read_index = len(self.read_counts)
+            self.reads[read] = read_index
+            self.read_counts.append(1)
+            size += len(read) + UMI_READ_OVERHEAD
+        self.headers.append(header)
+        self.read_indices.append(read_index)
+        return size
+
+    def get_records(self):
+        """
+        The get_records method:
+            This method returns every read header of the umi bucket together
+            with its read, in the order in which they were added.
+        """
+        reads = list(self.reads)
+        return [
+            (header, reads[read_index])
+            for header, read_index in zip(self.headers, self.read_indices)
+        ]
+
+    def get_fasta(self):
+        """
+        The get_fasta method:
+            This method returns the umi file content of the umi bucket, every
+            read header followed by its read.
+        """
+        reads = list(self.reads)
+        return b"".join(
+            [
+                header + b"\n" + reads[read_index] + b"\n"
+                for header, read_index in zip(self.headers, self.read_indices)
+            ]
+        )
+
+
+class UmiMemoryBuckets:
+    """
+    The UmiMemoryBuckets class:
+        This class keeps the reads of every umi file in memory in a UmiBucket.
+        When the approximate memory use exceeds max_memory_size, the largest
+        umi buckets are spilled to disk through the UmiBucketWriter until half
+        of the memory budget is free again. When the input is processed, the
+        remaining umi buckets are written in one go, so every umi file is
+        opened only once for the pre-vsearch zip output and vsearch.
+    """
+
+    def __init__(self, bucket_writer, max_memory_size):
+        self.bucket_writer = bucket_writer
+        self.max_memory_size = int(max_memory_size)
+        self.buckets = {}
+        self.bucket_sizes = {}
+        self.memory_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, umi_number, header, read):
+        """
+        The write method:
+            This method adds a read header and read to the umi bucket of a umi
+            file. The largest umi buckets are spilled to disk when the memory
+            budget is exceeded.
+        """
+        if umi_number in self.buckets:
+            size = self.buckets[umi_number].add(header, read)
+            self.bucket_sizes[umi_number] += size
+        else:
+            self.buckets[umi_number] = UmiBucket()
+            size = self.buckets[umi_number].add(header, read)
+            self.bucket_sizes[umi_number] = size
+        self.memory_size += size
+        if self.memory_size > self.max_memory_size:
+            self.spill()
+        else:
+            pass
+
+    def spill(self):
+        """
+        The spill method:
+            This method writes the largest umi buckets to their umi files and
+            removes them from memory, until the memory use is at most half of
+            max_memory_size. Reads of a spilled umi that are found later are
+            collected in a new umi bucket and appended to the same umi file.
+        """
+        umi_numbers = sorted(
+            self.bucket_sizes, key=self.bucket_sizes.get, reverse=True
+        )
+        for umi_number in umi_numbers:
+            if self.memory_size <= self.max_memory_size // 2:
+                break
+            else:
+                self.bucket_writer.write_fasta(
+                    umi_number,
+                    self.buckets.pop(umi_number).get_fasta(),
+                )
+                self.memory_size -= self.bucket_sizes.pop(umi_number)
+        self.bucket_writer.flush()
+
+    def close(self):
+        """
+        The close method:
+            This method writes every umi bucket that is still in memory to its
+            umi file and closes the UmiBucketWriter.
+        """
+        for umi_number, bucket in self.buckets.items():
+            self.bucket_writer.write_fasta(umi_number, bucket.get_fasta())
+        self.buckets = {}
+        self.bucket_sizes = {}
+        self.memory_size = 0
+        self.bucket_writer.close()
+
+
+class UmiPendingBuckets:
+    """
+    The UmiPendingBuckets class:
+        This class holds back the reads of every umi in a UmiBucket until the
+        umi has minimal_size_abundance reads. Only then its reads are passed on
+        to the bucket writer, together with every later read of that umi, so
+        umis that can not pass the vsearch --sortbysize step never get a umi
+        file. Pending umis are never passed on early to save memory, so the
+        umi files do not depend on the memory budget. The reads of umis that
+        are still pending when the input is processed are discarded.
+    """
+
+    def __init__(self, bucket_writer, minimal_size_abundance):
+        self.bucket_writer = bucket_writer
+        self.minimal_size_abundance = int(minimal_size_abundance)
+        self.buckets = {}
+        self.passed_umis = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, umi_number, header, read):
+        """
+        The write method:
+            This method passes a read on to the bucket writer when its umi has
+            enough reads, otherwise the read is added to the umi bucket of its
+            umi.
+        """
+        if umi_number in self.passed_umis:
+            self.bucket_writer.write(umi_number, header, read)
+        else:
+            if umi_number in self.buckets:
+                self.buckets[umi_number].add(header, read)
+            else:
+                self.buckets[umi_number] = UmiBucket()
+                self.buckets[umi_number].add(header, read)
+            if (
+                len(self.buckets[umi_number].headers)
+                >= self.minimal_size_abundance
+            ):
+                self.release(umi_number)
+            else:
+                pass
+
+    def release(self, umi_number):
+        """
+        The release method:
+            This method passes the reads of a pending umi on to the bucket
+            writer and writes every later read of that umi directly.
+        """
+        for header, read in self.buckets.pop(umi_number).get_records():
+            self.bucket_writer.write(umi_number, header, read)
+        self.passed_umis.add(umi_number)
+
+    def close(self):
+        """
+        The close method:
+            This method discards the umis that are still pending and closes
+            the bucket writer.
+        """
+        self.buckets = {}
+        self.bucket_writer.close()
+
+
+class UmiSortedRuns:
+    """
+    The UmiSortedRuns class:
+        This class collects the reads of every umi as records of the umi
+        number, read header and read. When the approximate memory use of the
+        records exceeds max_memory_size, they are sorted on umi number and
+        written to a run file. The sort is stable and the runs are merged in
+        the order in which they were written, so the reads of a umi keep the
+        order of the input file. At most max_open_files runs are merged at
+        once, more runs are first merged into a single run, so the number of
+        files does not depend on the number of umis.
+    """
+
+    def __init__(self, zip_file, max_memory_size, max_open_files):
+        self.zip_file = zip_file
+        self.max_memory_size = int(max_memory_size)
+        self.max_open_files = max(2, int(max_open_files))
+        self.records = []
+        self.memory_size = 0
+        self.run_files = []
+        self.run_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, umi_number, header, read):
+        """
+        The write method:
+            This method adds the record of a read. The records are written to
+            a run file when the memory budget is exceeded.
+        """
+        self.records.append((umi_number, header, read))
+        self.memory_size += len(header) + len(read) + UMI_RECORD_OVERHEAD
+        if self.memory_size > self.max_memory_size:
+            self.spill()
+        else:
+            pass
+
+    def get_run_file(self):
+        """
+        The get_run_file method:
+            This method returns the name of a new run file.
+        """
+        self.run_count += 1
+        return self.zip_file + "run" + str(self.run_count) + ".umi"
+
+    def write_run(self, records):
+        """
+        The write_run method:
+            This method writes records, sorted on umi number, to a new run
+            file. Every record is written as the umi number and the lengths of
+            the read header and read, followed by the read header and read. It
+            returns the name of the run file.
+        """
+        run_file = self.get_run_file()
+        with open(run_file, "wb", buffering=1048576) as output_file:
+            for umi_number, header, read in records:
+                output_file.write(
+                    struct.pack("<III", umi_number, len(header), len(read))
+                )
+                output_file.write(header)
+                output_file.write(read)
+        return run_file
+
+    def read_run(self, run_file):
+        """
+        The read_run method:
+            This method yields the records of a run file and removes the run
+            file when all records are read.
+        """
+        with open(run_file, "rb", buffering=1048576) as input_file:
+            while True:
+                record_start = input_file.read(12)
+                if record_start:
+                    umi_number, header_length, read_length = struct.unpack(
+                        "<III", record_start
+                    )
+                    yield (
+                        umi_number,
+                        input_file.read(header_length),
+                        input_file.read(read_length),
+                    )
+                else:
+                    break
+        os.remove(run_file)
+
+    def spill(self):
+        """
+        The spill method:
+            This method sorts the records in memory and writes them to a run
+            file. When there are more than max_open_files runs, the oldest
+            runs are merged into a single run.
+        """
+        self.records.sort(key=lambda record: record[0])
+        self.run_files.append(self.write_run(self.records))
+        self.records = []
+        self.memory_size = 0
+        if len(self.run_files) > self.max_open_files:
+            self.run_files = [
+                self.write_run(
+                    self.merge_runs(self.run_files[: self.max_open_files])
+                )
+            ] + self.run_files[self.max_open_files :]
+        else:
+            pass
+
+    def merge_runs(self, run_files):
+        """
+        The merge_runs method:
+            This method merges the records of run files on umi number. Records
+            with the same umi number are taken from the oldest run first.
+        """
+        return heapq.merge(
+            *[self.read_run(run_file) for run_file in run_files],
+            key=lambda record: record[0],
+        )
+
+    def close(self):
+        """
+        The close method:
+            This method sorts the records that are still in memory, when run
+            files were written they are written to a last run file.
+        """
+        if self.run_files and self.records:
+            self.spill()
+        else:
+            self.records.sort(key=lambda record: record[0])
+
+    def get_umi_groups(self):
+        """
+        The get_umi_groups method:
+            This method yields the umi number and the read headers and reads of
+            every umi, in the order of the umi numbers.
+        """
+        if self.run_files:
+            records = self.merge_runs(self.run_files)
+            self.run_files = []
+        else:
+            records = self.records
+            self.records = []
+        for umi_number, umi_records in itertools.groupby(
+            records, key=lambda record: record[0]
+        ):
+            yield umi_number, [
+                (header, read) for umi_number, header, read in umi_records
+            ]
+
+
+class UmiBucketSummary:
+    """
+    The UmiBucketSummary class:
+        This class keeps track of the umi files in which all reads are
+        identical. For every umi file the label of the first read header, the
+        uppercase read and the number of reads are stored. As soon as a
+        different read is found, comparing them case insensitive like vsearch
+        does, the umi file is marked as diverse by replacing its entry with
+        None.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, umi_number, header, read):
+        """
+        The add method:
+            This method adds a read to the summary of a umi file.
+        """
+        if umi_number in self.buckets:
+            trivial_read = self.buckets[umi_number]
+            if trivial_read != None:
+                if trivial_read[1] == read.upper():
+                    trivial_read[2] += 1
+                else:
+                    self.buckets[umi_number] = None
+            else:
+                pass
+        else:
+            self.buckets[umi_number] = [
+                get_read_label(header.decode()),
+                read.upper(),
+                1,
+            ]
+
+
+def get_fasta_files(
+    header,
+    read,
+    umi_key,
+    umi_table,
+    bucket_writer,
+    bucket_summary,
+):
+    """
+    The get_fasta_files function:
+        This function creates separate fasta files for every unique umi. The
+        UmiTable gives the umi number of the umi and the function hands the
+        read header and the read itself to the UmiBucketWriter, which appends
+        them to the umi file of that number. The read is also added to the
+        UmiBucketSummary, when one is given.
+    """
+    umi_number = umi_table.add(umi_key)
+    bucket_writer.write(umi_number, header, read)
+    if bucket_summary != None:
+        bucket_summary.add(umi_number, header, read)
+    else:
+        pass
+
+
+def get_target_zero(read, umi_length, search_method, forward, reverse):
+    """
+    The get_target_zero function:
+        This function checks if both the forward and reverse primer have been
+        found, if that succeeds, the forward or reverse (when working with
+        single umis) or forward and reverse (when working with double umis)
+        nucleotides are isolated based on the length of the umi. This isolation
+        is done from the first nucleotide at the 5'-end of a read and the last
+        nucleotide at the 3'-end of a read.
+    """
+    if forward != None and reverse != None:
+        if search_method == "umi5":
+            return read[0:umi_length]
+        elif search_method == "umidouble":
+            return (read[0:umi_length], read[-umi_length:])
+        elif search_method == "umi3":
+            return read[-umi_length:]
+        else:
+            pass
+    else:
+        pass
+
+
+def get_target_front(read, umi_length, search_method, forward, reverse):
+    """
+    The get_target_front function:
+        This function uses the regex matches of the forward and reverse
+        scaffold in the provided read. It will isolate either a forward or
+        reverse umi or double umis. The isolation is based on this read
+        structure SCAFFOLDF-UMI-PRIMERF-PRODUCT-PRIMERR-UMI-SCAFFOLDR. When
+        looking for the forward umi, the last position of SCAFFOLDF is used,
+        when looking for the reverse umi, the first position of SCAFFOLDR is
+        used, when looking for double umis both positions are used. The
+        mentioned positions + or - the umi length result in a umi code. Both
+        scaffolds need to be present, when searching for a single umi the
+        other scaffold acts as a check.
+    """
+    if forward != None and reverse != None:
+        if search_method == "umi5" or search_method == "umidouble":
+            forward_position = forward.end()
+            umi_forward_position = forward_position + umi_length
+            forward_umi_code = read[forward_position:umi_forward_position]
+            if search_method == "umi5":
+                return forward_umi_code
+            else:
+                reverse_position = reverse.start()
+                umi_reverse_position = reverse_position - umi_length
+                reverse_umi_code = read[umi_reverse_position:reverse_position]
+                return forward_umi_code, reverse_umi_code
+        elif search_method == "umi3":
+            reverse_position = reverse.start()
+            umi_reverse_position = reverse_position - umi_length
+            reverse_umi_code = read[umi_reverse_position:reverse_position]
+            return reverse_umi_code
+        else:
+            pass
+    else:
+        pass
+
+
+def get_target_behind(read, umi_length, search_method, forward, reverse):
+    """
+    The get_target_behind function:
+        This function uses the regex matches of the forward and reverse
+        primer in the provided read. It will isolate either a forward or
+        reverse umi or double umis. The isolation is based on this read
+        structure UMI-PRIMERF-PRODUCT-PRIMERR-UMI. When looking for the
+        forward umi, the first position of PRIMERF is used, when looking for
+        the reverse umi, the last position of PRIMERR is used, when looking
+        for double umis both positions are used. The mentioned positions + or
+        - the umi length result in a umi code. Both primers need to be
+        present, when searching for a single umi the other primer acts as a
+        check.
+    """
+    if forward != None and reverse != None:
+        if search_method == "umi5" or search_method == "umidouble":
+            forward_position = forward.start()
+            umi_forward_position = forward_position - umi_length
+            forward_umi_code = read[umi_forward_position:forward_position]
+            if search_method == "umi5":
+                return forward_umi_code
+            else:
+                reverse_position = reverse.end()
+                umi_reverse_position = reverse_position + umi_length
+                reverse_umi_code = read[reverse_position:umi_reverse_position]
+                return forward_umi_code, reverse_umi_code
+        elif search_method == "umi3":
+            reverse_position = reverse.end()
+            umi_reverse_position = reverse_position + umi_length
+            reverse_umi_code = read[reverse_position:umi_reverse_position]
+            return reverse_umi_code
+        else:
+            pass
+    else:
+        pass
+
+
+def create_reverse_complement(line):
+    """
+    The create_reverse_complement function:
+        This function creates a complementary string using a sequence as input.
+        The function loops through a list version of the sequence and checks
+        and changes every character. It then returns a joined string.
+    """
+    complement_codes_dictionary = {
+        "A": "T",
+        "T": "A",
+        "G": "C",
+        "C": "G",
+        "M": "K",
+        "R": "Y",
+        "W": "W",
+        "S": "S",
+        "Y": "R",
+        "K": "M",
+        "V": "B",
+        "H": "D",
+        "D": "H",
+        "B": "V",
+        "N": "N",
+    }
+    line_list = list(line)
+    for position in range(len(line_list)):
+        line_list[position] = complement_codes_dictionary[line_list[position]]
+    return "".join(line_list)
+
+
+def get_reverse_complement(read):
+    """
+    The get_reverse_complement function:
+        This function returns the reverse complement of a read as bytes. The
+        read is complemented in one step with the READ_COMPLEMENT translation
+        table and reversed with a slice, so it is fast enough to be used for
+        every read.
+    """
+    return read.translate(READ_COMPLEMENT)[::-1]
+
+
+def generate_regex(line):
+    """
+    The generate_regex function:
+        This function creates a regex string using a sequence as input. This
+        regex string is based on the iupac ambiguity codes. The function loops
+        through a list version of the sequence and checks per character if it
+        is a ambiguous character, and changes it into regex code if so. It then
+        returns a joined string.
+    """
+    ambiguity_codes = {
+        "M": "[AC]",
+        "R": "[AG]",
+        "W": "[AT]",
+        "S": "[CG]",
+        "Y": "[CT]",
+        "K": "[GT]",
+        "V": "[ACG]",
+        "H": "[ACT]",
+        "D": "[AGT]",
+        "B": "[CGT]",
+        "N": "[GATC]",
+    }
+    line_list = list(line)
+    for position in range(len(line_list)):
+        if (
+            line_list[position] != "A"
+            and line_list[position] != "T"
+            and line_list[position] != "G"
+            and line_list[position] != "C"
+        ):
+            line_list[position] = ambiguity_codes[line_list[position]]
+        else:
+            pass
+    return "".join(line_list)
+
+
+def get_primer_masks(primer):
+    """
+    The get_primer_masks function:
+        This function creates the bit masks of the bit-parallel search using
+        a primer/scaffold as input. Every position of the primer/scaffold is
+        a bit, the mask of a nucleotide has the bits set of the positions
+        that accept it. The accepted nucleotides of the iupac ambiguity codes
+        are taken from the generate_regex function. It returns a list with a
+        mask for every byte value, so a read can be looked up byte by byte.
+    """
+    masks = [0] * 256
+    for position, code in enumerate(primer):
+        for nucleotide in generate_regex(code).strip("[]"):
+            masks[ord(nucleotide)] |= 1 << position
+    return masks
+
+
+class PrimerMatch:
+    """
+    The PrimerMatch class:
+        This class holds the position of a primer/scaffold that was found by
+        a BitParallelSearch and the number of differences with the read. It
+        has the start and end methods of a regex match, so the get_target
+        functions can use both.
+    """
+
+    __slots__ = ("start_position", "end_position", "distance")
+
+    def __init__(self, start_position, end_position, distance):
+        self.start_position = start_position
+        self.end_position = end_position
+        self.distance = distance
+
+    def start(self):
+        return self.start_position
+
+    def end(self):
+        return self.end_position
+
+
+class BitParallelSearch:
+    """
+    The BitParallelSearch class:
+        This class searches a read for a primer/scaffold allowing at most
+        max_mismatches differences. The positions of the primer/scaffold are
+        the bits of a python integer, so every nucleotide of the read is
+        compared with all positions at once. The hamming distance is searched
+        with the shift-and algorithm of Wu and Manber, the edit distance with
+        the bit-vector algorithm of Myers. The best match is the match with
+        the fewest differences, ties are won by the match that ends first.
+        A match with at most max_mismatches differences contains at least one
+        of max_mismatches + 1 parts of the primer/scaffold without
+        differences. These parts are found with regexes first and only the
+        windows of the read around them are searched bit-parallel.
+    """
+
+    def __init__(self, primer, max_mismatches, distance_method):
+        self.length = len(primer)
+        self.max_mismatches = max_mismatches
+        self.distance_method = distance_method
+        part_length = self.length // (max_mismatches + 1)
+        self.part_regexes = []
+        if part_length >= MIN_PART_LENGTH:
+            for part_number in range(max_mismatches + 1):
+                position = part_number * part_length
+                if part_number == max_mismatches:
+                    part = primer[position:]
+                else:
+                    part = primer[position : position + part_length]
+                part_regex = "(?=" + generate_regex(part) + ")"
+                self.part_regexes.append(
+                    (position, re.compile(part_regex.encode()))
+                )
+        else:
+            pass
+        self.masks = get_primer_masks(primer)
+        self.reverse_masks = get_primer_masks(primer[::-1])
+        self.all_bits = (1 << self.length) - 1
+        self.last_bit = 1 << (self.length - 1)
+
+    def get_windows(self, read):
+        """
+        The get_windows method:
+            This method finds every position of every part of the
+            primer/scaffold in the read. A match that contains the part
+            starts at most max_mismatches nucleotides away from the position
+            of the part minus its offset in the primer/scaffold. It returns
+            the sorted list of these windows, overlapping windows are merged.
+            The whole read is a single window when the parts are shorter than
+            MIN_PART_LENGTH.
+        """
+        if not self.part_regexes:
+            return [[0, len(read)]]
+        else:
+            pass
+        windows = []
+        for part_position, part_regex in self.part_regexes:
+            for part_match in part_regex.finditer(read):
+                start_position = part_match.start() - part_position
+                windows.append(
+                    (
+                        max(0, start_position - self.max_mismatches),
+                        min(
+                            len(read),
+                            start_position + self.length + self.max_mismatches,
+                        ),
+                    )
+                )
+        windows.sort()
+        merged_windows = []
+        for window_start, window_end in windows:
+            if merged_windows and window_start <= merged_windows[-1][1]:
+                merged_windows[-1][1] = max(merged_windows[-1][1], window_end)
+            else:
+                merged_windows.append([window_start, window_end])
+        return merged_windows
+
+    def search(self, read):
+        """
+        The search method:
+            This method searches an uppercase read for the primer/scaffold
+            with the chosen distance [hamming/edit] in the windows of
+            get_windows. It returns a PrimerMatch, or None when the
+            primer/scaffold is not found.
+        """
+        best_match = None
+        for window_start, window_end in self.get_windows(read):
+            if self.distance_method == "edit":
+                primer_match = self.search_edit(read, window_start, window_end)
+            else:
+                primer_match = self.search_hamming(
+                    read, window_start, window_end
+                )
+            if primer_match != None and (
+                best_match == None
+                or primer_match.distance < best_match.distance
+            ):
+                best_match = primer_match
+            else:
+                pass
+        return best_match
+
+    def search_hamming(self, read, window_start, window_end):
+        """
+        The search_hamming method:
+            This method keeps a state for every number of mismatches, a bit of
+            the state is set when the primer/scaffold up to that position ends
+            at the current nucleotide with at most that many mismatches. A
+            match is found when the last bit is set.
+        """
+        masks = self.masks
+        all_bits = self.all_bits
+        last_bit = self.last_bit
+        states = [0] * (self.max_mismatches + 1)
+        best_match = None
+        for position in range(window_start, window_end):
+            mask = masks[read[position]]
+            previous_state = states[0]
+            states[0] = ((previous_state << 1) | 1) & mask
+            for distance in range(1, len(states)):
+                state = states[distance]
+                states[distance] = (
+                    (((state << 1) | 1) & mask) | ((previous_state << 1) | 1)
+                ) & all_bits
+                previous_state = state
+            if states[-1] & last_bit:
+                distance = 0
+                while not states[distance] & last_bit:
+                    distance += 1
+                if best_match == None or distance < best_match.distance:
+                    best_match = PrimerMatch(
+                        position + 1 - self.length, position + 1, distance
+                    )
+                else:
+                    pass
+            else:
+                pass
+        return best_match
+
+    def get_edit_end(self, read, window_start, window_end, masks, anchored):
+        """
+        The get_edit_end method:
+            This method calculates the edit distance of the primer/scaffold
+            for every end position in the window, keeping one column of the
+            distance matrix as positive and negative difference bit vectors.
+            When anchored is set the match has to start at the start of the
+            window. It returns the lowest distance of at most max_mismatches
+            and the end position where it is first found, or None.
+        """
+        all_bits = self.all_bits
+        last_bit = self.last_bit
+        positive = all_bits
+        negative = 0
+        score = self.length
+        best_end = None
+        for position in range(window_start, window_end):
+            equal = masks[read[position]]
+            vertical = equal | negative
+            horizontal = (((equal & positive) + positive) ^ positive) | equal
+            horizontal_positive = negative | (
+                ~(horizontal | positive) & all_bits
+            )
+            horizontal_negative = positive & horizontal
+            if horizontal_positive & last_bit:
+                score += 1
+            elif horizontal_negative & last_bit:
+                score -= 1
+            else:
+                pass
+            horizontal_positive = (horizontal_positive << 1) & all_bits
+            horizontal_negative = (horizontal_negative << 1) & all_bits
+            if anchored:
+                horizontal_positive |= 1
+            else:
+                pass
+            positive = horizontal_negative | (
+                ~(vertical | horizontal_positive) & all_bits
+            )
+            negative = horizontal_positive & vertical
+            if score <= self.max_mismatches and (
+                best_end == None or score < best_end[0]
+            ):
+                best_end = (score, position + 1)
+            else:
+                pass
+        return best_end
+
+    def search_edit(self, read, window_start, window_end):
+        """
+        The search_edit method:
+            This method finds the end of the best edit distance match with
+            get_edit_end. The start of the match is found by running
+            get_edit_end again on the reversed primer/scaffold and the
+            reversed read in front of the end, anchored at the end.
+        """
+        best_end = self.get_edit_end(
+            read, window_start, window_end, self.masks, False
+        )
+        if best_end != None:
+            distance, end_position = best_end
+            start_position = max(0, end_position - self.length - distance)
+            reversed_read = read[start_position:end_position][::-1]
+            match_length = self.get_edit_end(
+                reversed_read, 0, len(reversed_read), self.reverse_masks, True
+            )[1]
+            return PrimerMatch(
+                end_position - match_length, end_position, distance
+            )
+        else:
+            return None
+
+
+class UmiMatcher:
+    """
+    The UmiMatcher class:
+        This class holds everything that is needed to search a read for umis.
+        It uses the functions generate_regex and create_reverse_complement to
+        create regex strings of both the forward primer/scaffold and the
+        reverse complement primer/scaffold and compiles them as bytes
+        patterns. The class is created once per run, so the regex strings are
+        not rebuilt for every read. When max_mismatches is set a
+        BitParallelSearch is created for both as well. When both_strands is
+        True the reads are searched on the minus strand too.
+    """
+
+    def __init__(
+        self,
+        process,
+        umi_length,
+        search_method,
+        forward,
+        reverse,
+        max_mismatches=0,
+        distance_method="hamming",
+        both_strands=False,
+    ):
+        self.process = process
+        self.umi_length = int(umi_length)
+        self.search_method = search_method
+        self.both_strands = both_strands
+        forward = forward.upper()
+        reverse_complement = create_reverse_complement(reverse.upper()[::-1])
+        self.forward_regex = re.compile(generate_regex(forward).encode())
+        self.reverse_complement_regex = re.compile(
+            generate_regex(reverse_complement).encode()
+        )
+        if max_mismatches > 0:
+            self.forward_search = BitParallelSearch(
+                forward, max_mismatches, distance_method
+            )
+            self.reverse_complement_search = BitParallelSearch(
+                reverse_complement, max_mismatches, distance_method
+            )
+        else:
+            self.forward_search = None
+            self.reverse_complement_search = None
+
+    def search_forward(self, read):
+        """
+        The search_forward method:
+            This method searches the read for the forward primer/scaffold.
+            The regex is tried first, the BitParallelSearch is only used when
+            the regex finds no exact match. It returns the match or None.
+        """
+        forward_match = self.forward_regex.search(read)
+        if forward_match == None and self.forward_search != None:
+            forward_match = self.forward_search.search(read)
+        else:
+            pass
+        return forward_match
+
+    def search_reverse(self, read):
+        """
+        The search_reverse method:
+            This method searches the read for the reverse complement
+            primer/scaffold, like search_forward. It returns the match or
+            None.
+        """
+        reverse_match = self.reverse_complement_regex.search(read)
+        if reverse_match == None and self.reverse_complement_search != None:
+            reverse_match = self.reverse_complement_search.search(read)
+        else:
+            pass
+        return reverse_match
+
+    def search(self, read):
+        """
+        The search method:
+            This method scans the read for the forward primer/scaffold and the
+            reverse complement primer/scaffold. Every search method needs both
+            to be present, so the reverse complement is only searched for when
+            the forward primer/scaffold has been found. It returns both
+            matches, a missing match is returned as None.
+        """
+        forward_match = self.search_forward(read)
+        if forward_match != None:
+            return forward_match, self.search_reverse(read)
+        else:
+            return None, None
+
+
+def get_umi_code(read, umi_matcher):
+    """
+    The get_umi_code function:
+        This function controls the umi searching process. It uses the
+        UmiMatcher of the current run to find the forward primer/scaffold and
+        the reverse complement primer/scaffold. These regex matches are then
+        directed to the desired functions, this depends on the search method
+        choice [primer/scaffold/zero].
+    """
+    forward_match, reverse_match = umi_matcher.search(read)
+    if umi_matcher.process == "primer":
+        return get_target_behind(
+            read,
+            umi_matcher.umi_length,
+            umi_matcher.search_method,
+            forward_match,
+            reverse_match,
+        )
+    elif umi_matcher.process == "scaffold":
+        return get_target_front(
+            read,
+            umi_matcher.umi_length,
+            umi_matcher.search_method,
+            forward_match,
+            reverse_match,
+        )
+    elif umi_matcher.process == "zero":
+        return get_target_zero(
+            read,
+            umi_matcher.umi_length,
+            umi_matcher.search_method,
+            forward_match,
+            reverse_match,
+        )
+    else:
+        pass
+
+
+def get_pair_umi_code(read, mate_read, umi_matcher):
+    """
+    The get_pair_umi_code function:
+        This function finds the umis of a read pair. The forward
+        primer/scaffold is searched in the R1 read and the reverse complement
+        primer/scaffold in the reverse complement of the R2 read, so the 5'
+        umi is isolated from R1 and the 3' umi from R2 by the get_target_*
+        function of the umi search approach, with the match in the other read
+        as the check. It returns the umis like get_umi_code, or None.
+    """
+    forward_match = umi_matcher.search_forward(read)
+    if forward_match != None:
+        reverse_match = umi_matcher.search_reverse(mate_read)
+    else:
+        return None
+    if umi_matcher.process == "primer":
+        get_target = get_target_behind
+    elif umi_matcher.process == "scaffold":
+        get_target = get_target_front
+    else:
+        get_target = get_target_zero
+    if umi_matcher.search_method == "umi5":
+        return get_target(
+            read, umi_matcher.umi_length, "umi5", forward_match, reverse_match
+        )
+    elif umi_matcher.search_method == "umi3":
+        return get_target(
+            mate_read,
+            umi_matcher.umi_length,
+            "umi3",
+            forward_match,
+            reverse_match,
+        )
+    elif reverse_match != None:
+        return (
+            get_target(
+                read,
+                umi_matcher.umi_length,
+                "umi5",
+                forward_match,
+                reverse_match,
+            ),
+            get_target(
+                mate_read,
+                umi_matcher.umi_length,
+                "umi3",
+                forward_match,
+                reverse_match,
+            ),
+        )
+    else:
+        return None
+
+
+def get_pair_overlap(read, mate_read, offset):
+    """
+    The get_pair_overlap function:
+        This function returns where the overlap of an R1 read and the reverse
+        complement of its R2 read starts in both reads and how long it is,
+        when the R2 read starts at offset on the R1 read. A negative offset
+        means the R2 read starts in front of the R1 read, which happens when
+        the insert is shorter than the reads and both read into the adapter.
+    """
+    read_start = max(offset, 0)
+    read_end = min(len(read), offset + len(mate_read))
+    return read_start, read_start - offset, read_end - read_start
+
+
+def get_pair_offset(read, mate_read):
+    """
+    The get_pair_offset function:
+        This function finds where the reverse complement of an R2 read starts
+        on its R1 read. Every PAIR_SEED_LENGTH nucleotides of the R2 read are
+        looked up in the R1 read, each hit is a possible offset of the
+        overlap, also in front of the R1 read. An offset is kept when the
+        overlap is at least MIN_PAIR_OVERLAP nucleotides long and at most
+        MAX_PAIR_DIFFERENCES percent of it differs. It returns the offset with
+        the smallest share of differences, the longest overlap on a tie, or
+        None when the reads do not overlap.
+    """
+    offsets = set()
+    for seed_start in range(
+        0, len(mate_read) - PAIR_SEED_LENGTH + 1, PAIR_SEED_LENGTH
+    ):
+        seed = mate_read[seed_start : seed_start + PAIR_SEED_LENGTH]
+        position = read.find(seed)
+        while position != -1:
+            offsets.add(position - seed_start)
+            position = read.find(seed, position + 1)
+    best_offset = None
+    best_score = None
+    for offset in offsets:
+        read_start, mate_start, overlap_length = get_pair_overlap(
+            read, mate_read, offset
+        )
+        if overlap_length < MIN_PAIR_OVERLAP:
+            continue
+        else:
+            pass
+        differences = sum(
+            1
+            for nucleotide, mate_nucleotide in zip(
+                read[read_start : read_start + overlap_length],
+                mate_read[mate_start : mate_start + overlap_length],
+            )
+            if nucleotide != mate_nucleotide
+        )
+        if differences * 100 > overlap_length * MAX_PAIR_DIFFERENCES:
+            continue
+        else:
+            pass
+        score = (differences / overlap_length, -overlap_length)
+        if best_score == None or score < best_score:
+            best_offset = offset
+            best_score = score
+        else:
+            pass
+    return best_offset
+
+
+def get_merged_pair(read, quality, mate_read, mate_quality):
+    """
+    The get_merged_pair function:
+        This function merges an R1 read with the reverse complement of its R2
+        read into the single read of the amplicon. The overlap is placed by
+        get_pair_offset, the part of the R1 read in front of it and the part
+        of the R2 read behind it are kept as they are. An R1 read that runs
+        past the end of the R2 read, or an R2 read that starts in front of
+        the R1 read, reads into the adapter and is cut there. Where the reads
+        differ inside the overlap, the nucleotide with the highest quality is
+        used, so the quality of fastq input decides the consensus. Without
+        quality, or on equal quality, the R1 nucleotide is used unless it is
+        an N. The mate_quality has to be reversed like the mate_read. It
+        returns None when the reads do not overlap.
+    """
+    offset = get_pair_offset(read.upper(), mate_read.upper())
+    if offset == None:
+        return None
+    else:
+        pass
+    read_start, mate_start, overlap_length = get_pair_overlap(
+        read, mate_read, offset
+    )
+    overlap = bytearray(read[read_start : read_start + overlap_length])
+    for position in range(overlap_length):
+        nucleotide = overlap[position]
+        mate_nucleotide = mate_read[mate_start + position]
+        if nucleotide | 32 == mate_nucleotide | 32:
+            continue
+        elif quality != None and mate_quality != None:
+            if (
+                mate_quality[mate_start + position]
+                > quality[read_start + position]
+            ):
+                overlap[position] = mate_nucleotide
+            else:
+                pass
+        elif nucleotide | 32 == ord("n"):
+            overlap[position] = mate_nucleotide
+        else:
+            pass
+    return (
+        read[:read_start]
+        + bytes(overlap)
+        + mate_read[mate_start + overlap_length :]
+    )
+
+
+def get_rejection_reason(read, umi_matcher):
+    """
+    The get_rejection_reason function:
+        This function returns why no umi was found in a read, the forward
+        primer/scaffold is missing or the reverse primer/scaffold is missing.
+        The read is searched again with the UmiMatcher, so this is only done
+        when the reads are counted for the run metrics.
+    """
+    forward_match, reverse_match = umi_matcher.search(read)
+    if forward_match == None:
+        return "forward_missing"
+    else:
+        return "reverse_missing"
+
+
+class ThreadedReader(io.RawIOBase):
+    """
+    The ThreadedReader class:
+        This class reads a binary stream in a background thread. The blocks
+        that are read are handed over through a bounded queue, so the
+        decompression of compressed input overlaps with the umi search. Errors
+        of the background thread are raised by the reading thread.
+    """
+
+    def __init__(self, stream, block_size=1048576, queue_size=8):
+        self.stream = stream
+        self.block_size = block_size
+        self.blocks = queue.Queue(queue_size)
+        self.block = memoryview(b"")
+        self.finished = False
+        self.thread = threading.Thread(target=self.fill, daemon=True)
+        self.thread.start()
+
+    def fill(self):
+        """
+        The fill method:
+            This method is run by the background thread. It reads blocks from
+            the stream and puts them in the queue, an empty block marks the
+            end of the stream.
+        """
+        try:
+            block = self.stream.read(self.block_size)
+            while block:
+                self.blocks.put(block)
+                block = self.stream.read(self.block_size)
+            self.blocks.put(b"")
+        except Exception as error:
+            self.blocks.put(error)
+        finally:
+            self.stream.close()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """
+        The readinto method:
+            This method copies the next bytes of the current block into the
+            buffer, a new block is taken from the queue when the current block
+            is used up. It returns the number of bytes copied, zero at the end
+            of the stream.
+        """
+        if not self.block and not self.finished:
+            block = self.blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            elif block:
+                self.block = memoryview(block)
+            else:
+                self.finished = True
+        else:
+            pass
+        size = min(len(buffer), len(self.block))
+        buffer[:size] = self.block[:size]
+        self.block = self.block[size:]
+        return size
+
+
+def get_input_compression(input_file):
+    """
+    The get_input_compression function:
+        This function detects the compression of the input file from its first
+        bytes. It returns "bgzf" for gzip files with the BGZF extra field,
+        "gzip" for other gzip files, "zstd" for zstandard files and None for
+        uncompressed files.
+    """
+    with open(input_file, "rb") as input:
+        magic = input.read(14)
+    if magic[:2] == b"\x1f\x8b":
+        if magic[3] & 4 and magic[12:14] == b"BC":
+            return "bgzf"
+        else:
+            return "gzip"
+    elif magic[:4] == b"\x28\xb5\x2f\xfd":
+        return "zstd"
+    else:
+        return None
+
+
+def open_input(input_file, compression):
+    """
+    The open_input function:
+        This function opens the input file as a binary stream. Gzip, BGZF and
+        zstandard compressed files are decompressed in a ThreadedReader.
+        Zstandard input needs the optional zstandard package.
+    """
+    if compression == "gzip" or compression == "bgzf":
+        stream = gzip.open(input_file, "rb")
+    elif compression == "zstd":
+        if zstandard == None:
+            raise RuntimeError(
+                "The input file is zstandard compressed, this needs the "
+                "zstandard package: pip3 install zstandard"
+            )
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                open(input_file, "rb"), read_across_frames=True, closefd=True
+            )
+    else:
+        return open(input_file, "rb")
+    return io.BufferedReader(ThreadedReader(stream))
+
+
+def is_record_block(lines, operand, record_size):
+    """
+    The is_record_block function:
+        This function checks if a list of lines consists of records of
+        record_size lines that each start with a read header, a line that
+        starts with the operand. For fastq records the third line of every
+        record has to start with +, for fasta records no read may start with
+        >. The lines are checked with map, so this check does not loop over
+        the lines in python.
+    """
+    if len(lines) % record_size != 0:
+        return False
+    elif not all(
+        map(bytes.startswith, lines[0::record_size], itertools.repeat(operand))
+    ):
+        return False
+    elif record_size == 4:
+        return all(map(bytes.startswith, lines[2::4], itertools.repeat(b"+")))
+    else:
+        return not any(
+            map(bytes.startswith, lines[1::2], itertools.repeat(b">"))
+        )
+
+
+def read_fastq_records(input, buffer_size):
+    """
+    The read_fastq_records function:
+        This function reads a binary fastq stream in blocks of buffer_size
+        bytes and yields every record as a (header, read, quality) tuple of
+        bytes, without line endings. Every block is split in lines at once
+        and the lines are grouped per four, a record that is not complete at
+        the end of a block is carried over to the next block. Empty lines are
+        skipped. A record that does not start with @ or that has no + line
+        raises a ValueError, like an incomplete record at the end of the
+        stream.
+    """
+    remainder = b""
+    while True:
+        block = input.read(buffer_size)
+        buffer = remainder + block
+        if b"\r" in buffer:
+            buffer = buffer.replace(b"\r\n", b"\n")
+        else:
+            pass
+        if not block:
+            buffer += b"\n"
+        else:
+            pass
+        lines = buffer.split(b"\n")
+        remainder = lines.pop()
+        if b"\n\n" in buffer or buffer[:1] == b"\n":
+            lines = [line for line in lines if line]
+        else:
+            pass
+        record_lines = len(lines) - len(lines) % 4
+        if record_lines < len(lines):
+            remainder = b"\n".join(lines[record_lines:] + [remainder])
+            lines = lines[:record_lines]
+        else:
+            pass
+        if is_record_block(lines, b"@", 4):
+            yield from zip(lines[0::4], lines[1::4], lines[3::4])
+        else:
+            for header, separator in zip(lines[0::4], lines[2::4]):
+                if header[:1] != b"@" or separator[:1] != b"+":
+                    raise ValueError(
+                        "The input file is not a valid fastq file near: "
+                        + header.decode(errors="replace")
+                    )
+                else:
+                    pass
+        if not block and remainder.strip(b"\n"):
+            raise ValueError(
+                "The input file ends with an incomplete fastq record near: "
+                + remainder.split(b"\n")[0].decode(errors="replace")
+            )
+        elif not block:
+            break
+        else:
+            pass
+
+
+def read_fasta_records(input, buffer_size):
+    """
+    The read_fasta_records function:
+        This function reads a binary fasta stream in blocks of buffer_size
+        bytes and yields every record as a (header, read, None) tuple of
+        bytes, without line endings. The last record of a block is carried
+        over to the next block, because it might not be complete. When every
+        read of a block is on a single line the lines are paired at once,
+        otherwise the block is split in records at the lines that start with
+        > and the wrapped reads are joined. Lines in front of the first read
+        header are skipped.
+    """
+    remainder = b""
+    while True:
+        block = input.read(buffer_size)
+        buffer = remainder + block
+        if b"\r" in buffer:
+            buffer = buffer.replace(b"\r\n", b"\n")
+        else:
+            pass
+        if buffer[:1] != b">":
+            record_start = buffer.find(b"\n>") + 1
+            if record_start == 0 and block:
+                remainder = buffer[buffer.rfind(b"\n") + 1 :]
+                continue
+            elif record_start == 0:
+                break
+            else:
+                buffer = buffer[record_start:]
+        else:
+            pass
+        if block:
+            record_end = buffer.rfind(b"\n>")
+            remainder = buffer[record_end + 1 :]
+            buffer = buffer[: max(record_end, 0)]
+        else:
+            buffer = buffer.rstrip(b"\n")
+        lines = buffer.split(b"\n")
+        if not buffer:
+            pass
+        elif is_record_block(lines, b">", 2):
+            yield from zip(lines[0::2], lines[1::2], itertools.repeat(None))
+        else:
+            for record in buffer[1:].split(b"\n>"):
+                header_end = record.find(b"\n")
+                if header_end == -1:
+                    yield b">" + record, b"", None
+                else:
+                    read = record[header_end + 1 :].replace(b"\n", b"")
+                    yield b">" + record[:header_end], read, None
+        if not block:
+            break
+        else:
+            pass
+
+
+def read_records(input, operand, buffer_size=4194304):
+    """
+    The read_records function:
+        This function yields the (header, read, quality) records of a binary
+        fasta or fastq stream, depending on the operand of the input format.
+        The read header keeps its first character, fasta records have no
+        quality.
+    """
+    if operand == "@":
+        return read_fastq_records(input, buffer_size)
+    else:
+        return read_fasta_records(input, buffer_size)
+
+
+def get_umi_key(umi_code):
+    """
+    The get_umi_key function:
+        This function packs a umi into an integer with 2 bits per nucleotide.
+        The umi is translated to base 4 digits behind a leading 1, which keeps
+        the length of the umi. A umi with other characters than A, C, G and T
+        can not be packed, it is returned as a string instead.
+    """
+    try:
+        return int(b"1" + umi_code.translate(UMI_DIGITS), 4)
+    except ValueError:
+        return umi_code.decode()
+
+
+def get_umi_string(umi_key):
+    """
+    The get_umi_string function:
+        This function unpacks a umi key of get_umi_key into the umi string.
+        The bits behind the leading 1 are read per 2 bits.
+    """
+    if isinstance(umi_key, str):
+        return umi_key
+    else:
+        umi_bits = bin(umi_key)[3:]
+        return "".join(
+            [
+                UMI_NUCLEOTIDES[umi_bits[position : position + 2]]
+                for position in range(0, len(umi_bits), 2)
+            ]
+        )
+
+
+class UmiTable:
+    """
+    The UmiTable class:
+        This class numbers the umi keys in the order in which they are found
+        and counts their reads. Only the read counts are kept in a compact
+        array indexed by umi number. The umi keys of get_umi_key have no
+        fixed width, a umi of any length packs into an integer and a umi with
+        other characters than A, C, G and T stays a string, so they are kept
+        in a list indexed by umi number and a dictionary of umi numbers. The
+        umi string is only unpacked when the name of a umi file is needed.
+    """
+
+    def __init__(self):
+        self.umi_numbers = {}
+        self.umi_keys = []
+        self.umi_counts = array.array("I")
+
+    def add(self, umi_key):
+        """
+        The add method:
+            This method counts a read of a umi key, a new umi key gets the next
+            umi number. It returns the umi number.
+        """
+        umi_number = self.umi_numbers.get(umi_key)
+        if umi_number == None:
+            self.umi_keys.append(umi_key)
+            self.umi_counts.append(1)
+            umi_number = len(self.umi_keys)
+            self.umi_numbers[umi_key] = umi_number
+        else:
+            self.umi_counts[umi_number - 1] += 1
+        return umi_number
+
+    def get_file_identifier(self, umi_number):
+        """
+        The get_file_identifier method:
+            This method returns the name of the umi file of a umi number.
+        """
+        return (
+            "UMI#"
+            + str(umi_number)
+            + "_"
+            + get_umi_string(self.umi_keys[umi_number - 1])
+            + ".fasta"
+        )
+
+
+def get_umi_reads(records, umi_matcher, read_counts=None):
+    """
+    The get_umi_reads function:
+        This function calls the get_umi_code function for every record, which
+        outputs one or two umis. In the case of a double umi search
+        [umidouble] the two umis are put together. It yields the umi key of
+        get_umi_key, the read header and the read of every read that contains
+        a umi. When read_counts is given, the reads without a umi are counted
+        by the reason of get_rejection_reason and the umis that are shorter
+        than the umi length, because the read ends before the umi does, are
+        counted as truncated. When the UmiMatcher searches both strands, a
+        read without a umi is searched again as its reverse complement. A
+        read that has a umi on the minus strand is yielded as its reverse
+        complement, so every read and umi is in the orientation of the
+        primers/scaffolds, these reads are counted as reverse_strand.
+    """
+    for header, read, quality in records:
+        umi_code = get_umi_code(read.upper(), umi_matcher)
+        if umi_code == None and umi_matcher.both_strands:
+            reverse_read = get_reverse_complement(read)
+            umi_code = get_umi_code(reverse_read.upper(), umi_matcher)
+            if umi_code != None:
+                read = reverse_read
+                if read_counts != None:
+                    read_counts["reverse_strand"] += 1
+                else:
+                    pass
+            else:
+                pass
+        else:
+            pass
+        if umi_code != None:
+            if umi_matcher.search_method == "umidouble":
+                umi_code = umi_code[0] + umi_code[1]
+                umi_length = 2 * umi_matcher.umi_length
+            else:
+                umi_length = umi_matcher.umi_length
+            if read_counts != None and len(umi_code) < umi_length:
+                read_counts["truncated_umis"] += 1
+            else:
+                pass
+            yield get_umi_key(umi_code), header, read
+        else:
+            if read_counts != None:
+                read_counts[
+                    get_rejection_reason(read.upper(), umi_matcher)
+                ] += 1
+            else:
+                pass
+
+
+def get_buffer_umi_reads(buffer, operand, umi_matcher, count_reads=False):
+    """
+    The get_buffer_umi_reads function:
+        This function parses the records of a chunk of the input file that is
+        held in memory, the whole chunk is read by read_records as a single
+        block. It returns the umis, read headers and reads that get_umi_reads
+        finds in them as a list, together with the read counts of
+        get_umi_reads when count_reads is True.
+    """
+    records = read_records(io.BytesIO(buffer), operand, len(buffer) + 1)
+    if count_reads:
+        read_counts = collections.Counter()
+    else:
+        read_counts = None
+    return list(get_umi_reads(records, umi_matcher, read_counts)), read_counts
+
+
+def get_chunk_umi_reads(input_file, operand, umi_matcher, count_reads, chunk):
+    """
+    The get_chunk_umi_reads function:
+        This function is run by the worker processes of the parallel parser.
+        It reads the bytes of a (start, end) chunk of the input file and
+        parses them with get_buffer_umi_reads.
+    """
+    start, end = chunk
+    with open(input_file, "rb") as input:
+        input.seek(start)
+        buffer = input.read(end - start)
+    return get_buffer_umi_reads(buffer, operand, umi_matcher, count_reads)
+
+
+def is_record_start(lines, operand):
+    """
+    The is_record_start function:
+        This function checks if the first of a list of lines of bytes starts a
+        record. A fasta record starts at a line that starts with >. A fastq
+        record starts at a line that starts with @ and is followed by a read
+        and a line that starts with +, a quality line that starts with @ is
+        followed by the read of the next record.
+    """
+    if operand == b"@":
+        return lines[0][:1] == b"@" and lines[2][:1] == b"+"
+    else:
+        return lines[0][:1] == b">"
+
+
+def get_chunk_start(input, position, operand):
+    """
+    The get_chunk_start function:
+        This function searches a seekable binary stream from position onwards
+        for the first line that starts a record according to
+        is_record_start. The line that contains position is skipped, because
+        it might be incomplete. It returns the position of that line, or None
+        when the end of the stream is reached first.
+    """
+    input.seek(position)
+    position += len(input.readline())
+    lines = collections.deque(
+        [input.readline(), input.readline(), input.readline()]
+    )
+    while lines[0]:
+        if is_record_start(lines, operand):
+            return position
+        else:
+            position += len(lines.popleft())
+            lines.append(input.readline())
+    return None
+
+
+def get_input_chunks(input_file, operand, chunk_size):
+    """
+    The get_input_chunks function:
+        This function splits an uncompressed input file in byte ranges of
+        about chunk_size bytes. Every range after the first starts at the
+        position get_chunk_start finds. It returns a list of (start, end)
+        byte offsets.
+    """
+    operand = operand.encode()
+    file_size = os.path.getsize(input_file)
+    chunk_starts = [0]
+    with open(input_file, "rb") as input:
+        position = chunk_size
+        while position < file_size:
+            chunk_start = get_chunk_start(input, position, operand)
+            if chunk_start != None:
+                chunk_starts.append(chunk_start)
+                position = chunk_start + chunk_size
+            else:
+                break
+    chunk_ends = chunk_starts[1:] + [file_size]
+    return list(zip(chunk_starts, chunk_ends))
+
+
+def get_bgzf_chunks(input_file, chunk_size):
+    """
+    The get_bgzf_chunks function:
+        This function splits a BGZF compressed input file in ranges of whole
+        BGZF blocks. The block headers are read to find the compressed size
+        of every block and the last four bytes of every block hold its
+        uncompressed size. Blocks are added to a range until it holds about
+        chunk_size uncompressed bytes. It returns a list of (block offset,
+        uncompressed size, last range) tuples.
+    """
+    chunks = []
+    chunk_offset = 0
+    chunk_length = 0
+    with open(input_file, "rb") as input:
+        block_offset = 0
+        block_header = input.read(18)
+        while len(block_header) == 18:
+            if block_header[12:14] != b"BC":
+                raise ValueError(
+                    "The input file is not BGZF compressed at byte "
+                    + str(block_offset)
+                    + "."
+                )
+            else:
+                pass
+            block_size = struct.unpack("<H", block_header[16:18])[0] + 1
+            input.seek(block_offset + block_size - 4)
+            chunk_length += struct.unpack("<I", input.read(4))[0]
+            block_offset += block_size
+            if chunk_length >= chunk_size:
+                chunks.append((chunk_offset, chunk_length, False))
+                chunk_offset = block_offset
+                chunk_length = 0
+            else:
+                pass
+            block_header = input.read(18)
+    chunks.append((chunk_offset, chunk_length, True))
+    return chunks
+
+
+def get_bgzf_chunk_umi_reads(
+    input_file, operand, umi_matcher, count_reads, chunk
+):
+    """
+    The get_bgzf_chunk_umi_reads function:
+        This function is run by the worker processes of the parallel parser
+        for BGZF compressed input. It decompresses the BGZF blocks of a chunk
+        and keeps decompressing the following blocks until the start of the
+        next chunk is found. Both the start of this chunk and the start of the
+        next chunk are found with get_chunk_start, from the first
+        uncompressed byte of the chunk and of the next chunk, the same way the
+        worker of the next chunk finds its start. The chunk is parsed with
+        get_buffer_umi_reads.
+    """
+    block_offset, chunk_length, last_chunk = chunk
+    operand_bytes = operand.encode()
+    data = io.BytesIO()
+    chunk_end = None
+    with open(input_file, "rb") as compressed_input:
+        compressed_input.seek(block_offset)
+        with gzip.GzipFile(fileobj=compressed_input) as input:
+            data.write(input.read(chunk_length))
+            if not last_chunk:
+                chunk_end = get_chunk_start(data, chunk_length, operand_bytes)
+                while chunk_end == None:
+                    block = input.read(65536)
+                    if block:
+                        data.seek(0, io.SEEK_END)
+                        data.write(block)
+                        chunk_end = get_chunk_start(
+                            data, chunk_length, operand_bytes
+                        )
+                    else:
+                        break
+            else:
+                pass
+    if block_offset == 0:
+        chunk_start = 0
+    else:
+        chunk_start = get_chunk_start(data, 0, operand_bytes)
+    if chunk_start != None:
+        return get_buffer_umi_reads(
+            data.getvalue()[chunk_start:chunk_end],
+            operand,
+            umi_matcher,
+            count_reads,
+        )
+    else:
+        return [], collections.Counter()
+
+
+def get_parallel_umi_reads(
+    input_file,
+    operand,
+    umi_matcher,
+    parse_processes,
+    chunk_size,
+    compression,
+    read_counts=None,
+):
+    """
+    The get_parallel_umi_reads function:
+        This function splits the input file with get_input_chunks, or with
+        get_bgzf_chunks for BGZF compressed input, and parses the chunks in a
+        pool of parse_processes worker processes. The chunks are returned in
+        the order of the input file, so the umis, read headers and reads are
+        yielded in the same order as get_umi_reads would yield them, and the
+        umi numbers are assigned in the same order. The read counts of the
+        worker processes are added to read_counts when it is given.
+    """
+    if compression == "bgzf":
+        chunks = get_bgzf_chunks(input_file, chunk_size)
+        chunk_function = get_bgzf_chunk_umi_reads
+    else:
+        chunks = get_input_chunks(input_file, operand, chunk_size)
+        chunk_function = get_chunk_umi_reads
+    with multiprocessing.Pool(parse_processes) as pool:
+        for umi_reads, chunk_counts in pool.imap(
+            functools.partial(
+                chunk_function,
+                input_file,
+                operand,
+                umi_matcher,
+                read_counts != None,
+            ),
+            chunks,
+        ):
+            if read_counts != None:
+                read_counts.update(chunk_counts)
+            else:
+                pass
+            for umi_read in umi_reads:
+                yield umi_read
+
+
+def get_pair_label(header):
+    """
+    The get_pair_label function:
+        This function returns the label of a read header without the first
+        character, cut at the first whitespace and without a /1 or /2 mate
+        suffix, so the headers of both reads of a pair have the same label.
+    """
+    label = header[1:].split(None, 1)[0]
+    if label[-2:] == b"/1" or label[-2:] == b"/2":
+        return label[:-2]
+    else:
+        return label
+
+
+def get_paired_umi_reads(
+    input_file, mate_file, operand, umi_matcher, read_counts=None
+):
+    """
+    The get_paired_umi_reads function:
+        This function reads the R1 input file and the R2 mate file in
+        lockstep, one read pair at a time. A read pair of which the labels of
+        get_pair_label differ, or a file that ends before the other, raises a
+        ValueError as soon as it is found. The umis of every read pair are
+        found by get_pair_umi_code. The R1 read and the reverse complement of
+        the R2 read are merged on their overlap by get_merged_pair, with the
+        quality of fastq input. It yields the umi key, the R1 read header and
+        the merged read, so the read pair is written to its umi file as one
+        read in the orientation of the amplicon. When the UmiMatcher searches
+        both strands, a read pair without a umi is searched again with R1 and
+        R2 swapped, for read pairs of which R1 is read from the minus strand.
+        A read pair that does not overlap, like an amplicon longer than both
+        reads together, is written as the R1 read followed by the reverse
+        complement of the R2 read and counted as unmerged. When more than
+        half of the read pairs with a umi are unmerged a warning is written
+        to stderr, as the reads of such a library are clustered with the
+        gap between the mates left out. The read pairs without a umi and the
+        unmerged read pairs are counted in read_counts when it is given.
+    """
+    umi_pairs = 0
+    unmerged_pairs = 0
+    with open_input(
+        input_file, get_input_compression(input_file)
+    ) as input, open_input(
+        mate_file, get_input_compression(mate_file)
+    ) as mate_input:
+        for record, mate_record in itertools.zip_longest(
+            read_records(input, operand), read_records(mate_input, operand)
+        ):
+            if record == None or mate_record == None:
+                raise ValueError(
+                    "The input file and the mate file do not have the same"
+                    " number of reads."
+                )
+            elif get_pair_label(record[0]) != get_pair_label(mate_record[0]):
+                raise ValueError(
+                    "The reads of the input file and the mate file are out of"
+                    " sync near: "
+                    + record[0].decode()
+                    + " and "
+                    + mate_record[0].decode()
+                )
+            else:
+                pass
+            header, read, quality = record
+            mate_read = get_reverse_complement(mate_record[1])
+            if mate_record[2] != None:
+                mate_quality = mate_record[2][::-1]
+            else:
+                mate_quality = None
+            umi_code = get_pair_umi_code(
+                read.upper(), mate_read.upper(), umi_matcher
+            )
+            if umi_code == None and umi_matcher.both_strands:
+                reverse_read = get_reverse_complement(read)
+                umi_code = get_pair_umi_code(
+                    mate_record[1].upper(), reverse_read.upper(), umi_matcher
+                )
+                if umi_code != None:
+                    read = mate_record[1]
+                    mate_read = reverse_read
+                    if quality != None:
+                        quality, mate_quality = mate_record[2], quality[::-1]
+                    else:
+                        pass
+                    if read_counts != None:
+                        read_counts["reverse_strand"] += 1
+                    else:
+                        pass
+                else:
+                    pass
+            else:
+                pass
+            if umi_code != None:
+                if umi_matcher.search_method == "umidouble":
+                    umi_code = umi_code[0] + umi_code[1]
+                    umi_length = 2 * umi_matcher.umi_length
+                else:
+                    umi_length = umi_matcher.umi_length
+                merged_read = get_merged_pair(
+                    read, quality, mate_read, mate_quality
+                )
+                umi_pairs += 1
+                if merged_read == None:
+                    merged_read = read + mate_read
+                    unmerged_pairs += 1
+                else:
+                    pass
+                if read_counts != None and len(umi_code) < umi_length:
+                    read_counts["truncated_umis"] += 1
+                else:
+                    pass
+                yield get_umi_key(umi_code), header, merged_read
+            elif read_counts != None:
+                if umi_matcher.search_forward(read.upper()) == None:
+                    read_counts["forward_missing"] += 1
+                else:
+                    read_counts["reverse_missing"] += 1
+            else:
+                pass
+    if read_counts != None:
+        read_counts["unmerged_pairs"] += unmerged_pairs
+    else:
+        pass
+    if unmerged_pairs * 2 > umi_pairs:
+        sys.stderr.write(
+            "Warning: "
+            + str(unmerged_pairs)
+            + " of "
+            + str(umi_pairs)
+            + " read pairs with a umi do not overlap, they are clustered as"
+            " the R1 read followed by the reverse complement of the R2"
+            " read.\n"
+        )
+    else:
+        pass
+
+
+def get_input_umi_reads(
+    input_file,
+    operand,
+    umi_matcher,
+    parse_processes,
+    chunk_size,
+    read_counts=None,
+    mate_file=None,
+):
+    """
+    The get_input_umi_reads function:
+        This function yields the umis, read headers and reads of the input
+        file. When a mate_file is given, the read pairs of the input file and
+        the mate file are parsed with get_paired_umi_reads in this process,
+        the parse processes are not used for read pairs. Uncompressed and
+        BGZF compressed input is parsed with get_parallel_umi_reads when more
+        than one parse process is used, other input is opened with open_input
+        and its records are read with read_records and parsed with
+        get_umi_reads. The reads without a umi are counted in read_counts when
+        it is given.
+    """
+    compression = get_input_compression(input_file)
+    if mate_file != None:
+        for umi_read in get_paired_umi_reads(
+            input_file, mate_file, operand, umi_matcher, read_counts
+        ):
+            yield umi_read
+    elif parse_processes > 1 and compression in (None, "bgzf"):
+        for umi_read in get_parallel_umi_reads(
+            input_file,
+            operand,
+            umi_matcher,
+            parse_processes,
+            chunk_size,
+            compression,
+            read_counts,
+        ):
+            yield umi_read
+    else:
+        with open_input(input_file, compression) as input:
+            for umi_read in get_umi_reads(
+                read_records(input, operand), umi_matcher, read_counts
+            ):
+                yield umi_read
+
+
+def get_umi_counts(
+    input_file,
+    operand,
+    umi_matcher,
+    parse_processes,
+    chunk_size,
+    mate_file=None,
+):
+    """
+    The get_umi_counts function:
+        This function counts how many reads every umi of the input file has,
+        using get_input_umi_reads. It returns a UmiTable.
+    """
+    umi_table = UmiTable()
+    for umi_key, header, read in get_input_umi_reads(
+        input_file,
+        operand,
+        umi_matcher,
+        parse_processes,
+        chunk_size,
+        None,
+        mate_file,
+    ):
+        umi_table.add(umi_key)
+    return umi_table
+
+
+def get_masked_umis(umi_code, umi_distance):
+    """
+    The get_masked_umis function:
+        This function creates the masked versions of a umi, every combination
+        of umi_distance positions, or all positions of a shorter umi, is
+        replaced by dots. Two umis of the same length that differ in at most
+        umi_distance positions share at least one masked umi, so the masked
+        umis can be used as keys of an index of neighbouring umis. The dots
+        are added one position at a time, always behind the previous dot, so
+        every combination is made once.
+    """
+    masked_umis = [(umi_code, 0)]
+    for dot_count in range(min(umi_distance, len(umi_code))):
+        masked_umis = [
+            (
+                masked_umi[:position] + "." + masked_umi[position + 1 :],
+                position,
+            )
+            for masked_umi, first_position in masked_umis
+            for position in range(first_position, len(umi_code))
+            if masked_umi[position] != "."
+        ]
+    return [masked_umi for masked_umi, first_position in masked_umis]
+
+
+def get_umi_parents(umi_table, umi_distance):
+    """
+    The get_umi_parents function:
+        This function collapses umis that are likely sequencing errors of a
+        more abundant umi, following the directional method. A umi is
+        connected to a neighbouring umi, that differs in at most umi_distance
+        positions, when it has at least twice the number of reads minus one
+        of that neighbour. The neighbours are looked up in an index of masked
+        umis made by get_masked_umis, so umis are not compared pair by pair.
+        Starting with the most abundant umi, every umi that is not yet
+        collapsed becomes a parent and takes all umis it is connected to,
+        directly or through other umis. The umis of the UmiTable are handled
+        by their index. It returns a dictionary with the parent umi key of
+        every umi key that is collapsed into another umi.
+    """
+    umi_keys = umi_table.umi_keys
+    umi_strings = [get_umi_string(umi_key) for umi_key in umi_keys]
+    umi_counts = umi_table.umi_counts
+    umi_index = collections.defaultdict(list)
+    for umi_position, umi_string in enumerate(umi_strings):
+        for masked_umi in get_masked_umis(umi_string, umi_distance):
+            umi_index[masked_umi].append(umi_position)
+    collapsed_umis = bytearray(len(umi_keys))
+    umi_parents = {}
+    for parent_position in sorted(
+        range(len(umi_keys)), key=umi_counts.__getitem__, reverse=True
+    ):
+        if not collapsed_umis[parent_position]:
+            collapsed_umis[parent_position] = 1
+            umi_queue = collections.deque([parent_position])
+            while umi_queue:
+                umi_position = umi_queue.popleft()
+                minimal_count = (umi_counts[umi_position] + 1) / 2
+                for masked_umi in get_masked_umis(
+                    umi_strings[umi_position], umi_distance
+                ):
+                    for neighbour_position in umi_index[masked_umi]:
+                        if (
+                            not collapsed_umis[neighbour_position]
+                            and umi_counts[neighbour_position] <= minimal_count
+                        ):
+                            collapsed_umis[neighbour_position] = 1
+                            umi_parents[umi_keys[neighbour_position]] = (
+                                umi_keys[parent_position]
+                            )
+                            umi_queue.append(neighbour_position)
+                        else:
+                            pass
+        else:
+            pass
+    return umi_parents
+
+
+def get_abundant_umis(umi_table, umi_parents, minimal_size_abundance):
+    """
+    The get_abundant_umis function:
+        This function returns the umi keys that have at least
+        minimal_size_abundance reads, counting the reads of the umis that are
+        collapsed into them when umi_parents is given. The umi files of other
+        umis can not have a read that passes the vsearch --sortbysize step.
+    """
+    umi_sizes = array.array("I", umi_table.umi_counts)
+    if umi_parents != None:
+        for umi_key, parent_key in umi_parents.items():
+            umi_sizes[
+                umi_table.umi_numbers[parent_key] - 1
+            ] += umi_table.umi_counts[umi_table.umi_numbers[umi_key] - 1]
+    else:
+        pass
+    return {
+        umi_key
+        for umi_key, umi_size in zip(umi_table.umi_keys, umi_sizes)
+        if umi_size >= int(minimal_size_abundance)
+        and (umi_parents == None or umi_key not in umi_parents)
+    }
+
+
+class RunMetrics:
+    """
+    The RunMetrics class:
+        This class records the metrics of a run. Every step of the run is
+        timed with get_stage, which keeps the wall time, the cpu time of the
+        script itself and the cpu time of the processes it started, like
+        vsearch and the parse processes. When count_reads is True the reads
+        without a umi are counted by their reason in read_counts. The read and
+        umi counts, the number of reads per umi as a histogram and the number
+        of vsearch runs of every step are added after these steps. A run that
+        restores its umi collection takes the read counts of the run that
+        collected it and is marked as restored. When the run
+        fails, the step and the error are kept. The metrics are written as a
+        json file by the write method.
+    """
+
+    def __init__(self, count_reads=False):
+        self.stages = collections.OrderedDict()
+        self.current_stage = None
+        if count_reads:
+            self.read_counts = collections.Counter()
+        else:
+            self.read_counts = None
+        self.reads_with_umi = None
+        self.reads_filtered = None
+        self.reads_restored = False
+        self.umi_metrics = collections.OrderedDict()
+        self.vsearch_runs = collections.OrderedDict()
+        self.failure = None
+
+    @contextlib.contextmanager
+    def get_stage(self, stage_name, profile_file=None):
+        """
+        The get_stage method:
+            This method is a context manager that times a step of the run.
+            When profile_file is given, the step is profiled with cProfile and
+            the profile is written to profile_file.
+        """
+        self.current_stage = stage_name
+        if profile_file != None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = None
+        start_time = time.perf_counter()
+        start_times = os.times()
+        try:
+            yield
+        finally:
+            end_times = os.times()
+            self.stages[stage_name] = {
+                "wall_seconds": round(time.perf_counter() - start_time, 3),
+                "cpu_seconds": round(
+                    sum(end_times[:2]) - sum(start_times[:2]), 3
+                ),
+                "child_cpu_seconds": round(
+                    sum(end_times[2:4]) - sum(start_times[2:4]), 3
+                ),
+            }
+            if profiler != None:
+                profiler.disable()
+                profiler.dump_stats(profile_file)
+            else:
+                pass
+        self.current_stage = None
+
+    def get_read_metrics(self):
+        """
+        The get_read_metrics method:
+            This method returns the read counts by reason and the number of
+            filtered reads of the collection, to be kept with the umi
+            collection by write_umi_collection.
+        """
+        if self.read_counts != None:
+            read_counts = dict(self.read_counts)
+        else:
+            read_counts = None
+        return {
+            "read_counts": read_counts,
+            "reads_filtered": self.reads_filtered,
+        }
+
+    def add_restored_reads(self, read_metrics):
+        """
+        The add_restored_reads method:
+            This method adds the read metrics of get_read_metrics of the run
+            that collected a restored umi collection. When that run did not
+            count the reads, the counts by reason are left out instead of
+            reported as 0.
+        """
+        self.reads_restored = True
+        if read_metrics == None:
+            read_metrics = {}
+        else:
+            pass
+        if self.read_counts != None:
+            if read_metrics.get("read_counts") != None:
+                self.read_counts.update(read_metrics["read_counts"])
+            else:
+                self.read_counts = None
+        else:
+            pass
+        self.reads_filtered = read_metrics.get("reads_filtered")
+
+    def add_umi_table(self, umi_table, abundant_umis=None):
+        """
+        The add_umi_table method:
+            This method adds the number of umis and reads of the UmiTable of
+            the run. The number of reads per umi is added as a histogram with
+            bins of powers of two. The reads of umis that are not in
+            abundant_umis are counted as filtered.
+        """
+        self.reads_with_umi = sum(umi_table.umi_counts)
+        if abundant_umis != None:
+            self.reads_filtered = sum(
+                umi_count
+                for umi_key, umi_count in zip(
+                    umi_table.umi_keys, umi_table.umi_counts
+                )
+                if umi_key not in abundant_umis
+            )
+        else:
+            pass
+        self.umi_metrics["found"] = len(umi_table.umi_keys)
+        self.umi_metrics["reads_per_umi"] = collections.OrderedDict()
+        bin_counts = collections.Counter(
+            umi_count.bit_length() for umi_count in umi_table.umi_counts
+        )
+        for bin_number in sorted(bin_counts):
+            if bin_number == 1:
+                bin_name = "1"
+            else:
+                bin_name = (
+                    str(2 ** (bin_number - 1)) + "-" + str(2**bin_number - 1)
+                )
+            self.umi_metrics["reads_per_umi"][bin_name] = bin_counts[
+                bin_number
+            ]
+
+    def add_vsearch_runs(self, stage_name, exit_statuses):
+        """
+        The add_vsearch_runs method:
+            This method adds the vsearch runs of a step, the number of runs
+            and the number of runs per exit status of run_vsearch_pool.
+        """
+        self.vsearch_runs[stage_name] = {
+            "runs": sum(exit_statuses.values()),
+            "exit_statuses": dict(sorted(exit_statuses.items())),
+        }
+
+    def set_failure(self, error):
+        """
+        The set_failure method:
+            This method keeps the step in which the run failed and the error,
+            including the exit status when vsearch failed. The exit statuses
+            of the vsearch runs of the failed step are added as well.
+        """
+        self.failure = {
+            "stage": self.current_stage,
+            "error": str(error),
+        }
+        if isinstance(error, VsearchError):
+            self.failure["exit_status"] = error.returncode
+            if error.exit_statuses != None and self.current_stage != None:
+                self.add_vsearch_runs(self.current_stage, error.exit_statuses)
+            else:
+                pass
+        else:
+            pass
+
+    def get_metrics(self):
+        """
+        The get_metrics method:
+            This method returns the metrics as a dictionary.
+        """
+        metrics = collections.OrderedDict()
+        if self.failure != None:
+            metrics["status"] = "failed"
+            metrics["failure"] = self.failure
+        else:
+            metrics["status"] = "completed"
+        metrics["stages"] = self.stages
+        metrics["reads"] = collections.OrderedDict()
+        if self.read_counts != None and self.reads_with_umi != None:
+            metrics["reads"]["parsed"] = (
+                self.reads_with_umi
+                + self.read_counts["forward_missing"]
+                + self.read_counts["reverse_missing"]
+            )
+        else:
+            pass
+        if self.reads_with_umi != None:
+            metrics["reads"]["with_umi"] = self.reads_with_umi
+        else:
+            pass
+        if self.read_counts != None:
+            for count_name in [
+                "forward_missing",
+                "reverse_missing",
+                "truncated_umis",
+                "reverse_strand",
+                "unmerged_pairs",
+            ]:
+                metrics["reads"][count_name] = self.read_counts[count_name]
+        else:
+            pass
+        if self.reads_filtered != None:
+            metrics["reads"]["filtered"] = self.reads_filtered
+        else:
+            pass
+        if self.reads_restored:
+            metrics["reads"]["restored"] = True
+        else:
+            pass
+        metrics["umis"] = self.umi_metrics
+        metrics["vsearch"] = self.vsearch_runs
+        return metrics
+
+    def write(self, metrics_file):
+        """
+        The write method:
+            This method writes the metrics to a json file.
+        """
+        with open(metrics_file, "w") as output_file:
+            json.dump(self.get_metrics(), output_file, indent=4)
+            output_file.write("\n")
+
+
+def get_input_fingerprint(input_file):
+    """
+    The get_input_fingerprint function:
+        This function returns the fingerprint of the input file, its path,
+        size and modification time. The input file is not read, so a changed
+        input file is recognised without hashing all of its reads.
+    """
+    input_stat = os.stat(input_file)
+    return [
+        os.path.abspath(input_file),
+        input_stat.st_size,
+        input_stat.st_mtime_ns,
+    ]
+
+
+def get_fingerprint(*values):
+    """
+    The get_fingerprint function:
+        This function returns a sha256 hash of the json representation of
+        values, the fingerprint of a step and the parameters it depends on.
+    """
+    return hashlib.sha256(
+        json.dumps(values, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def write_umi_collection(
+    collection_file, umi_table, bucket_summary, read_metrics=None
+):
+    """
+    The write_umi_collection function:
+        This function writes the umi keys and read counts of the UmiTable,
+        the trivial reads of the UmiBucketSummary and the read_metrics of
+        RunMetrics.get_read_metrics to a json file, so a run that restores
+        the collection still reports the reads it parsed. The file is written
+        under a temporary name and renamed, so a stopped run never leaves half
+        a file.
+    """
+    with open(collection_file + ".tmp", "w") as output_file:
+        json.dump(
+            {
+                "read_metrics": read_metrics,
+                "umi_keys": umi_table.umi_keys,
+                "umi_counts": umi_table.umi_counts.tolist(),
+                "trivial_reads": {
+                    str(umi_number): (
+                        [
+                            trivial_read[0],
+                            trivial_read[1].decode(),
+                            trivial_read[2],
+                        ]
+                        if trivial_read != None
+                        else None
+                    )
+                    for umi_number, trivial_read in (
+                        bucket_summary.buckets.items()
+                    )
+                },
+            },
+            output_file,
+        )
+    os.replace(collection_file + ".tmp", collection_file)
+
+
+def read_umi_collection(collection_file):
+    """
+    The read_umi_collection function:
+        This function reads the UmiTable, UmiBucketSummary and read metrics
+        written by write_umi_collection. It returns all three of them, the
+        read metrics are None when they were not written.
+    """
+    with open(collection_file) as input_file:
+        collection = json.load(input_file)
+    umi_table = UmiTable()
+    umi_table.umi_keys = collection["umi_keys"]
+    umi_table.umi_counts = array.array("I", collection["umi_counts"])
+    umi_table.umi_numbers = {
+        umi_key: umi_number
+        for umi_number, umi_key in enumerate(umi_table.umi_keys, 1)
+    }
+    bucket_summary = UmiBucketSummary()
+    for umi_number, trivial_read in collection["trivial_reads"].items():
+        if trivial_read != None:
+            trivial_read[1] = trivial_read[1].encode()
+        else:
+            pass
+        bucket_summary.buckets[int(umi_number)] = trivial_read
+    return umi_table, bucket_summary, collection.get("read_metrics")
+
+
+class StageCheckpoint:
+    """
+    The StageCheckpoint class:
+        This class keeps the names of the umi files a step already finished.
+        Every finished umi file is appended to the checkpoint file as soon as
+        its vsearch run exited, so the umi files that were finished before a
+        run was stopped are known when the run is resumed.
+    """
+
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file) as input_file:
+                self.units = set(input_file.read().splitlines())
+        else:
+            self.units = set()
+
+    def add(self, unit_name):
+        """
+        The add method:
+            This method adds a finished umi file to the checkpoint file.
+        """
+        with open(self.checkpoint_file, "a") as output_file:
+            output_file.write(unit_name + "\n")
+        self.units.add(unit_name)
+
+
+class RunManifest:
+    """
+    The RunManifest class:
+        This class keeps the manifest of a run in the zip_file directory, so a
+        stopped run can be resumed. For every step the manifest holds a
+        fingerprint of the input file and the parameters the step depends on,
+        and whether the step finished. The fingerprint of every step includes
+        the fingerprint of the step before it, so a changed step also redoes
+        the steps after it. The UmiTable and UmiBucketSummary of the
+        collection are written next to the manifest, the umi files finished by
+        a vsearch step are kept by a StageCheckpoint. A manifest that can not
+        be read is treated like a missing one, so every step is done again.
+        When resume is False nothing is read or written and every step is
+        done.
+    """
+
+    def __init__(self, zip_file, resume=False):
+        self.zip_file = zip_file
+        self.resume = resume
+        self.manifest_file = zip_file + "manifest.json"
+        self.collection_file = zip_file + "collection.json"
+        self.stages = {}
+        if resume and os.path.exists(self.manifest_file):
+            with open(self.manifest_file) as input_file:
+                try:
+                    stages = json.load(input_file)
+                except ValueError:
+                    stages = None
+            if isinstance(stages, dict):
+                self.stages = stages
+            else:
+                pass
+        else:
+            pass
+
+    def is_complete(self, stage_name, fingerprint):
+        """
+        The is_complete method:
+            This method returns True when the step finished in an earlier run
+            with the same fingerprint.
+        """
+        return self.resume and self.stages.get(stage_name) == {
+            "fingerprint": fingerprint,
+            "complete": True,
+        }
+
+    def get_checkpoint(self, stage_name, fingerprint):
+        """
+        The get_checkpoint method:
+            This method returns the StageCheckpoint of a step. When the step
+            was started with another fingerprint, its finished umi files are
+            stale and the checkpoint starts empty. It returns None when the
+            run is not resumed.
+        """
+        if self.resume:
+            checkpoint_file = self.zip_file + stage_name + ".checkpoint"
+            if self.stages.get(stage_name, {}).get("fingerprint") != (
+                fingerprint
+            ):
+                if os.path.exists(checkpoint_file):
+                    os.remove(checkpoint_file)
+                else:
+                    pass
+                self.stages[stage_name] = {
+                    "fingerprint": fingerprint,
+                    "complete": False,
+                }
+                self.write()
+            else:
+                pass
+            return StageCheckpoint(checkpoint_file)
+        else:
+            return None
+
+    def set_complete(self, stage_name, fingerprint):
+        """
+        The set_complete method:
+            This method marks a step as finished with its fingerprint.
+        """
+        if self.resume:
+            self.stages[stage_name] = {
+                "fingerprint": fingerprint,
+                "complete": True,
+            }
+            self.write()
+        else:
+            pass
+
+    def write(self):
+        """
+        The write method:
+            This method writes the manifest to a temporary file and renames
+            it, so a stopped run never leaves half a manifest.
+        """
+        with open(self.manifest_file + ".tmp", "w") as output_file:
+            json.dump(self.stages, output_file, indent=4)
+        os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+    def remove_stage_files(self, cluster_directory):
+        """
+        The remove_stage_files method:
+            This method removes the umi, derep, sorted and checkpoint files of
+            an earlier run from the zip_file directory and the cluster files
+            from the cluster_directory, before the collection is done again.
+            The bucket writers append to the umi files, so reads of the
+            earlier run would otherwise be counted twice.
+        """
+        if self.resume:
+            for file_name in os.listdir(self.zip_file):
+                if file_name.startswith(
+                    ("UMI#", "derep", "sorted")
+                ) or file_name.endswith(".checkpoint"):
+                    os.remove(self.zip_file + file_name)
+                else:
+                    pass
+            for file_name in os.listdir(cluster_directory):
+                os.remove(cluster_directory + file_name)
+            self.stages = {}
+        else:
+            pass
+
+    def remove_cluster_files(self, cluster_directory, stage_name, fingerprint):
+        """
+        The remove_cluster_files method:
+            This method removes the cluster files of an earlier run from the
+            cluster_directory when its clustering step was started with
+            another fingerprint. The trivial centroids of that run would
+            otherwise stay behind for umis that are no longer written, for
+            example after a change of minimal_size_abundance.
+        """
+        stage = self.stages.get(stage_name, {})
+        if self.resume and stage.get("fingerprint") != fingerprint:
+            for file_name in os.listdir(cluster_directory):
+                os.remove(cluster_directory + file_name)
+        else:
+            pass
+
+    def save_collection(self, umi_table, bucket_summary, read_metrics):
+        """
+        The save_collection method:
+            This method writes the UmiTable, UmiBucketSummary and read metrics
+            of the collection next to the manifest with write_umi_collection.
+        """
+        if self.resume:
+            write_umi_collection(
+                self.collection_file, umi_table, bucket_summary, read_metrics
+            )
+        else:
+            pass
+
+    def load_collection(self):
+        """
+        The load_collection method:
+            This method reads the UmiTable, UmiBucketSummary and read metrics
+            written by save_collection. It returns all three of them.
+        """
+        return read_umi_collection(self.collection_file)
+
+
+def get_input_hash(input_file, block_size=1048576):
+    """
+    The get_input_hash function:
+        This function returns a sha256 hash of the content of the input file,
+        read in blocks of block_size bytes. The same reads give the same hash
+        wherever the input file is and whenever it was written.
+    """
+    input_hash = hashlib.sha256()
+    with open(input_file, "rb") as input:
+        for block in iter(functools.partial(input.read, block_size), b""):
+            input_hash.update(block)
+    return input_hash.hexdigest()
+
+
+class ResultCache:
+    """
+    The ResultCache class:
+        This class keeps the results of earlier runs in the cache_directory,
+        addressed by a fingerprint of the input content and the parameters
+        the result depends on. Every entry is a directory under the kind of
+        result, the umi buckets or the output files. An entry is written to a
+        temporary directory and renamed when it is complete, so a run never
+        finds half an entry. The modification time of an entry is its last
+        use, when the entries exceed max_cache_size bytes the least recently
+        used entries are removed, except for the entries of the current run.
+    """
+
+    def __init__(self, cache_directory, max_cache_size):
+        self.cache_directory = cache_directory
+        self.max_cache_size = int(max_cache_size)
+        self.used_entries = set()
+        os.makedirs(cache_directory, exist_ok=True)
+
+    def get_entry(self, entry_kind, cache_key):
+        """
+        The get_entry method:
+            This method returns the directory of an entry, ending in a slash,
+            and marks it as used. It returns None when there is no entry.
+        """
+        entry_directory = os.path.join(
+            self.cache_directory, entry_kind, cache_key
+        )
+        if os.path.isdir(entry_directory):
+            os.utime(entry_directory)
+            self.used_entries.add(entry_directory)
+            return entry_directory + "/"
+        else:
+            return None
+
+    def create_entry(self):
+        """
+        The create_entry method:
+            This method returns a new temporary directory, ending in a slash,
+            for the files of an entry.
+        """
+        return tempfile.mkdtemp(prefix="tmp", dir=self.cache_directory) + "/"
+
+    def add_entry(self, entry_kind, cache_key, temporary_directory):
+        """
+        The add_entry method:
+            This method renames a temporary directory of create_entry to the
+            entry of cache_key. When another run added the same entry first,
+            the temporary directory is removed. The cache is evicted to its
+            maximum size afterwards.
+        """
+        os.makedirs(
+            os.path.join(self.cache_directory, entry_kind), exist_ok=True
+        )
+        entry_directory = os.path.join(
+            self.cache_directory, entry_kind, cache_key
+        )
+        try:
+            os.rename(temporary_directory, entry_directory)
+        except OSError:
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+        self.used_entries.add(entry_directory)
+        self.evict()
+
+    def evict(self):
+        """
+        The evict method:
+            This method removes the least recently used entries until the
+            size of all entries is at most max_cache_size.
+        """
+        entries = []
+        for entry_kind in ["buckets", "clusters"]:
+            kind_directory = os.path.join(self.cache_directory, entry_kind)
+            if os.path.isdir(kind_directory):
+                for cache_key in os.listdir(kind_directory):
+                    entry_directory = os.path.join(kind_directory, cache_key)
+                    entries.append(
+                        (
+                            os.stat(entry_directory).st_mtime,
+                            sum(
+                                os.path.getsize(
+                                    os.path.join(entry_directory, file_name)
+                                )
+                                for file_name in os.listdir(entry_directory)
+                            ),
+                            entry_directory,
+                        )
+                    )
+            else:
+                pass
+        cache_size = sum(entry[1] for entry in entries)
+        for last_use, entry_size, entry_directory in sorted(entries):
+            if cache_size <= self.max_cache_size:
+                break
+            elif entry_directory not in self.used_entries:
+                shutil.rmtree(entry_directory, ignore_errors=True)
+                cache_size -= entry_size
+            else:
+                pass
+
+
+def store_umi_collection(
+    result_cache,
+    cache_key,
+    umi_table,
+    bucket_summary,
+    zip_file,
+    bucket_container,
+    read_metrics=None,
+):
+    """
+    The store_umi_collection function:
+        This function adds the umi files of a run to the result_cache. The
+        umi files are concatenated in the order of the umi numbers into a
+        single buckets file, with an index of the name, offset and length of
+        every umi file like the index of a UmiBucketContainer. The UmiTable,
+        UmiBucketSummary and read metrics are written next to it.
+    """
+    entry_directory = result_cache.create_entry()
+    write_umi_collection(
+        entry_directory + "collection.json",
+        umi_table,
+        bucket_summary,
+        read_metrics,
+    )
+    if bucket_container != None:
+        file_names = bucket_container.get_file_names()
+    else:
+        file_names = sorted(
+            [
+                file_name
+                for file_name in os.listdir(zip_file)
+                if file_name.startswith("UMI#")
+            ],
+            key=lambda file_name: int(file_name.split("_")[0][4:]),
+        )
+    block_start = 0
+    with open(entry_directory + "buckets.fasta", "wb") as buckets_file, open(
+        entry_directory + "buckets.index", "w"
+    ) as index_file:
+        for file_name in file_names:
+            if bucket_container != None:
+                fasta = bucket_container.get_fasta(file_name)
+            else:
+                with open(zip_file + file_name, "rb") as umi_file:
+                    fasta = umi_file.read()
+            buckets_file.write(fasta)
+            index_file.write(
+                file_name
+                + "\t"
+                + str(block_start)
+                + "\t"
+                + str(len(fasta))
+                + "\n"
+            )
+            block_start += len(fasta)
+    result_cache.add_entry("buckets", cache_key, entry_directory)
+
+
+def restore_umi_collection(
+    entry_directory, zip_file, bucket_storage, max_open_files, max_buffer_size
+):
+    """
+    The restore_umi_collection function:
+        This function reads the UmiTable, UmiBucketSummary and read metrics of
+        a cache entry of store_umi_collection and writes its umi files again,
+        every umi file of the index is passed to a UmiBucketWriter or
+        UmiBucketContainer. It returns the UmiTable, the UmiBucketSummary, the
+        UmiBucketContainer, which is None with the files bucket storage, and
+        the read metrics.
+    """
+    umi_table, bucket_summary, read_metrics = read_umi_collection(
+        entry_directory + "collection.json"
+    )
+    if bucket_storage == "container":
+        bucket_container = UmiBucketContainer(
+            zip_file, umi_table, max_buffer_size
+        )
+        bucket_writer = bucket_container
+    else:
+        bucket_container = None
+        bucket_writer = UmiBucketWriter(
+            zip_file, umi_table, max_open_files, max_buffer_size
+        )
+    with open(entry_directory + "buckets.fasta", "rb") as buckets_file, open(
+        entry_directory + "buckets.index"
+    ) as index_file, bucket_writer:
+        for line in index_file:
+            file_name, block_start, block_length = line.rstrip("\n").split(
+                "\t"
+            )
+            buckets_file.seek(int(block_start))
+            bucket_writer.write_fasta(
+                int(file_name.split("_")[0][4:]),
+                buckets_file.read(int(block_length)),
+            )
+    return umi_table, bucket_summary, bucket_container, read_metrics
+
+
+def store_output_files(
+    result_cache, cache_key, tabular_file, output_blast_file
+):
+    """
+    The store_output_files function:
+        This function adds the tabular and blast output files of a run to the
+        result_cache.
+    """
+    entry_directory = result_cache.create_entry()
+    shutil.copyfile(tabular_file, entry_directory + "tabular.tsv")
+    shutil.copyfile(output_blast_file, entry_directory + "blast.fasta")
+    result_cache.add_entry("clusters", cache_key, entry_directory)
+
+
+def restore_output_files(entry_directory, tabular_file, output_blast_file):
+    """
+    The restore_output_files function:
+        This function copies the tabular and blast output files of a cache
+        entry of store_output_files to the output locations.
+    """
+    shutil.copyfile(entry_directory + "tabular.tsv", tabular_file)
+    shutil.copyfile(entry_directory + "blast.fasta", output_blast_file)
+
+
+def get_umi_buckets(
+    input_file,
+    zip_file,
+    operand,
+    umi_matcher,
+    minimal_size_abundance,
+    max_open_files,
+    max_buffer_size,
+    bucket_mode,
+    max_memory_size,
+    bucket_storage,
+    parse_processes,
+    chunk_size,
+    umi_correction,
+    umi_distance,
+    abundance_filter,
+    run_metrics,
+    profile_file=None,
+    mate_file=None,
+):
+    """
+    The get_umi_buckets function:
+        This function collects the umis of all reads in the input file with
+        get_input_umi_reads and writes the reads of every umi with
+        get_fasta_files, to a UmiBucketWriter, a UmiBucketContainer or
+        UmiSortedRuns depending on the bucket mode and storage. The umi
+        correction and the abundance filter are applied on the way. It
+        returns the UmiTable, the UmiBucketSummary, the UmiBucketContainer and
+        the UmiSortedRuns, the last three are None when they are not used.
+    """
+    if umi_correction == "directional" or abundance_filter == "count":
+        with run_metrics.get_stage("umi_counts"):
+            umi_counts = get_umi_counts(
+                input_file,
+                operand,
+                umi_matcher,
+                parse_processes,
+                chunk_size,
+                mate_file,
+            )
+    else:
+        umi_counts = None
+    if umi_correction == "directional":
+        with run_metrics.get_stage("umi_correction"):
+            umi_parents = get_umi_parents(umi_counts, umi_distance)
+    else:
+        umi_parents = None
+    if abundance_filter != "none" and umi_counts != None:
+        abundant_umis = get_abundant_umis(
+            umi_counts, umi_parents, minimal_size_abundance
+        )
+    else:
+        abundant_umis = None
+    umi_table = UmiTable()
+    bucket_container = None
+    umi_runs = None
+    if bucket_mode == "sort":
+        bucket_summary = None
+        umi_runs = UmiSortedRuns(zip_file, max_memory_size, max_open_files)
+        bucket_writer = umi_runs
+    elif bucket_storage == "container":
+        bucket_summary = UmiBucketSummary()
+        bucket_container = UmiBucketContainer(
+            zip_file, umi_table, max_buffer_size
+        )
+        bucket_writer = bucket_container
+    else:
+        bucket_summary = UmiBucketSummary()
+        bucket_writer = UmiBucketWriter(
+            zip_file, umi_table, max_open_files, max_buffer_size
+        )
+    if bucket_mode == "memory":
+        bucket_writer = UmiMemoryBuckets(bucket_writer, max_memory_size)
+    else:
+        pass
+    if abundance_filter == "stream" and abundant_umis == None:
+        bucket_writer = UmiPendingBuckets(
+            bucket_writer, minimal_size_abundance
+        )
+    else:
+        pass
+    with run_metrics.get_stage("umi_collection", profile_file):
+        with bucket_writer:
+            for umi_key, header, read in get_input_umi_reads(
+                input_file,
+                operand,
+                umi_matcher,
+                parse_processes,
+                chunk_size,
+                run_metrics.read_counts,
+                mate_file,
+            ):
+                if umi_parents != None:
+                    umi_key = umi_parents.get(umi_key, umi_key)
+                else:
+                    pass
+                if abundant_umis != None and umi_key not in abundant_umis:
+                    umi_table.add(umi_key)
+                else:
+                    get_fasta_files(
+                        header,
+                        read,
+                        umi_key,
+                        umi_table,
+                        bucket_writer,
+                        bucket_summary,
+                    )
+    run_metrics.add_umi_table(umi_table, abundant_umis)
+    return umi_table, bucket_summary, bucket_container, umi_runs
+
+
+class RunOptions:
+    """
+    The RunOptions class:
+        This class holds the tuning options of a run, every option has the
+        default of the command line and can be given by name. The options
+        decide how the umis are searched and corrected, how the umi buckets
+        are written and kept, how many processes and threads are used, how
+        the zip archive is compressed and whether the results of earlier runs
+        are resumed or taken from a cache. Unknown option names raise a
+        TypeError, so a misspelled option is not silently ignored.
+    """
+
+    __slots__ = (
+        "max_open_files",
+        "max_buffer_size",
+        "bucket_mode",
+        "max_memory_size",
+        "bucket_storage",
+        "derep_method",
+        "threads",
+        "vsearch_threads",
+        "parse_processes",
+        "chunk_size",
+        "max_mismatches",
+        "distance_method",
+        "both_strands",
+        "umi_correction",
+        "umi_distance",
+        "abundance_filter",
+        "zip_level",
+        "resume",
+        "cache_directory",
+        "max_cache_size",
+    )
+
+    def __init__(
+        self,
+        max_open_files=256,
+        max_buffer_size=33554432,
+        bucket_mode="disk",
+        max_memory_size=268435456,
+        bucket_storage="files",
+        derep_method="vsearch",
+        threads=1,
+        vsearch_threads=1,
+        parse_processes=1,
+        chunk_size=67108864,
+        max_mismatches=0,
+        distance_method="hamming",
+        both_strands=False,
+        umi_correction="none",
+        umi_distance=1,
+        abundance_filter="none",
+        zip_level=6,
+        resume=False,
+        cache_directory=None,
+        max_cache_size=10737418240,
+    ):
+        self.max_open_files = max_open_files
+        self.max_buffer_size = max_buffer_size
+        self.bucket_mode = bucket_mode
+        self.max_memory_size = max_memory_size
+        self.bucket_storage = bucket_storage
+        self.derep_method = derep_method
+        self.threads = threads
+        self.vsearch_threads = vsearch_threads
+        self.parse_processes = parse_processes
+        self.chunk_size = chunk_size
+        self.max_mismatches = max_mismatches
+        self.distance_method = distance_method
+        self.both_strands = both_strands
+        self.umi_correction = umi_correction
+        self.umi_distance = umi_distance
+        self.abundance_filter = abundance_filter
+        self.zip_level = zip_level
+        self.resume = resume
+        self.cache_directory = cache_directory
+        self.max_cache_size = max_cache_size
+
+
+def get_collection_parameters(
+    process,
+    umi_length,
+    search_method,
+    forward,
+    reverse,
+    format_string,
+    minimal_size_abundance,
+    options,
+):
+    """
+    The get_collection_parameters function:
+        This function returns the parameters the umi collection depends on,
+        the minimal_size_abundance only counts when the abundance filter is
+        used. They are part of the fingerprint of the umi collection and of
+        its key in the ResultCache.
+    """
+    if options.abundance_filter != "none":
+        filter_abundance = minimal_size_abundance
+    else:
+        filter_abundance = None
+    return [
+        process,
+        umi_length,
+        search_method,
+        forward,
+        reverse,
+        format_string,
+        options.max_mismatches,
+        options.distance_method,
+        options.umi_correction,
+        options.umi_distance,
+        options.abundance_filter,
+        filter_abundance,
+        options.both_strands,
+    ]
+
+
+def get_cache_entries(
+    input_file,
+    mate_file,
+    collection_parameters,
+    minimal_size_abundance,
+    identity_score,
+    options,
+    run_metrics,
+):
+    """
+    The get_cache_entries function:
+        This function opens the ResultCache in the cache directory of the
+        options. The key of the umi files is a fingerprint of the content of
+        the input file and mate file and the collection parameters, the key
+        of the output files adds the clustering parameters. It returns the
+        ResultCache, both keys and both entries, an entry is None when it is
+        not in the cache. Without a cache directory everything is None.
+    """
+    if options.cache_directory == None:
+        return None, None, None, None, None
+    else:
+        pass
+    result_cache = ResultCache(options.cache_directory, options.max_cache_size)
+    with run_metrics.get_stage("input_hash"):
+        if mate_file != None:
+            input_hash = [get_input_hash(input_file)]
+            input_hash.append(get_input_hash(mate_file))
+        else:
+            input_hash = get_input_hash(input_file)
+        bucket_key = get_fingerprint(input_hash, *collection_parameters)
+    cluster_key = get_fingerprint(
+        bucket_key,
+        options.derep_method,
+        minimal_size_abundance,
+        identity_score,
+    )
+    return (
+        result_cache,
+        bucket_key,
+        result_cache.get_entry("buckets", bucket_key),
+        cluster_key,
+        result_cache.get_entry("clusters", cluster_key),
+    )
+
+
+def get_resumed_umi_buckets(
+    input_file,
+    zip_file,
+    cluster_directory,
+    operand,
+    umi_matcher,
+    minimal_size_abundance,
+    options,
+    run_manifest,
+    collection_fingerprint,
+    result_cache,
+    bucket_key,
+    bucket_entry,
+    run_metrics,
+    profile_file=None,
+    mate_file=None,
+):
+    """
+    The get_resumed_umi_buckets function:
+        This function returns the umi collection of a run. When the
+        RunManifest holds a finished umi collection with the same
+        fingerprint, its UmiTable and UmiBucketSummary are loaded and the umi
+        files are used as they are. Otherwise the umi files are restored from
+        the bucket entry of the ResultCache, or collected by get_umi_buckets
+        and stored in the ResultCache, and the umi collection is saved in the
+        RunManifest. It returns what get_umi_buckets returns.
+    """
+    if run_manifest.is_complete("umi_collection", collection_fingerprint):
+        umi_table, bucket_summary, read_metrics = (
+            run_manifest.load_collection()
+        )
+        run_metrics.add_umi_table(umi_table)
+        run_metrics.add_restored_reads(read_metrics)
+        return umi_table, bucket_summary, None, None
+    else:
+        pass
+    run_manifest.remove_stage_files(cluster_directory)
+    if bucket_entry != None:
+        with run_metrics.get_stage("restore_umi_collection"):
+            (
+                umi_table,
+                bucket_summary,
+                bucket_container,
+                read_metrics,
+            ) = restore_umi_collection(
+                bucket_entry,
+                zip_file,
+                options.bucket_storage,
+                options.max_open_files,
+                options.max_buffer_size,
+            )
+        umi_runs = None
+        run_metrics.add_umi_table(umi_table)
+        run_metrics.add_restored_reads(read_metrics)
+    else:
+        (
+            umi_table,
+            bucket_summary,
+            bucket_container,
+            umi_runs,
+        ) = get_umi_buckets(
+            input_file,
+            zip_file,
+            operand,
+            umi_matcher,
+            minimal_size_abundance,
+            options.max_open_files,
+            options.max_buffer_size,
+            options.bucket_mode,
+            options.max_memory_size,
+            options.bucket_storage,
+            options.parse_processes,
+            options.chunk_size,
+            options.umi_correction,
+            options.umi_distance,
+            options.abundance_filter,
+            run_metrics,
+            profile_file,
+            mate_file,
+        )
+        read_metrics = run_metrics.get_read_metrics()
+        if result_cache != None:
+            with run_metrics.get_stage("store_umi_collection"):
+                store_umi_collection(
+                    result_cache,
+                    bucket_key,
+                    umi_table,
+                    bucket_summary,
+                    zip_file,
+                    bucket_container,
+                    read_metrics,
+                )
+        else:
+            pass
+    run_manifest.save_collection(umi_table, bucket_summary, read_metrics)
+    run_manifest.set_complete("umi_collection", collection_fingerprint)
+    return umi_table, bucket_summary, bucket_container, umi_runs
+
+
+def submit_zip_archive(zip_archive, zip_file, bucket_container, options):
+    """
+    The submit_zip_archive function:
+        This function starts create_zip_archive in a background thread, so
+        the zip archive is written while the umis are clustered. It returns
+        the future of the zip archive, or None when there is no zip archive
+        or when the sort bucket mode writes it after the clustering.
+    """
+    if zip_archive != None and options.bucket_mode != "sort":
+        zip_executor = ThreadPoolExecutor(max_workers=1)
+        zip_job = zip_executor.submit(
+            create_zip_archive,
+            zip_archive,
+            zip_file,
+            bucket_container,
+            options.zip_level,
+        )
+        zip_executor.shutdown(wait=False)
+        return zip_job
+    else:
+        return None
+
+
+def finish_zip_archive(
+    zip_job, zip_archive, zip_file, bucket_container, options, run_metrics
+):
+    """
+    The finish_zip_archive function:
+        This function waits for the zip archive that submit_zip_archive
+        started, or writes the zip archive when it was not started yet. An
+        error of the background thread is raised here.
+    """
+    if zip_job != None:
+        with run_metrics.get_stage("zip_archive"):
+            zip_job.result()
+    elif zip_archive != None:
+        with run_metrics.get_stage("zip_archive"):
+            create_zip_archive(
+                zip_archive, zip_file, bucket_container, options.zip_level
+            )
+    else:
+        pass
+
+
+def run_checkpoint_stage(
+    run_manifest, run_metrics, stage_name, fingerprint, stage_function, *args
+):
+    """
+    The run_checkpoint_stage function:
+        This function runs a vsearch stage function with args and the
+        StageCheckpoint of the stage, unless the RunManifest records the
+        stage as finished with the same fingerprint. The vsearch runs of the
+        stage are added to run_metrics and the stage is marked as finished.
+    """
+    if run_manifest.is_complete(stage_name, fingerprint):
+        pass
+    else:
+        with run_metrics.get_stage(stage_name):
+            run_metrics.add_vsearch_runs(
+                stage_name,
+                stage_function(
+                    *args, run_manifest.get_checkpoint(stage_name, fingerprint)
+                ),
+            )
+        run_manifest.set_complete(stage_name, fingerprint)
+
+
+def create_umi_clusters(
+    umi_table,
+    bucket_summary,
+    bucket_container,
+    zip_file,
+    cluster_directory,
+    output_blast_file,
+    tabular_file,
+    identity_score,
+    minimal_size_abundance,
+    options,
+    run_manifest,
+    collection_fingerprint,
+    run_metrics,
+):
+    """
+    The create_umi_clusters function:
+        This function makes the centroids of the umi files and the output
+        files. Umi files with only identical reads get their centroid from
+        create_trivial_centroids, the reads of every other umi are
+        dereplicated and sorted by vsearch or by get_native_derep and
+        clustered by vsearch. Every step is run by run_checkpoint_stage with
+        a fingerprint of the umi collection and the parameters of the step,
+        the cluster files of an earlier run with other parameters are
+        removed first. It returns the fingerprint of the output files.
+    """
+    if options.derep_method == "native":
+        cluster_stage = "native_derep_cluster_size"
+        cluster_fingerprint = get_fingerprint(
+            collection_fingerprint,
+            "native",
+            minimal_size_abundance,
+            identity_score,
+        )
+    else:
+        derep_fingerprint = get_fingerprint(collection_fingerprint, "vsearch")
+        sort_fingerprint = get_fingerprint(
+            derep_fingerprint, minimal_size_abundance
+        )
+        cluster_stage = "vsearch_cluster_size"
+        cluster_fingerprint = get_fingerprint(sort_fingerprint, identity_score)
+    run_manifest.remove_cluster_files(
+        cluster_directory, cluster_stage, cluster_fingerprint
+    )
+    with run_metrics.get_stage("trivial_centroids"):
+        trivial_files = create_trivial_centroids(
+            bucket_summary,
+            umi_table,
+            cluster_directory,
+            minimal_size_abundance,
+        )
+    if options.derep_method == "native":
+        run_checkpoint_stage(
+            run_manifest,
+            run_metrics,
+            "native_derep_cluster_size",
+            cluster_fingerprint,
+            get_native_derep_cluster_size,
+            zip_file,
+            cluster_directory,
+            identity_score,
+            minimal_size_abundance,
+            options.threads,
+            options.vsearch_threads,
+            trivial_files,
+            bucket_container,
+        )
+    else:
+        run_checkpoint_stage(
+            run_manifest,
+            run_metrics,
+            "vsearch_derep",
+            derep_fingerprint,
+            get_vsearch_derep,
+            zip_file,
+            options.threads,
+            options.vsearch_threads,
+            trivial_files,
+            bucket_container,
+        )
+        run_checkpoint_stage(
+            run_manifest,
+            run_metrics,
+            "vsearch_sort_by_size",
+            sort_fingerprint,
+            get_vsearch_sort_by_size,
+            zip_file,
+            minimal_size_abundance,
+            options.threads,
+            options.vsearch_threads,
+        )
+        run_checkpoint_stage(
+            run_manifest,
+            run_metrics,
+            "vsearch_cluster_size",
+            cluster_fingerprint,
+            get_vsearch_cluster_size,
+            zip_file,
+            cluster_directory,
+            identity_score,
+            options.threads,
+            options.vsearch_threads,
+        )
+    if run_manifest.is_complete("output_files", cluster_fingerprint):
+        pass
+    else:
+        if options.resume and os.path.exists(output_blast_file):
+            os.remove(output_blast_file)
+        else:
+            pass
+        with run_metrics.get_stage("output_files"):
+            create_output_files(
+                cluster_directory, output_blast_file, tabular_file
+            )
+        run_manifest.set_complete("output_files", cluster_fingerprint)
+    return cluster_fingerprint
+
+
+def run_cluster_stages(
+    umi_table,
+    bucket_summary,
+    bucket_container,
+    umi_runs,
+    zip_file,
+    cluster_directory,
+    output_blast_file,
+    tabular_file,
+    identity_score,
+    minimal_size_abundance,
+    options,
+    run_manifest,
+    collection_fingerprint,
+    result_cache,
+    cluster_key,
+    cluster_entry,
+    run_metrics,
+):
+    """
+    The run_cluster_stages function:
+        This function makes the output files of the umi collection. In the
+        sort bucket mode get_sorted_cluster_size clusters the UmiSortedRuns,
+        output files that are in the ResultCache are restored, otherwise the
+        create_umi_clusters function is called and its output files are
+        stored in the ResultCache.
+    """
+    if options.bucket_mode == "sort":
+        with run_metrics.get_stage("sorted_cluster_size"):
+            get_sorted_cluster_size(
+                umi_runs,
+                umi_table,
+                zip_file,
+                output_blast_file,
+                tabular_file,
+                identity_score,
+                minimal_size_abundance,
+                options.threads,
+                options.vsearch_threads,
+            )
+    elif cluster_entry != None:
+        with run_metrics.get_stage("restore_output_files"):
+            restore_output_files(
+                cluster_entry, tabular_file, output_blast_file
+            )
+    else:
+        create_umi_clusters(
+            umi_table,
+            bucket_summary,
+            bucket_container,
+            zip_file,
+            cluster_directory,
+            output_blast_file,
+            tabular_file,
+            identity_score,
+            minimal_size_abundance,
+            options,
+            run_manifest,
+            collection_fingerprint,
+            run_metrics,
+        )
+        if result_cache != None:
+            with run_metrics.get_stage("store_output_files"):
+                store_output_files(
+                    result_cache,
+                    cluster_key,
+                    tabular_file,
+                    output_blast_file,
+                )
+        else:
+            pass
+
+
+def get_umi_collection(
+    input_file,
+    cluster_directory,
+    tabular_file,
+    zip_file,
+    output_blast_file,
+    process,
+    umi_length,
+    search_method,
+    forward,
+    reverse,
+    format_string,
+    operand,
+    identity_score,
+    minimal_size_abundance,
+    options=None,
+    zip_archive=None,
+    mate_file=None,
+    run_metrics=None,
+    profile_file=None,
+):
+    """
+    The get_umi_collection function:
+        This function collects the umis of all reads in the input file with
+        get_input_umi_reads. The tuning options named below are taken from
+        options, a RunOptions object with the defaults when it is None. The
+        primer/scaffold regex strings are compiled once in a UmiMatcher,
+        together with a mismatch tolerant search when max_mismatches is set.
+        The umis are packed into integer keys and every new umi gets the next
+        umi number in a UmiTable. For every read that contains a umi the
+        get_fasta_files function is called, which passes it on to a
+        UmiBucketWriter, or to UmiMemoryBuckets when the bucket mode is
+        memory. With the directional umi correction the umis are counted in a
+        first pass over the input file and the reads of every umi
+        are written under the umi get_umi_parents collapses it into. The
+        abundance filter leaves out the reads of umis with less than
+        minimal_size_abundance reads, using the counts of a first pass over
+        the input file [count] or holding back the reads of every umi in
+        UmiPendingBuckets [stream]. Skipped umis still get their umi number,
+        so the other umi files keep their names. After all reads have been
+        written, umi files with only identical reads get their centroid from
+        create_trivial_centroids, the reads of every other umi are
+        dereplicated and sorted by vsearch or by get_native_derep and
+        clustered by vsearch. Finally the create_output_files function is
+        called. With the container bucket storage the umi files are written
+        to a single UmiBucketContainer, from which the later steps read them.
+        In the sort bucket mode the reads are collected in UmiSortedRuns
+        instead of umi files and get_sorted_cluster_size makes the centroids
+        and output files of every umi in turn. When zip_archive is given, the
+        pre-vsearch zip archive is written by create_zip_archive with
+        zip_level. As soon as the umi files are written, the archive is
+        written in a background thread while the umis are clustered, in the
+        sort bucket mode it is written after the clustering. When a step
+        after the collection fails, the archive is cancelled or waited for
+        and the UmiBucketContainer is closed before the error is raised. The
+        time of every step, the read counts and the vsearch runs are recorded
+        in run_metrics, when profile_file is given the collection of the reads
+        is profiled with cProfile. When resume is True every step that finished
+        is recorded in a RunManifest and a rerun skips the steps, and the umi
+        files of the vsearch steps, that finished with the same input file
+        and parameters. When cache_directory is given, the umi files and the
+        output files are kept in a ResultCache, addressed by the content of
+        the input file and the parameters they depend on. A rerun that only
+        changes the clustering restores the umi files instead of collecting
+        them, a rerun with the same parameters restores the output files.
+        When mate_file is given, the input file holds the R1 reads and the
+        mate file the R2 reads of paired-end sequencing, the read pairs are
+        read in lockstep by get_paired_umi_reads and every read pair is
+        written to its umi file as one read. When both_strands is True, reads
+        without a umi are searched on the minus strand as well and the reads
+        that are found there are collected as their reverse complement. The
+        steps are run by get_cache_entries, get_resumed_umi_buckets,
+        submit_zip_archive, run_cluster_stages and finish_zip_archive.
+    """
+    if options == None:
+        options = RunOptions()
+    else:
+        pass
+    umi_matcher = UmiMatcher(
+        process,
+        umi_length,
+        search_method,
+        forward,
+        reverse,
+        options.max_mismatches,
+        options.distance_method,
+        options.both_strands,
+    )
+    if run_metrics == None:
+        run_metrics = RunMetrics()
+    else:
+        pass
+    if options.resume and (
+        options.bucket_mode == "sort" or options.bucket_storage == "container"
+    ):
+        raise ValueError(
+            "A run can only be resumed with umi files, not with the sort"
+            " bucket mode or the container bucket storage."
+        )
+    else:
+        pass
+    if options.cache_directory != None and options.bucket_mode == "sort":
+        raise ValueError(
+            "The result cache can not be used with the sort bucket mode."
+        )
+    else:
+        pass
+    run_manifest = RunManifest(zip_file, options.resume)
+    collection_parameters = get_collection_parameters(
+        process,
+        umi_length,
+        search_method,
+        forward,
+        reverse,
+        format_string,
+        minimal_size_abundance,
+        options,
+    )
+    (
+        result_cache,
+        bucket_key,
+        bucket_entry,
+        cluster_key,
+        cluster_entry,
+    ) = get_cache_entries(
+        input_file,
+        mate_file,
+        collection_parameters,
+        minimal_size_abundance,
+        identity_score,
+        options,
+        run_metrics,
+    )
+    if mate_file != None:
+        input_fingerprint = [get_input_fingerprint(input_file)]
+        input_fingerprint.append(get_input_fingerprint(mate_file))
+    else:
+        input_fingerprint = get_input_fingerprint(input_file)
+    collection_fingerprint = get_fingerprint(
+        input_fingerprint, *collection_parameters
+    )
+    (
+        umi_table,
+        bucket_summary,
+        bucket_container,
+        umi_runs,
+    ) = get_resumed_umi_buckets(
+        input_file,
+        zip_file,
+        cluster_directory,
+        operand,
+        umi_matcher,
+        minimal_size_abundance,
+        options,
+        run_manifest,
+        collection_fingerprint,
+        result_cache,
+        bucket_key,
+        bucket_entry,
+        run_metrics,
+        profile_file,
+        mate_file,
+    )
+    zip_job = submit_zip_archive(
+        zip_archive, zip_file, bucket_container, options
+    )
+    try:
+        run_cluster_stages(
+            umi_table,
+            bucket_summary,
+            bucket_container,
+            umi_runs,
+            zip_file,
+            cluster_directory,
+            output_blast_file,
+            tabular_file,
+            identity_score,
+            minimal_size_abundance,
+            options,
+            run_manifest,
+            collection_fingerprint,
+            result_cache,
+            cluster_key,
+            cluster_entry,
+            run_metrics,
+        )
+        finish_zip_archive(
+            zip_job,
+            zip_archive,
+            zip_file,
+            bucket_container,
+            options,
+            run_metrics,
+        )
+    finally:
+        if zip_job != None and not zip_job.cancel():
+            zip_job.exception()
+        else:
+            pass
+        if bucket_container != None:
+            bucket_container.close_map()
+        else:
+            pass
+
+
+def set_format(
+    input_file,
+    cluster_directory,
+    tabular_file,
+    zip_file,
+    output_blast_file,
+    process,
+    format_string,
+    umi_length,
+    search_method,
+    forward,
+    reverse,
+    identity_score,
+    minimal_size_abundance,
+    options=None,
+    zip_archive=None,
+    mate_file=None,
+    metrics_file=None,
+    profile_file=None,
+):
+    """
+    The set_format function:
+        This function specifies the first character of the read headers based
+        on the input file format. It then calls the get_umi_collection function.
+        The tuning options are passed on in a RunOptions object. When
+        metrics_file is given, the RunMetrics of the run are written to
+        it, also when the run fails.
+    """
+    if format_string == "fasta":
+        operand = ">"
+    elif format_string == "fastq":
+        operand = "@"
+    else:
+        pass
+    run_metrics = RunMetrics(metrics_file != None)
+    try:
+        get_umi_collection(
+            input_file,
+            cluster_directory,
+            tabular_file,
+            zip_file,
+            output_blast_file,
+            process,
+            umi_length,
+            search_method,
+            forward,
+            reverse,
+            format_string,
+            operand,
+            str(identity_score),
+            str(minimal_size_abundance),
+            options,
+            zip_archive,
+            mate_file,
+            run_metrics,
+            profile_file,
+        )
+    except Exception as error:
+        run_metrics.set_failure(error)
+        raise
+    finally:
+        if metrics_file != None:
+            run_metrics.write(metrics_file)
+        else:
+            pass
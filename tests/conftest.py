@@ -0,0 +1,207 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import os
+import random
+import stat
+import sys
+import pytest
+
+# A stand-in for vsearch that dereplicates, sorts and clusters like vsearch
+# does for reads of the same length. Every run is logged with its command,
+# a cluster run fails with exit status 3 once the log holds the number of
+# cluster runs in FAKE_VSEARCH_CLUSTER_LIMIT.
+FAKE_VSEARCH = """
+import os
+import re
+import sys
+
+arguments = sys.argv[1:]
+with open(os.environ["FAKE_VSEARCH_LOG"], "a+") as log_file:
+    log_file.seek(0)
+    cluster_runs = log_file.read().split().count("--cluster_size")
+    log_file.write(arguments[0] + " " + arguments[1] + "\\n")
+cluster_limit = os.environ.get("FAKE_VSEARCH_CLUSTER_LIMIT")
+if arguments[0] == "--cluster_size" and cluster_limit != None:
+    if cluster_runs >= int(cluster_limit):
+        sys.stderr.write("fatal error\\n")
+        sys.exit(3)
+
+
+def get_option(name):
+    return arguments[arguments.index(name) + 1]
+
+
+def read_fasta(path):
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path) as input_file:
+            text = input_file.read()
+    records = []
+    for record in text.split(">")[1:]:
+        lines = record.splitlines()
+        records.append((lines[0], "".join(lines[1:])))
+    return records
+
+
+def get_size(header):
+    size = re.search(";size=([0-9]+)", header)
+    if size != None and "--sizein" in arguments:
+        return int(size.group(1))
+    elif size != None and "--sortbysize" in arguments:
+        return int(size.group(1))
+    else:
+        return 1
+
+
+def get_label(header):
+    return re.sub(";size=[0-9]+;?", "", header.split()[0])
+
+
+def write_fasta(path, records):
+    text = "".join(
+        ">" + label + ";size=" + str(size) + "\\n" + read + "\\n"
+        for label, read, size in records
+    )
+    if path == "/dev/stdout" or path == "-":
+        sys.stdout.write(text)
+    else:
+        with open(path, "w") as output_file:
+            output_file.write(text)
+
+
+if arguments[0] == "--derep_fulllength":
+    unique_reads = {}
+    for header, read in read_fasta(arguments[1]):
+        if read.upper() in unique_reads:
+            unique_reads[read.upper()][2] += 1
+        else:
+            unique_reads[read.upper()] = [get_label(header), read, 1]
+    write_fasta(
+        get_option("--output"),
+        sorted(unique_reads.values(), key=lambda record: -record[2]),
+    )
+elif arguments[0] == "--sortbysize":
+    records = [
+        (get_label(header), read, get_size(header))
+        for header, read in read_fasta(arguments[1])
+        if get_size(header) >= int(get_option("--minsize"))
+    ]
+    write_fasta(
+        get_option("--output"), sorted(records, key=lambda record: -record[2])
+    )
+elif arguments[0] == "--cluster_size":
+    centroids = []
+    for header, read in sorted(
+        read_fasta(arguments[1]), key=lambda record: -get_size(record[0])
+    ):
+        for centroid in centroids:
+            matches = sum(
+                nucleotide == other
+                for nucleotide, other in zip(centroid[1], read)
+            )
+            if len(centroid[1]) == len(read) and (
+                matches >= float(get_option("--id")) * len(read)
+            ):
+                centroid[2] += get_size(header)
+                break
+        else:
+            centroids.append([get_label(header), read, get_size(header)])
+    write_fasta(get_option("--centroids"), centroids)
+else:
+    sys.exit(1)
+"""
+
+FORWARD = "GGTACTGG"
+REVERSE = "TAGACCTC"
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+
+@pytest.fixture
+def fake_vsearch(tmp_path, monkeypatch):
+    """
+    The fake_vsearch function:
+        This function puts the stand-in for vsearch first on the PATH and
+        returns the location of its log file.
+    """
+    bin_directory = tmp_path / "bin"
+    bin_directory.mkdir()
+    vsearch_file = bin_directory / "vsearch"
+    vsearch_file.write_text("#!" + sys.executable + " -S\n" + FAKE_VSEARCH)
+    vsearch_file.chmod(vsearch_file.stat().st_mode | stat.S_IEXEC)
+    log_file = tmp_path / "vsearch.log"
+    log_file.write_text("")
+    monkeypatch.setenv(
+        "PATH", str(bin_directory) + os.pathsep + os.environ["PATH"]
+    )
+    monkeypatch.setenv("FAKE_VSEARCH_LOG", str(log_file))
+    monkeypatch.delenv("FAKE_VSEARCH_CLUSTER_LIMIT", raising=False)
+    return log_file
+
+
+def get_amplicon_reads(umi_count=24, seed=0):
+    """
+    The get_amplicon_reads function:
+        This function returns (header, read) pairs of amplicon reads with a
+        5' umi in front of the FORWARD primer and the reverse complement of
+        the REVERSE primer at the end. Every umi has 1 to 6 reads of one
+        product, some of them with a sequencing error, so there are umis
+        with only identical reads and umis that need clustering.
+    """
+    generator = random.Random(seed)
+    reverse_complement = REVERSE.translate(COMPLEMENT)[::-1]
+    reads = []
+    for umi_number in range(umi_count):
+        umi = "".join(generator.choice("ACGT") for position in range(6))
+        product = "".join(generator.choice("ACGT") for position in range(40))
+        for read_number in range(generator.randint(1, 6)):
+            read = list(product)
+            if generator.random() < 0.3:
+                position = generator.randrange(len(read))
+                read[position] = "ACGT"[("ACGT".index(read[position]) + 1) % 4]
+            else:
+                pass
+            reads.append(
+                (
+                    "read" + str(len(reads)),
+                    umi + FORWARD + "".join(read) + reverse_complement,
+                )
+            )
+    return reads
+
+
+@pytest.fixture
+def amplicon_fasta(tmp_path):
+    """
+    The amplicon_fasta function:
+        This function writes the reads of get_amplicon_reads to a fasta file
+        and returns its location.
+    """
+    fasta_file = tmp_path / "reads.fasta"
+    fasta_file.write_text(
+        "".join(
+            ">" + header + "\n" + read + "\n"
+            for header, read in get_amplicon_reads()
+        )
+    )
+    return str(fasta_file)
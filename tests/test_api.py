@@ -0,0 +1,202 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import collections
+import gzip
+import re
+import pytest
+import umi_isolation
+from conftest import FORWARD, REVERSE, get_amplicon_reads
+
+COMPLEMENT = bytes.maketrans(b"ACGT", b"TGCA")
+
+
+def write_reads(tmp_path, format_string, compressed=False):
+    """
+    The write_reads function:
+        This function writes the reads of get_amplicon_reads, together with
+        a read without primers, to a fasta or fastq file. It returns the
+        location of the file and the reads.
+    """
+    reads = get_amplicon_reads() + [("noprimers", "ACGT" * 20)]
+    if format_string == "fastq":
+        text = "".join(
+            "@" + header + "\n" + read + "\n+\n" + "I" * len(read) + "\n"
+            for header, read in reads
+        )
+    else:
+        text = "".join(
+            ">" + header + "\n" + read + "\n" for header, read in reads
+        )
+    if compressed:
+        input_file = tmp_path / ("reads." + format_string + ".gz")
+        with gzip.open(str(input_file), "wb") as output_file:
+            output_file.write(text.encode())
+    else:
+        input_file = tmp_path / ("reads." + format_string)
+        input_file.write_text(text)
+    return str(input_file), reads
+
+
+def get_umi_reads(tmp_path, both_strands=False):
+    """
+    The get_umi_reads function:
+        This function returns the reads of write_reads and the umi reads
+        iterate_umi_reads finds in them.
+    """
+    input_file, reads = write_reads(tmp_path, "fasta")
+    return reads, list(
+        umi_isolation.iterate_umi_reads(
+            umi_isolation.iterate_records(input_file),
+            "primer",
+            6,
+            "umi5",
+            FORWARD,
+            REVERSE,
+            both_strands=both_strands,
+        )
+    )
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+@pytest.mark.parametrize("format_string", ["fasta", "fastq"])
+def test_iterate_records_reads_fasta_and_fastq(
+    tmp_path, format_string, compressed
+):
+    """
+    The test_iterate_records_reads_fasta_and_fastq function:
+        This function checks that iterate_records yields the headers, with
+        their first character, reads and qualities of plain and gzip
+        compressed fasta and fastq files.
+    """
+    input_file, reads = write_reads(tmp_path, format_string, compressed)
+    if format_string == "fastq":
+        expected_records = [
+            (b"@" + header.encode(), read.encode(), b"I" * len(read))
+            for header, read in reads
+        ]
+    else:
+        expected_records = [
+            (b">" + header.encode(), read.encode(), None)
+            for header, read in reads
+        ]
+    assert (
+        list(umi_isolation.iterate_records(input_file, format_string))
+        == expected_records
+    )
+
+
+def test_iterate_umi_reads_yields_the_umi_of_every_read(tmp_path):
+    """
+    The test_iterate_umi_reads_yields_the_umi_of_every_read function:
+        This function checks that iterate_umi_reads yields the umi string,
+        header and read of every amplicon read and skips the read without
+        primers.
+    """
+    reads, umi_reads = get_umi_reads(tmp_path)
+    assert umi_reads == [
+        (read[:6], b">" + header.encode(), read.encode())
+        for header, read in reads[:-1]
+    ]
+
+
+def test_iterate_umi_reads_searches_both_strands(tmp_path):
+    """
+    The test_iterate_umi_reads_searches_both_strands function:
+        This function checks that with both_strands the reverse complement of
+        the reads gives the umi reads of the reads themselves.
+    """
+    reads, umi_reads = get_umi_reads(tmp_path)
+    reverse_records = [
+        (
+            b">" + header.encode(),
+            read.encode().translate(COMPLEMENT)[::-1],
+            None,
+        )
+        for header, read in reads
+    ]
+    assert (
+        list(
+            umi_isolation.iterate_umi_reads(
+                reverse_records,
+                "primer",
+                6,
+                "umi5",
+                FORWARD,
+                REVERSE,
+                both_strands=True,
+            )
+        )
+        == umi_reads
+    )
+
+
+def test_iterate_umi_buckets_groups_the_reads_per_umi(tmp_path):
+    """
+    The test_iterate_umi_buckets_groups_the_reads_per_umi function:
+        This function checks that iterate_umi_buckets yields every umi once,
+        in the order in which it was found, with its reads in input order.
+    """
+    reads, umi_reads = get_umi_reads(tmp_path)
+    interleaved_reads = umi_reads[0::2] + umi_reads[1::2]
+    umi_buckets = list(umi_isolation.iterate_umi_buckets(interleaved_reads))
+    assert [umi for umi, umi_records in umi_buckets] == list(
+        collections.OrderedDict.fromkeys(
+            umi for umi, header, read in interleaved_reads
+        )
+    )
+    for umi, umi_records in umi_buckets:
+        assert umi_records == [
+            (header, read)
+            for read_umi, header, read in interleaved_reads
+            if read_umi == umi
+        ]
+
+
+def test_iterate_umi_centroids_cluster_every_umi(tmp_path, fake_vsearch):
+    """
+    The test_iterate_umi_centroids_cluster_every_umi function:
+        This function checks that iterate_umi_centroids yields centroids for
+        every umi, whose sizes add up to the reads of the umi, and only runs
+        vsearch for umis with more than one distinct read.
+    """
+    reads, umi_reads = get_umi_reads(tmp_path)
+    umi_buckets = list(umi_isolation.iterate_umi_buckets(umi_reads))
+    centroid_sizes = collections.Counter()
+    for (
+        umi,
+        centroid_header,
+        centroid_read,
+    ) in umi_isolation.iterate_umi_centroids(umi_buckets, 0.97):
+        assert centroid_header.startswith("read")
+        assert centroid_read.startswith(umi + FORWARD)
+        centroid_sizes[umi] += int(
+            re.search(r";size=(\d+)", centroid_header).group(1)
+        )
+    assert centroid_sizes == {
+        umi: len(umi_records) for umi, umi_records in umi_buckets
+    }
+    assert len(fake_vsearch.read_text().splitlines()) == sum(
+        1
+        for umi, umi_records in umi_buckets
+        if len(set(read for header, read in umi_records)) > 1
+    )
@@ -0,0 +1,162 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import os
+import pytest
+from umi_isolation import isolation
+from umi_isolation.batch import (
+    get_sample_option,
+    read_sample_sheet,
+    run_sample,
+)
+
+SAMPLE_HEADER = (
+    "sample\tinput\tformat\tprocess\tumi_length\tsearch_method\tforward"
+    "\treverse\tidentity_score\tabundance\n"
+)
+
+
+def write_sample_sheet(tmp_path, sample_lines):
+    """
+    The write_sample_sheet function:
+        This function writes a sample sheet with the sample lines, every
+        input file is an empty fasta file in tmp_path.
+    """
+    (tmp_path / "reads.fasta").write_text("")
+    sample_sheet = tmp_path / "samples.tsv"
+    sample_sheet.write_text(
+        SAMPLE_HEADER
+        + "".join(
+            "\t".join(sample_line).replace(
+                "INPUT", str(tmp_path / "reads.fasta")
+            )
+            + "\n"
+            for sample_line in sample_lines
+        )
+    )
+    return str(sample_sheet)
+
+
+VALID_LINE = [
+    "a",
+    "INPUT",
+    "fasta",
+    "primer",
+    "6",
+    "umi5",
+    "GGWACWGG",
+    "TANACYTC",
+    "",
+    "",
+]
+
+
+def test_valid_sample_sheet(tmp_path):
+    """
+    The test_valid_sample_sheet function:
+        This function checks that a valid sample sheet is read.
+    """
+    samples = read_sample_sheet(write_sample_sheet(tmp_path, [VALID_LINE]))
+    assert [sample["sample"] for sample in samples] == ["a"]
+
+
+@pytest.mark.parametrize(
+    "position, value",
+    [
+        (0, "../a"),
+        (0, "x/a"),
+        (2, "fastaq"),
+        (3, "primr"),
+        (4, "six"),
+        (4, "0"),
+        (5, "umi7"),
+        (1, "missing.fasta"),
+        (6, "GGWACXGG"),
+        (7, "TANAC-TC"),
+        (8, "1.5"),
+        (8, "high"),
+        (9, "-1"),
+        (9, "0"),
+        (9, "2.5"),
+    ],
+)
+def test_invalid_sample_sheet(tmp_path, position, value):
+    """
+    The test_invalid_sample_sheet function:
+        This function checks that an invalid value in any of the checked
+        columns raises a ValueError when the sample sheet is read.
+    """
+    sample_line = list(VALID_LINE)
+    sample_line[0] = "b"
+    sample_line[position] = value
+    with pytest.raises(ValueError):
+        read_sample_sheet(
+            write_sample_sheet(tmp_path, [VALID_LINE, sample_line])
+        )
+
+
+def test_optional_columns_and_lower_case_primers(tmp_path):
+    """
+    The test_optional_columns_and_lower_case_primers function:
+        This function checks that lower case primers and filled in optional
+        columns are accepted, and that an identity score of 0 is used
+        instead of the default.
+    """
+    sample_line = list(VALID_LINE)
+    sample_line[6] = "ggwacwgg"
+    sample_line[8] = "0"
+    sample_line[9] = "2"
+    samples = read_sample_sheet(write_sample_sheet(tmp_path, [sample_line]))
+    assert get_sample_option(samples[0], "identity_score", "0.97") == "0"
+    assert get_sample_option(samples[0], "abundance", 1) == "2"
+    assert get_sample_option({"abundance": 0}, "abundance", 1) == "0"
+    assert get_sample_option({"abundance": ""}, "abundance", 1) == "1"
+    assert get_sample_option({}, "identity_score", 0.97) == "0.97"
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_the_work_directory_is_removed(tmp_path, monkeypatch, fails):
+    """
+    The test_the_work_directory_is_removed function:
+        This function checks that the work directory of a sample is removed
+        when the sample is done, also when the run of the sample fails.
+    """
+
+    def get_umi_collection(
+        input_file, cluster_directory, *arguments, **options
+    ):
+        with open(cluster_directory + "umi1.fasta", "w") as output:
+            output.write(">read\nACGT\n")
+        if fails:
+            raise isolation.VsearchError("vsearch failed", 1)
+        else:
+            pass
+
+    monkeypatch.setattr(isolation, "get_umi_collection", get_umi_collection)
+    samples = read_sample_sheet(write_sample_sheet(tmp_path, [VALID_LINE]))
+    output_directory = str(tmp_path / "output")
+    if fails:
+        with pytest.raises(isolation.VsearchError):
+            run_sample(samples[0], output_directory, "0.97", "1", "native", 1)
+    else:
+        run_sample(samples[0], output_directory, "0.97", "1", "native", 1)
+    assert os.listdir(output_directory) == []
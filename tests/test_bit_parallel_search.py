@@ -0,0 +1,231 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import random
+import pytest
+from umi_isolation.isolation import (
+    BitParallelSearch,
+    MIN_PART_LENGTH,
+    generate_regex,
+)
+
+PRIMERS = [
+    "GGWACWGG",
+    "TANACYTC",
+    "GGTCAACAAATCATAAAGATATTGG",
+    "ACGTRYKMSWBDHVN",
+    "ACGT",
+]
+
+
+def get_accepted_nucleotides(primer):
+    """
+    The get_accepted_nucleotides function:
+        This function returns the set of nucleotides every position of the
+        primer accepts, taken from generate_regex.
+    """
+    return [set(generate_regex(code).strip("[]").encode()) for code in primer]
+
+
+def get_hamming_reference(read, primer, max_mismatches):
+    """
+    The get_hamming_reference function:
+        This function compares the primer with every window of the read. It
+        returns the start, end and distance of the window with the fewest
+        mismatches that ends first, or None.
+    """
+    accepted = get_accepted_nucleotides(primer)
+    best_match = None
+    for start in range(len(read) - len(primer) + 1):
+        distance = sum(
+            read[start + position] not in accepted[position]
+            for position in range(len(primer))
+        )
+        if distance <= max_mismatches and (
+            best_match == None or distance < best_match[2]
+        ):
+            best_match = (start, start + len(primer), distance)
+        else:
+            pass
+    return best_match
+
+
+def get_edit_row(read, primer, free_start):
+    """
+    The get_edit_row function:
+        This function fills the full distance matrix of the primer and the
+        read and returns its last row, the edit distance of the primer for
+        every end in the read. When free_start is True the primer may start
+        anywhere in the read, else it starts at the start of the read.
+    """
+    accepted = get_accepted_nucleotides(primer)
+    if free_start:
+        previous_row = [0] * (len(read) + 1)
+    else:
+        previous_row = list(range(len(read) + 1))
+    for position in range(len(primer)):
+        row = [position + 1]
+        for read_position in range(len(read)):
+            row.append(
+                min(
+                    previous_row[read_position]
+                    + (read[read_position] not in accepted[position]),
+                    previous_row[read_position + 1] + 1,
+                    row[read_position] + 1,
+                )
+            )
+        previous_row = row
+    return previous_row
+
+
+def get_edit_reference(read, primer, max_mismatches):
+    """
+    The get_edit_reference function:
+        This function returns the end and distance of the substring of the
+        read with the lowest edit distance to the primer that ends first, or
+        None.
+    """
+    best_end = None
+    for end, distance in enumerate(get_edit_row(read, primer, True)):
+        if distance <= max_mismatches and (
+            best_end == None or distance < best_end[1]
+        ):
+            best_end = (end, distance)
+        else:
+            pass
+    return best_end
+
+
+def get_mutated_primer(primer, max_mismatches, random_state, indels):
+    """
+    The get_mutated_primer function:
+        This function writes out the primer with a random accepted nucleotide
+        for every position and applies up to max_mismatches random
+        substitutions, and insertions and deletions when indels is True.
+    """
+    sequence = [
+        random_state.choice(sorted(nucleotides))
+        for nucleotides in get_accepted_nucleotides(primer)
+    ]
+    for mutation in range(random_state.randint(0, max_mismatches)):
+        position = random_state.randrange(len(sequence))
+        kind = random_state.choice(
+            ["sub", "ins", "del"] if indels else ["sub"]
+        )
+        if kind == "sub":
+            sequence[position] = random_state.choice(b"ACGT")
+        elif kind == "ins":
+            sequence.insert(position, random_state.choice(b"ACGT"))
+        elif len(sequence) > 1:
+            del sequence[position]
+        else:
+            pass
+    return bytes(sequence)
+
+
+def get_reads(primer, max_mismatches, indels, count=150, seed=11):
+    """
+    The get_reads function:
+        This function yields random reads with a mutated primer at the start,
+        at the end or in the middle, and reads without a primer.
+    """
+    random_state = random.Random(seed)
+    for read_number in range(count):
+        placement = read_number % 4
+        flank = bytes(
+            random_state.choice(b"ACGTN")
+            for position in range(random_state.randint(0, 30))
+        )
+        primer_sequence = get_mutated_primer(
+            primer, max_mismatches, random_state, indels
+        )
+        if placement == 0:
+            yield primer_sequence + flank
+        elif placement == 1:
+            yield flank + primer_sequence
+        elif placement == 2:
+            yield flank[:10] + primer_sequence + flank[10:]
+        else:
+            yield flank
+
+
+@pytest.mark.parametrize("max_mismatches", [0, 1, 2])
+@pytest.mark.parametrize("primer", PRIMERS)
+def test_hamming_matches_reference(primer, max_mismatches):
+    """
+    The test_hamming_matches_reference function:
+        This function checks that the hamming search finds the same best
+        match as a comparison of the primer with every window of the read.
+    """
+    bit_parallel_search = BitParallelSearch(primer, max_mismatches, "hamming")
+    for read in get_reads(primer, max_mismatches, False):
+        primer_match = bit_parallel_search.search(read)
+        reference = get_hamming_reference(read, primer, max_mismatches)
+        if reference == None:
+            assert primer_match == None, read
+        else:
+            assert primer_match != None, read
+            assert (
+                primer_match.start(),
+                primer_match.end(),
+                primer_match.distance,
+            ) == reference, read
+
+
+@pytest.mark.parametrize("max_mismatches", [0, 1, 2])
+@pytest.mark.parametrize("primer", PRIMERS)
+def test_edit_matches_reference(primer, max_mismatches):
+    """
+    The test_edit_matches_reference function:
+        This function checks that the edit distance search finds the same
+        distance and end as a semi-global alignment of the primer with every
+        substring of the read, and that the primer aligns to the returned
+        substring with that distance.
+    """
+    bit_parallel_search = BitParallelSearch(primer, max_mismatches, "edit")
+    for read in get_reads(primer, max_mismatches, True):
+        primer_match = bit_parallel_search.search(read)
+        reference = get_edit_reference(read, primer, max_mismatches)
+        if reference == None:
+            assert primer_match == None, read
+        else:
+            assert primer_match != None, read
+            assert (primer_match.end(), primer_match.distance) == reference
+            match_read = read[primer_match.start() : primer_match.end()]
+            assert (
+                get_edit_row(match_read, primer, False)[-1]
+                == primer_match.distance
+            ), read
+
+
+def test_part_regexes_are_used_for_long_primers():
+    """
+    The test_part_regexes_are_used_for_long_primers function:
+        This function checks that long primers are pre-filtered with a regex
+        for every part and short primers are searched in the whole read.
+    """
+    long_search = BitParallelSearch(PRIMERS[2], 2, "hamming")
+    short_search = BitParallelSearch("GGWACWGG", 2, "hamming")
+    assert len(PRIMERS[2]) // 3 >= MIN_PART_LENGTH
+    assert len(long_search.part_regexes) == 3
+    assert short_search.part_regexes == []
+    assert short_search.get_windows(b"ACGTACGT") == [[0, 8]]
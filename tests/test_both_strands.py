@@ -0,0 +1,129 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import collections
+import random
+import pytest
+from umi_isolation.isolation import (
+    UmiMatcher,
+    get_reverse_complement,
+    get_umi_reads,
+    get_umi_string,
+)
+
+FORWARD = "GGTACTGGAC"
+REVERSE = "TAGACCTCAG"
+UMI5 = "ACGGTA"
+UMI3 = "TTCAGC"
+
+
+def get_amplicon(forward_primer):
+    """
+    The get_amplicon function:
+        This function returns a read with UMI5 in front of the forward primer
+        and UMI3 behind the reverse complement of REVERSE, with a random
+        product in between.
+    """
+    generator = random.Random(3)
+    product = "".join(generator.choice("ACGT") for position in range(60))
+    reverse_complement = get_reverse_complement(REVERSE.encode()).decode()
+    return (
+        UMI5 + forward_primer + product + reverse_complement + UMI3
+    ).encode()
+
+
+def get_umi_read(read, search_method, max_mismatches):
+    """
+    The get_umi_read function:
+        This function runs get_umi_reads on a single read, searching both
+        strands. It returns the umi string and the read it yields, or None,
+        and the number of reads that were found on the minus strand.
+    """
+    umi_matcher = UmiMatcher(
+        "primer",
+        6,
+        search_method,
+        FORWARD,
+        REVERSE,
+        max_mismatches,
+        both_strands=True,
+    )
+    read_counts = collections.Counter()
+    umi_reads = list(
+        get_umi_reads([(b">read", read, None)], umi_matcher, read_counts)
+    )
+    if umi_reads:
+        umi_key, header, umi_read = umi_reads[0]
+        return (
+            get_umi_string(umi_key),
+            umi_read,
+            read_counts["reverse_strand"],
+        )
+    else:
+        return None
+
+
+@pytest.mark.parametrize(
+    "search_method, umi",
+    [("umi5", UMI5), ("umi3", UMI3), ("umidouble", UMI5 + UMI3)],
+)
+@pytest.mark.parametrize(
+    "forward_primer, max_mismatches",
+    [(FORWARD, 0), (FORWARD[:4] + "T" + FORWARD[5:], 1)],
+)
+def test_a_minus_strand_read_gives_the_plus_strand_umi(
+    search_method, umi, forward_primer, max_mismatches
+):
+    """
+    The test_a_minus_strand_read_gives_the_plus_strand_umi function:
+        This function checks that the reverse complement of a read gives the
+        same umi and the same oriented read as the read itself, with the
+        regex search and with a mismatch in the forward primer that only the
+        mismatch tolerant search finds.
+    """
+    read = get_amplicon(forward_primer)
+    reverse_read = get_reverse_complement(read)
+    assert get_umi_read(read, search_method, max_mismatches) == (
+        umi,
+        read,
+        0,
+    )
+    assert get_umi_read(reverse_read, search_method, max_mismatches) == (
+        umi,
+        read,
+        1,
+    )
+    if max_mismatches > 0:
+        assert get_umi_read(reverse_read, search_method, 0) == None
+    else:
+        pass
+
+
+def test_a_read_without_primers_is_not_found_on_either_strand():
+    """
+    The test_a_read_without_primers_is_not_found_on_either_strand function:
+        This function checks that searching both strands does not find a umi
+        in a read without the primers.
+    """
+    read = get_amplicon("A" * len(FORWARD))
+    assert get_umi_read(read, "umi5", 1) == None
+    assert get_umi_read(get_reverse_complement(read), "umi5", 1) == None
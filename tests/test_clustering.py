@@ -0,0 +1,174 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import io
+import os
+from conftest import FORWARD, REVERSE
+from umi_isolation.isolation import (
+    RunOptions,
+    UmiBucketSummary,
+    UmiTable,
+    create_trivial_centroids,
+    get_native_derep,
+    get_umi_collection,
+    get_umi_key,
+)
+
+
+def get_derep(fasta, minimal_size_abundance=1):
+    """
+    The get_derep function:
+        This function runs get_native_derep on the lines of fasta text, the
+        way a umi file is read.
+    """
+    return get_native_derep(iter(io.StringIO(fasta)), minimal_size_abundance)
+
+
+def test_native_derep_counts_and_sorts_the_reads():
+    """
+    The test_native_derep_counts_and_sorts_the_reads function:
+        This function checks that identical reads are counted case
+        insensitive under the label of their first header, that the reads
+        are sorted on decreasing abundance with ties in the order in which
+        they were found and that empty reads are skipped.
+    """
+    fasta = (
+        ">read1 sample=a\nACGT\n"
+        ">read2\nTTTT\n"
+        ">read3\nacgt\n"
+        ">read4\n\n"
+        ">read5\nGGGG\n"
+        ">read6\nTTTT\n"
+        ">read7\nCCCC\n"
+        ">read8\nACGT\n"
+    )
+    assert get_derep(fasta) == (
+        ">read1;size=3\nACGT\n"
+        ">read2;size=2\nTTTT\n"
+        ">read5;size=1\nGGGG\n"
+        ">read7;size=1\nCCCC\n"
+    )
+
+
+def test_native_derep_leaves_out_rare_reads():
+    """
+    The test_native_derep_leaves_out_rare_reads function:
+        This function checks that reads with less than
+        minimal_size_abundance copies are left out, like vsearch
+        --sortbysize --minsize does.
+    """
+    fasta = ">read1\nACGT\n>read2\nTTTT\n>read3\nACGT\n"
+    assert get_derep(fasta, "2") == ">read1;size=2\nACGT\n"
+    assert get_derep(fasta, "3") == ""
+
+
+def test_trivial_centroids_are_written_for_identical_reads(tmp_path):
+    """
+    The test_trivial_centroids_are_written_for_identical_reads function:
+        This function checks that create_trivial_centroids writes the
+        centroid of a umi with only identical reads, compared case
+        insensitive, skips the umi with different reads and returns a umi
+        with too few reads without writing its centroid.
+    """
+    umi_reads = [
+        (b"AAAAAA", b">read1 sample=a", b"ACGT"),
+        (b"CCCCCC", b">read2", b"ACGT"),
+        (b"AAAAAA", b">read3", b"acgt"),
+        (b"CCCCCC", b">read4", b"ACGA"),
+        (b"GGGGGG", b">read5", b"TTTT"),
+        (b"AAAAAA", b">read6", b"ACGT"),
+    ]
+    umi_table = UmiTable()
+    bucket_summary = UmiBucketSummary()
+    for umi, header, read in umi_reads:
+        bucket_summary.add(umi_table.add(get_umi_key(umi)), header, read)
+    cluster_directory = str(tmp_path) + "/"
+    trivial_files = create_trivial_centroids(
+        bucket_summary, umi_table, cluster_directory, "2"
+    )
+    assert trivial_files == {"UMI#1_AAAAAA.fasta", "UMI#3_GGGGGG.fasta"}
+    assert os.listdir(cluster_directory) == ["UMI#1_AAAAAA.fasta"]
+    assert (tmp_path / "UMI#1_AAAAAA.fasta").read_text() == (
+        ">read1;size=3\nACGT\n"
+    )
+
+
+def run_derep(run_directory, input_file, derep_method):
+    """
+    The run_derep function:
+        This function runs get_umi_collection with a derep method and returns
+        the rows of the tabular file and the records of the blast file.
+    """
+    zip_file = os.path.join(run_directory, "zip") + "/"
+    cluster_directory = os.path.join(run_directory, "cluster") + "/"
+    os.makedirs(zip_file)
+    os.makedirs(cluster_directory)
+    tabular_file = os.path.join(run_directory, "output.tabular")
+    output_blast_file = os.path.join(run_directory, "output.blast.fasta")
+    get_umi_collection(
+        input_file,
+        cluster_directory,
+        tabular_file,
+        zip_file,
+        output_blast_file,
+        "primer",
+        6,
+        "umi5",
+        FORWARD,
+        REVERSE,
+        "fasta",
+        ">",
+        "0.97",
+        "2",
+        RunOptions(derep_method=derep_method),
+    )
+    with open(tabular_file) as tabular_input, open(
+        output_blast_file
+    ) as blast_input:
+        return (
+            sorted(tabular_input.read().splitlines()),
+            sorted(blast_input.read().split(">")),
+        )
+
+
+def test_native_derep_gives_the_output_of_vsearch(
+    tmp_path, fake_vsearch, amplicon_fasta
+):
+    """
+    The test_native_derep_gives_the_output_of_vsearch function:
+        This function checks that a run with the native dereplication writes
+        the same output files as a run with vsearch --derep_fulllength and
+        --sortbysize, and does not run these vsearch commands.
+    """
+    vsearch_output = run_derep(
+        str(tmp_path / "vsearch"), amplicon_fasta, "vsearch"
+    )
+    fake_vsearch.write_text("")
+    native_output = run_derep(
+        str(tmp_path / "native"), amplicon_fasta, "native"
+    )
+    assert len(native_output[1]) > 10
+    assert native_output == vsearch_output
+    assert {
+        vsearch_run.split()[0]
+        for vsearch_run in fake_vsearch.read_text().splitlines()
+    } == {"--cluster_size"}
@@ -0,0 +1,86 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+from umi_isolation.isolation import create_output_files, create_tabular_file
+
+
+def test_create_tabular_file_writes_a_tab_separated_table(tmp_path):
+    """
+    The test_create_tabular_file_writes_a_tab_separated_table function:
+        This function checks that create_tabular_file writes the header and
+        a row for every entry of the output columns, separated by tabs and
+        with unix line endings.
+    """
+    tabular_file = tmp_path / "output.tabular"
+    create_tabular_file(
+        {
+            "UMI ID": ["UMI#1", "UMI#2.1"],
+            "UMI SEQ": ["ACGTAC", "TTGGCC"],
+            "READ COUNT": ["3", "1"],
+            "CENTROID READ": ["ACGT", "GGCC"],
+        },
+        str(tabular_file),
+    )
+    assert tabular_file.read_bytes() == (
+        b"UMI ID\tUMI SEQ\tREAD COUNT\tCENTROID READ\n"
+        b"UMI#1\tACGTAC\t3\tACGT\n"
+        b"UMI#2.1\tTTGGCC\t1\tGGCC\n"
+    )
+
+
+def test_create_output_files_numbers_the_centroids(tmp_path):
+    """
+    The test_create_output_files_numbers_the_centroids function:
+        This function checks that create_output_files takes the cluster
+        files in the order of the umi numbers, numbers the centroids of a
+        umi with more than one centroid as versions, upper cases the reads
+        and skips empty cluster files.
+    """
+    cluster_directory = tmp_path / "cluster"
+    cluster_directory.mkdir()
+    (cluster_directory / "UMI#10_GGGGGG.fasta").write_text(
+        ">read9;size=2\nacgt\n"
+    )
+    (cluster_directory / "UMI#2_CCCCCC.fasta").write_text(
+        ">read2;size=4\nTTTT\n>read5;size=1\nTTTA\n"
+    )
+    (cluster_directory / "UMI#3_AAAAAA.fasta").write_text("")
+    (cluster_directory / "UMI#1_ACGTAC.fasta").write_text(
+        ">read1;size=3\nACGT\n"
+    )
+    tabular_file = tmp_path / "output.tabular"
+    output_blast_file = tmp_path / "output.blast.fasta"
+    create_output_files(
+        str(cluster_directory) + "/",
+        str(output_blast_file),
+        str(tabular_file),
+    )
+    assert tabular_file.read_text() == (
+        "UMI ID\tUMI SEQ\tREAD COUNT\tCENTROID READ\n"
+        "UMI#1\tACGTAC\t3\tACGT\n"
+        "UMI#2.1\tCCCCCC\t4\tTTTT\n"
+        "UMI#2.2\tCCCCCC\t1\tTTTA\n"
+        "UMI#10\tGGGGGG\t2\tACGT\n"
+    )
+    assert output_blast_file.read_text() == (
+        ">UMI#1\nACGT\n>UMI#2.1\nTTTT\n>UMI#2.2\nTTTA\n>UMI#10\nACGT\n"
+    )
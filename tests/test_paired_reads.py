@@ -0,0 +1,251 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import collections
+import random
+import pytest
+from umi_isolation.isolation import (
+    MAX_PAIR_DIFFERENCES,
+    MIN_PAIR_OVERLAP,
+    UmiMatcher,
+    get_merged_pair,
+    get_paired_umi_reads,
+    get_reverse_complement,
+)
+
+
+def get_random_read(length, seed):
+    """
+    The get_random_read function:
+        This function returns a random read of A, C, G and T nucleotides.
+    """
+    generator = random.Random(seed)
+    return bytes(generator.choice(b"ACGT") for position in range(length))
+
+
+def get_changed_nucleotide(read, position):
+    """
+    The get_changed_nucleotide function:
+        This function returns the read with another nucleotide at position.
+    """
+    nucleotide = b"ACGT"[(b"ACGT".index(read[position]) + 1) % 4]
+    return read[:position] + bytes([nucleotide]) + read[position + 1 :]
+
+
+@pytest.mark.parametrize("overlap_length", [MIN_PAIR_OVERLAP, 50, 100, 300])
+def test_overlapping_pairs_are_merged(overlap_length):
+    amplicon = get_random_read(600 - overlap_length, overlap_length)
+    read = amplicon[:300]
+    mate_read = amplicon[-300:]
+    assert get_merged_pair(read, None, mate_read, None) == amplicon
+
+
+def test_read_through_is_cut_at_the_end_of_the_mate():
+    amplicon = get_random_read(250, 1)
+    read = amplicon + b"AGATCGGAAGAGC"
+    assert get_merged_pair(read, None, amplicon, None) == amplicon
+
+
+@pytest.mark.parametrize("insert_length", [MIN_PAIR_OVERLAP, 120, 200])
+def test_read_through_pairs_lose_both_adapters(insert_length):
+    insert = get_random_read(insert_length, insert_length)
+    adapter_length = 250 - insert_length
+    read = insert + get_random_read(adapter_length, 7)
+    mate_read = get_reverse_complement(
+        get_reverse_complement(insert) + get_random_read(adapter_length, 8)
+    )
+    assert len(read) == len(mate_read) == 250
+    assert get_merged_pair(read, None, mate_read, None) == insert
+
+
+def test_read_through_pairs_use_the_quality_of_both_mates():
+    insert = get_random_read(200, 9)
+    read = get_changed_nucleotide(insert, 20) + get_random_read(50, 10)
+    mate_read = get_random_read(50, 11) + get_changed_nucleotide(insert, 180)
+    quality = bytearray(b"I" * 250)
+    mate_quality = bytearray(b"I" * 250)
+    quality[20] = ord("#")
+    mate_quality[50 + 180] = ord("#")
+    assert get_merged_pair(read, quality, mate_read, mate_quality) == insert
+
+
+def test_pairs_without_overlap_are_refused():
+    amplicon = get_random_read(600, 2)
+    assert get_merged_pair(amplicon[:250], None, amplicon[-250:], None) == (
+        None
+    )
+    short_overlap = amplicon[: 200 + MIN_PAIR_OVERLAP - 1]
+    assert get_merged_pair(short_overlap, None, amplicon[200:], None) == None
+
+
+def test_pairs_with_too_many_differences_are_refused():
+    amplicon = get_random_read(400, 3)
+    read = amplicon[:300]
+    mate_read = amplicon[200:]
+    overlap_length = 100
+    allowed_differences = overlap_length * MAX_PAIR_DIFFERENCES // 100
+    for position in range(0, allowed_differences * 8, 8):
+        mate_read = get_changed_nucleotide(mate_read, position)
+    assert get_merged_pair(read, None, mate_read, None) == (
+        read + mate_read[overlap_length:]
+    )
+    mate_read = get_changed_nucleotide(mate_read, overlap_length - 1)
+    assert get_merged_pair(read, None, mate_read, None) == None
+
+
+def test_the_highest_quality_wins_in_the_overlap():
+    amplicon = get_random_read(400, 4)
+    read = get_changed_nucleotide(amplicon[:300], 250)
+    mate_read = get_changed_nucleotide(amplicon[100:], 160)
+    quality = bytearray(b"I" * 300)
+    mate_quality = bytearray(b"I" * 300)
+    quality[250] = ord("#")
+    mate_quality[160] = ord("#")
+    assert get_merged_pair(read, quality, mate_read, mate_quality) == (
+        amplicon
+    )
+    merged_read = get_merged_pair(read, None, mate_read, None)
+    assert merged_read[250] == read[250]
+    assert merged_read[260] == amplicon[260]
+
+
+def test_n_nucleotides_are_taken_from_the_mate_without_quality():
+    amplicon = get_random_read(400, 5)
+    read = amplicon[:250] + b"N" + amplicon[251:300]
+    assert get_merged_pair(read, None, amplicon[100:], None) == amplicon
+
+
+def write_fastq(path, reads):
+    """
+    The write_fastq function:
+        This function writes (label, read) pairs as a fastq file.
+    """
+    with open(path, "wb") as output:
+        for label, read in reads:
+            output.write(
+                b"@" + label + b"\n" + read + b"\n+\n" + b"I" * len(read)
+            )
+            output.write(b"\n")
+
+
+def get_paired_umi_reads_of(
+    tmp_path,
+    read_lengths,
+    both_strands=False,
+    max_mismatches=0,
+    forward_primer=b"GGTACTGG",
+    swap_mates=False,
+):
+    """
+    The get_paired_umi_reads_of function:
+        This function writes a read pair of the same amplicon for every read
+        length and returns the amplicon, the umi reads of
+        get_paired_umi_reads and the read counts. With swap_mates the R1 read
+        is taken from the minus strand and the R2 read from the plus strand.
+    """
+    umi_matcher = UmiMatcher(
+        "primer",
+        6,
+        "umidouble",
+        "GGTACTGG",
+        "TAGACCTC",
+        max_mismatches,
+        both_strands=both_strands,
+    )
+    amplicon = (
+        b"AACCGG"
+        + forward_primer
+        + get_random_read(200, 6)
+        + get_reverse_complement(b"TAGACCTC")
+        + b"TTGGCC"
+    )
+    reads = []
+    mates = []
+    for pair_number, read_length in enumerate(read_lengths):
+        label = b"pair" + str(pair_number).encode()
+        read = amplicon[:read_length]
+        mate_read = get_reverse_complement(amplicon[-read_length:])
+        if swap_mates:
+            read, mate_read = mate_read, read
+        else:
+            pass
+        reads.append((label + b"/1", read))
+        mates.append((label + b"/2", mate_read))
+    write_fastq(str(tmp_path / "r1.fastq"), reads)
+    write_fastq(str(tmp_path / "r2.fastq"), mates)
+    read_counts = collections.Counter()
+    umi_reads = list(
+        get_paired_umi_reads(
+            str(tmp_path / "r1.fastq"),
+            str(tmp_path / "r2.fastq"),
+            "@",
+            umi_matcher,
+            read_counts,
+        )
+    )
+    return amplicon, umi_reads, read_counts
+
+
+def test_paired_umi_reads_merge_and_count_the_pairs(tmp_path, capsys):
+    amplicon, umi_reads, read_counts = get_paired_umi_reads_of(
+        tmp_path, [150, 80, 200]
+    )
+    assert [umi_read[1:] for umi_read in umi_reads] == [
+        (b"@pair0/1", amplicon),
+        (b"@pair1/1", amplicon[:80] + amplicon[-80:]),
+        (b"@pair2/1", amplicon),
+    ]
+    assert read_counts == {"unmerged_pairs": 1}
+    assert capsys.readouterr().err == ""
+
+
+def test_a_warning_is_written_when_most_pairs_do_not_overlap(tmp_path, capsys):
+    amplicon, umi_reads, read_counts = get_paired_umi_reads_of(
+        tmp_path, [150, 80, 60]
+    )
+    assert len(umi_reads) == 3
+    assert read_counts == {"unmerged_pairs": 2}
+    assert "2 of 3 read pairs" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "forward_primer, max_mismatches",
+    [(b"GGTACTGG", 0), (b"GGTTCTGG", 1)],
+)
+def test_swapped_mates_give_the_umis_and_read_of_the_pair(
+    tmp_path, forward_primer, max_mismatches
+):
+    amplicon, umi_reads, read_counts = get_paired_umi_reads_of(
+        tmp_path, [150, 80], True, max_mismatches, forward_primer
+    )
+    swapped_amplicon, swapped_umi_reads, swapped_read_counts = (
+        get_paired_umi_reads_of(
+            tmp_path, [150, 80], True, max_mismatches, forward_primer, True
+        )
+    )
+    assert [umi_read[1:] for umi_read in umi_reads] == [
+        (b"@pair0/1", amplicon),
+        (b"@pair1/1", amplicon[:80] + amplicon[-80:]),
+    ]
+    assert swapped_umi_reads == umi_reads
+    assert read_counts == {"unmerged_pairs": 1}
+    assert swapped_read_counts == {"unmerged_pairs": 1, "reverse_strand": 2}
@@ -0,0 +1,298 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import gzip
+import io
+import random
+import struct
+import zlib
+import pytest
+from umi_isolation.isolation import (
+    UmiMatcher,
+    get_bgzf_chunk_umi_reads,
+    get_bgzf_chunks,
+    get_chunk_umi_reads,
+    get_input_chunks,
+    get_input_compression,
+    get_umi_reads,
+    open_input,
+    read_records,
+)
+
+BUFFER_SIZES = [1, 2, 3, 7, 16, 61, 4096, 4194304]
+CHUNK_SIZES = [1, 50, 333, 1000, 100000]
+
+
+def get_random_records(count=120, seed=7):
+    """
+    The get_random_records function:
+        This function returns random records with a umi, the primer
+        GGTACTGG, a random product and the reverse complement primer GAGGTATA
+        in front of a umi. The qualities are drawn from all quality
+        characters, so many quality lines start with @ or +.
+    """
+    random_state = random.Random(seed)
+    records = []
+    for read_number in range(count):
+        read = (
+            "".join(random_state.choice("ACGT") for position in range(6))
+            + "GGTACTGG"
+            + "".join(
+                random_state.choice("ACGTN")
+                for position in range(random_state.randint(0, 40))
+            )
+            + "GAGGTATA"
+            + "".join(random_state.choice("ACGT") for position in range(6))
+        )
+        quality = "".join(
+            random_state.choice("@+!#ABCI") for position in range(len(read))
+        )
+        records.append(("read" + str(read_number), read, quality))
+    return records
+
+
+def get_fastq_text(records, line_end="\n", final_newline=True):
+    """
+    The get_fastq_text function:
+        This function writes records as fastq text.
+    """
+    lines = []
+    for name, read, quality in records:
+        lines.extend(["@" + name, read, "+", quality])
+    text = line_end.join(lines) + line_end
+    if final_newline:
+        return text.encode()
+    else:
+        return text[: -len(line_end)].encode()
+
+
+def get_fasta_text(records, line_end="\n", final_newline=True, width=None):
+    """
+    The get_fasta_text function:
+        This function writes records as fasta text, the reads are wrapped at
+        width nucleotides when width is given.
+    """
+    lines = []
+    for name, read, quality in records:
+        lines.append(">" + name)
+        if width != None:
+            lines.extend(
+                read[position : position + width]
+                for position in range(0, max(len(read), 1), width)
+            )
+        else:
+            lines.append(read)
+    text = line_end.join(lines)
+    if final_newline:
+        text += line_end
+    else:
+        pass
+    return text.encode()
+
+
+def get_reference_records(data, operand):
+    """
+    The get_reference_records function:
+        This function parses fasta or fastq text line by line, the simple
+        way, as the reference for the block parsers.
+    """
+    lines = [line.rstrip(b"\r") for line in data.split(b"\n")]
+    records = []
+    if operand == "@":
+        lines = [line for line in lines if line]
+        for position in range(0, len(lines) - 3, 4):
+            records.append(
+                (lines[position], lines[position + 1], lines[position + 3])
+            )
+    else:
+        for line in lines:
+            if line[:1] == b">":
+                records.append([line, b""])
+            elif records:
+                records[-1][1] += line
+            else:
+                pass
+        records = [(header, read, None) for header, read in records]
+    return records
+
+
+def write_bgzf(data, output_file, block_size=97):
+    """
+    The write_bgzf function:
+        This function writes data as a BGZF file with blocks of block_size
+        uncompressed bytes and the empty end of file block.
+    """
+    with open(output_file, "wb") as output:
+        for position in list(range(0, len(data), block_size)) + [len(data)]:
+            block = data[position : position + block_size]
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            compressed = compressor.compress(block) + compressor.flush()
+            output.write(
+                b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+                + struct.pack("<H", len(compressed) + 25)
+                + compressed
+                + struct.pack("<II", zlib.crc32(block), len(block))
+            )
+
+
+DATA_CASES = [
+    ("@", get_fastq_text(get_random_records())),
+    ("@", get_fastq_text(get_random_records(), "\r\n")),
+    ("@", get_fastq_text(get_random_records(), final_newline=False)),
+    ("@", get_fastq_text(get_random_records(), "\r\n", False)),
+    (
+        "@",
+        b"\n" + get_fastq_text(get_random_records()).replace(b"\n@", b"\n\n@"),
+    ),
+    (">", get_fasta_text(get_random_records())),
+    (">", get_fasta_text(get_random_records(), "\r\n")),
+    (">", get_fasta_text(get_random_records(), final_newline=False)),
+    (">", get_fasta_text(get_random_records(), width=7)),
+    (">", get_fasta_text(get_random_records(), "\r\n", False, 10)),
+    (">", b"; comment\n\n" + get_fasta_text(get_random_records(), width=60)),
+]
+
+
+@pytest.mark.parametrize("buffer_size", BUFFER_SIZES)
+@pytest.mark.parametrize("operand, data", DATA_CASES)
+def test_read_records_matches_reference(operand, data, buffer_size):
+    """
+    The test_read_records_matches_reference function:
+        This function checks that the block parsers yield the same records
+        as the line by line reference, for every buffer size.
+    """
+    assert list(
+        read_records(io.BytesIO(data), operand, buffer_size)
+    ) == get_reference_records(data, operand)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bgzf"])
+@pytest.mark.parametrize("operand, data", DATA_CASES[:1] + DATA_CASES[8:9])
+def test_compressed_records_match_reference(
+    tmp_path, compression, operand, data
+):
+    """
+    The test_compressed_records_match_reference function:
+        This function checks that gzip and BGZF compressed input is detected
+        and parsed like the uncompressed text.
+    """
+    input_file = str(tmp_path / "reads.gz")
+    if compression == "gzip":
+        with gzip.open(input_file, "wb") as output:
+            output.write(data)
+    else:
+        write_bgzf(data, input_file)
+    assert get_input_compression(input_file) == compression
+    for buffer_size in [5, 4096]:
+        with open_input(input_file, compression) as input:
+            assert list(
+                read_records(input, operand, buffer_size)
+            ) == get_reference_records(data, operand)
+
+
+def test_fastq_without_separator_raises():
+    """
+    The test_fastq_without_separator_raises function:
+        This function checks that a fastq record without a + line raises a
+        ValueError.
+    """
+    with pytest.raises(ValueError):
+        list(read_records(io.BytesIO(b"@a\nACGT\nACGT\nIIII\n"), "@"))
+
+
+@pytest.mark.parametrize("buffer_size", BUFFER_SIZES)
+@pytest.mark.parametrize("line_count", [1, 2, 3])
+def test_fastq_with_an_incomplete_last_record_raises(buffer_size, line_count):
+    """
+    The test_fastq_with_an_incomplete_last_record_raises function:
+        This function checks that a fastq stream that ends in the middle of
+        a record raises a ValueError that names the record, instead of
+        dropping it.
+    """
+    data = get_fastq_text(get_random_records())
+    lines = b"@last\nACGT\n+\nIIII\n".split(b"\n")
+    data += b"\n".join(lines[:line_count]) + b"\n"
+    with pytest.raises(
+        ValueError, match="incomplete fastq record near: @last"
+    ):
+        list(read_records(io.BytesIO(data), "@", buffer_size))
+
+
+def get_reference_umi_reads(data, operand, umi_matcher):
+    """
+    The get_reference_umi_reads function:
+        This function returns the umi reads of the reference records.
+    """
+    return list(
+        get_umi_reads(get_reference_records(data, operand), umi_matcher)
+    )
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("operand, data", DATA_CASES)
+def test_input_chunks_match_reference(tmp_path, operand, data, chunk_size):
+    """
+    The test_input_chunks_match_reference function:
+        This function checks that the chunks of get_input_chunks cover the
+        whole file and that parsing every chunk on its own gives the umi
+        reads of the reference, in the same order.
+    """
+    input_file = str(tmp_path / "reads")
+    with open(input_file, "wb") as output:
+        output.write(data)
+    umi_matcher = UmiMatcher("primer", 6, "umidouble", "GGWACWGG", "TANACYTC")
+    chunks = get_input_chunks(input_file, operand, chunk_size)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(data)
+    assert all(
+        chunk[1] == next_chunk[0]
+        for chunk, next_chunk in zip(chunks, chunks[1:])
+    )
+    umi_reads = []
+    for chunk in chunks:
+        umi_reads.extend(
+            get_chunk_umi_reads(
+                input_file, operand, umi_matcher, False, chunk
+            )[0]
+        )
+    assert umi_reads == get_reference_umi_reads(data, operand, umi_matcher)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("operand, data", DATA_CASES)
+def test_bgzf_chunks_match_reference(tmp_path, operand, data, chunk_size):
+    """
+    The test_bgzf_chunks_match_reference function:
+        This function checks that the chunks of get_bgzf_chunks, that are cut
+        at BGZF block boundaries in the middle of records, give the umi reads
+        of the reference when every chunk is parsed on its own.
+    """
+    input_file = str(tmp_path / "reads.gz")
+    write_bgzf(data, input_file)
+    umi_matcher = UmiMatcher("primer", 6, "umidouble", "GGWACWGG", "TANACYTC")
+    umi_reads = []
+    for chunk in get_bgzf_chunks(input_file, chunk_size):
+        umi_reads.extend(
+            get_bgzf_chunk_umi_reads(
+                input_file, operand, umi_matcher, False, chunk
+            )[0]
+        )
+    assert umi_reads == get_reference_umi_reads(data, operand, umi_matcher)
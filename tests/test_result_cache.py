@@ -0,0 +1,258 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import json
+import os
+import time
+import pytest
+from umi_isolation.isolation import ResultCache, RunOptions, set_format
+
+FORWARD = "GGTACTGG"
+REVERSE = "TAGACCTC"
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+
+def run_cached(
+    run_directory,
+    input_file,
+    cache_directory,
+    identity_score="0.97",
+    mate_file=None,
+    **options
+):
+    """
+    The run_cached function:
+        This function runs set_format on the input file with the result cache
+        in cache_directory and its other files in run_directory. It returns
+        the tabular file, the blast file and the metrics of the run.
+    """
+    zip_file = os.path.join(run_directory, "zip") + "/"
+    cluster_directory = os.path.join(run_directory, "cluster") + "/"
+    os.makedirs(zip_file)
+    os.makedirs(cluster_directory)
+    tabular_file = os.path.join(run_directory, "output.tabular")
+    output_blast_file = os.path.join(run_directory, "output.blast.fasta")
+    metrics_file = os.path.join(run_directory, "metrics.json")
+    set_format(
+        input_file,
+        cluster_directory,
+        tabular_file,
+        zip_file,
+        output_blast_file,
+        "primer",
+        "fasta",
+        6,
+        "umi5",
+        FORWARD,
+        REVERSE,
+        identity_score,
+        1,
+        RunOptions(cache_directory=cache_directory, **options),
+        mate_file=mate_file,
+        metrics_file=metrics_file,
+    )
+    with open(tabular_file) as input:
+        tabular = input.read()
+    with open(output_blast_file) as input:
+        blast = input.read()
+    with open(metrics_file) as input:
+        metrics = json.load(input)
+    return tabular, blast, metrics
+
+
+def test_a_rerun_restores_the_output_and_the_read_counts(
+    tmp_path, fake_vsearch, amplicon_fasta
+):
+    """
+    The test_a_rerun_restores_the_output_and_the_read_counts function:
+        This function checks that a rerun with the same input and parameters
+        restores the output files without running vsearch, with the read
+        counts of the first run in its metrics, and that a rerun with another
+        identity score restores the umi files but clusters them again.
+    """
+    with open(amplicon_fasta, "a") as output:
+        output.write(">no_forward\nACGTACGTACGTACGT\n")
+        output.write(">no_reverse\nAACCGG" + FORWARD + "ACGTACGTACGT\n")
+    cache_directory = str(tmp_path / "cache")
+    tabular, blast, metrics = run_cached(
+        str(tmp_path / "first"), amplicon_fasta, cache_directory
+    )
+    assert metrics["reads"]["forward_missing"] == 1
+    assert metrics["reads"]["reverse_missing"] == 1
+    assert fake_vsearch.read_text() != ""
+    assert "restore_umi_collection" not in metrics["stages"]
+    fake_vsearch.write_text("")
+    rerun_tabular, rerun_blast, rerun_metrics = run_cached(
+        str(tmp_path / "second"), amplicon_fasta, cache_directory
+    )
+    assert (rerun_tabular, rerun_blast) == (tabular, blast)
+    assert fake_vsearch.read_text() == ""
+    assert rerun_metrics["reads"].pop("restored") == True
+    assert rerun_metrics["reads"] == metrics["reads"]
+    assert rerun_metrics["reads"]["parsed"] > 0
+    other_tabular, other_blast, other_metrics = run_cached(
+        str(tmp_path / "third"), amplicon_fasta, cache_directory, "0.5"
+    )
+    assert "restore_umi_collection" in other_metrics["stages"]
+    assert "--cluster_size" in fake_vsearch.read_text()
+    assert other_blast != blast
+
+
+def write_mate_file(mate_file, input_file, changed_read=None):
+    """
+    The write_mate_file function:
+        This function writes the reverse complement of every read of the
+        fasta input file as its R2 read, with one nucleotide of the read at
+        position changed_read changed.
+    """
+    with open(input_file) as input:
+        records = input.read().split(">")[1:]
+    with open(mate_file, "w") as output:
+        for read_number, record in enumerate(records):
+            header, read = record.split()
+            mate_read = read.translate(COMPLEMENT)[::-1]
+            if read_number == changed_read:
+                mate_read = mate_read[:30] + "A" + mate_read[31:]
+            else:
+                pass
+            output.write(">" + header + "\n" + mate_read + "\n")
+
+
+@pytest.mark.parametrize(
+    "first_options, second_options",
+    [
+        ({}, {"both_strands": True}),
+        ({"abundance_filter": "none"}, {"abundance_filter": "count"}),
+        ({"mate_file": "mate"}, {"mate_file": "changed_mate"}),
+        ({}, {"mate_file": "mate"}),
+    ],
+)
+def test_the_umi_files_are_not_restored_for_other_parameters(
+    tmp_path, fake_vsearch, amplicon_fasta, first_options, second_options
+):
+    """
+    The test_the_umi_files_are_not_restored_for_other_parameters function:
+        This function checks that the umi files of a run are not restored by
+        a run that searches the other strand too, filters the umis on their
+        abundance or reads another mate file.
+    """
+    write_mate_file(str(tmp_path / "mate"), amplicon_fasta)
+    write_mate_file(str(tmp_path / "changed_mate"), amplicon_fasta, 3)
+    for options in [first_options, second_options]:
+        if "mate_file" in options:
+            options["mate_file"] = str(tmp_path / options["mate_file"])
+        else:
+            pass
+    cache_directory = str(tmp_path / "cache")
+    run_cached(
+        str(tmp_path / "first"),
+        amplicon_fasta,
+        cache_directory,
+        **first_options
+    )
+    assert "restore_umi_collection" in (
+        run_cached(
+            str(tmp_path / "second"),
+            amplicon_fasta,
+            cache_directory,
+            "0.5",
+            **first_options
+        )[2]["stages"]
+    )
+    assert "restore_umi_collection" not in (
+        run_cached(
+            str(tmp_path / "third"),
+            amplicon_fasta,
+            cache_directory,
+            "0.5",
+            **second_options
+        )[2]["stages"]
+    )
+
+
+def add_entry(result_cache, entry_kind, cache_key, entry_size):
+    """
+    The add_entry function:
+        This function adds an entry of entry_size bytes to the result_cache.
+    """
+    entry_directory = result_cache.create_entry()
+    with open(entry_directory + "data", "wb") as output:
+        output.write(b"x" * entry_size)
+    result_cache.add_entry(entry_kind, cache_key, entry_directory)
+
+
+def get_entries(cache_directory):
+    """
+    The get_entries function:
+        This function returns the entries of the cache as (kind, key) pairs.
+    """
+    return sorted(
+        (entry_kind, cache_key)
+        for entry_kind in ["buckets", "clusters"]
+        if os.path.isdir(os.path.join(cache_directory, entry_kind))
+        for cache_key in os.listdir(os.path.join(cache_directory, entry_kind))
+    )
+
+
+def test_the_least_recently_used_entries_are_evicted(tmp_path):
+    """
+    The test_the_least_recently_used_entries_are_evicted function:
+        This function checks that entries are removed by their last use once
+        the cache exceeds its size, that the entries of the current run are
+        kept and that the removed entries are missed afterwards.
+    """
+    cache_directory = str(tmp_path / "cache")
+    earlier_cache = ResultCache(cache_directory, 1000)
+    for entry_number, cache_key in enumerate(["a", "b", "c"]):
+        add_entry(earlier_cache, "buckets", cache_key, 300)
+        last_use = time.time() - 100 + entry_number
+        os.utime(
+            os.path.join(cache_directory, "buckets", cache_key),
+            (last_use, last_use),
+        )
+    assert get_entries(cache_directory) == [
+        ("buckets", "a"),
+        ("buckets", "b"),
+        ("buckets", "c"),
+    ]
+    result_cache = ResultCache(cache_directory, 1000)
+    assert result_cache.get_entry("buckets", "a") != None
+    add_entry(result_cache, "clusters", "d", 300)
+    assert get_entries(cache_directory) == [
+        ("buckets", "a"),
+        ("buckets", "c"),
+        ("clusters", "d"),
+    ]
+    assert result_cache.get_entry("buckets", "b") == None
+    add_entry(result_cache, "clusters", "e", 300)
+    assert get_entries(cache_directory) == [
+        ("buckets", "a"),
+        ("clusters", "d"),
+        ("clusters", "e"),
+    ]
+    add_entry(result_cache, "clusters", "f", 2000)
+    assert get_entries(cache_directory) == [
+        ("buckets", "a"),
+        ("clusters", "d"),
+        ("clusters", "e"),
+        ("clusters", "f"),
+    ]
@@ -0,0 +1,237 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import json
+import os
+import pytest
+from umi_isolation.isolation import (
+    RunManifest,
+    RunOptions,
+    StageCheckpoint,
+    VsearchError,
+    get_umi_collection,
+)
+
+FORWARD = "GGTACTGG"
+REVERSE = "TAGACCTC"
+
+
+def run_collection(
+    run_directory,
+    input_file,
+    identity_score="0.97",
+    minimal_size_abundance="1",
+    resume=True,
+    derep_method="vsearch",
+):
+    """
+    The run_collection function:
+        This function runs get_umi_collection on the input file with its umi,
+        cluster and output files in run_directory. It returns the sorted rows
+        of the tabular file and the sorted records of the blast file.
+    """
+    zip_file = os.path.join(run_directory, "zip") + "/"
+    cluster_directory = os.path.join(run_directory, "cluster") + "/"
+    os.makedirs(zip_file, exist_ok=True)
+    os.makedirs(cluster_directory, exist_ok=True)
+    tabular_file = os.path.join(run_directory, "output.tabular")
+    output_blast_file = os.path.join(run_directory, "output.blast.fasta")
+    get_umi_collection(
+        input_file,
+        cluster_directory,
+        tabular_file,
+        zip_file,
+        output_blast_file,
+        "primer",
+        6,
+        "umi5",
+        FORWARD,
+        REVERSE,
+        "fasta",
+        ">",
+        identity_score,
+        minimal_size_abundance,
+        RunOptions(resume=resume, derep_method=derep_method),
+    )
+    with open(tabular_file) as input:
+        rows = input.read().splitlines()
+    with open(output_blast_file) as input:
+        records = input.read().split(">")[1:]
+    return rows[0], sorted(rows[1:]), sorted(records)
+
+
+def get_vsearch_runs(log_file):
+    """
+    The get_vsearch_runs function:
+        This function returns the vsearch runs in the log of the stand-in
+        for vsearch and empties the log.
+    """
+    vsearch_runs = log_file.read_text().splitlines()
+    log_file.write_text("")
+    return vsearch_runs
+
+
+def count_runs(vsearch_runs, command):
+    """
+    The count_runs function:
+        This function counts the vsearch runs of one vsearch command.
+    """
+    return sum(1 for run in vsearch_runs if run.split()[0] == command)
+
+
+@pytest.mark.parametrize("derep_method", ["vsearch", "native"])
+def test_a_stopped_run_is_resumed(
+    tmp_path, fake_vsearch, amplicon_fasta, monkeypatch, derep_method
+):
+    """
+    The test_a_stopped_run_is_resumed function:
+        This function stops a run in the middle of the clustering and checks
+        that the resumed run only clusters the umis that were not finished,
+        gives the output of a run that was never stopped and that a third
+        run does not run vsearch at all.
+    """
+    fresh_output = run_collection(
+        str(tmp_path / "fresh"),
+        amplicon_fasta,
+        derep_method=derep_method,
+    )
+    cluster_runs = count_runs(get_vsearch_runs(fake_vsearch), "--cluster_size")
+    assert cluster_runs > 10
+    monkeypatch.setenv("FAKE_VSEARCH_CLUSTER_LIMIT", "5")
+    with pytest.raises(VsearchError):
+        run_collection(
+            str(tmp_path / "run"),
+            amplicon_fasta,
+            derep_method=derep_method,
+        )
+    get_vsearch_runs(fake_vsearch)
+    monkeypatch.delenv("FAKE_VSEARCH_CLUSTER_LIMIT")
+    resumed_output = run_collection(
+        str(tmp_path / "run"),
+        amplicon_fasta,
+        derep_method=derep_method,
+    )
+    vsearch_runs = get_vsearch_runs(fake_vsearch)
+    assert resumed_output == fresh_output
+    assert count_runs(vsearch_runs, "--cluster_size") == cluster_runs - 5
+    assert count_runs(vsearch_runs, "--derep_fulllength") == 0
+    assert (
+        run_collection(
+            str(tmp_path / "run"),
+            amplicon_fasta,
+            derep_method=derep_method,
+        )
+        == fresh_output
+    )
+    assert get_vsearch_runs(fake_vsearch) == []
+
+
+@pytest.mark.parametrize(
+    "parameters, redone_commands",
+    [
+        ({"identity_score": "0.9"}, ["--cluster_size"]),
+        ({"minimal_size_abundance": "2"}, ["--sortbysize", "--cluster_size"]),
+    ],
+)
+def test_a_changed_parameter_redoes_its_steps(
+    tmp_path, fake_vsearch, amplicon_fasta, parameters, redone_commands
+):
+    """
+    The test_a_changed_parameter_redoes_its_steps function:
+        This function resumes a finished run with another identity score or
+        abundance and checks that the steps that depend on it are done again,
+        the umi files are not collected or dereplicated again and the output
+        is that of a fresh run with the new parameter.
+    """
+    run_collection(str(tmp_path / "run"), amplicon_fasta)
+    get_vsearch_runs(fake_vsearch)
+    resumed_output = run_collection(
+        str(tmp_path / "run"), amplicon_fasta, **parameters
+    )
+    vsearch_runs = get_vsearch_runs(fake_vsearch)
+    fresh_output = run_collection(
+        str(tmp_path / "fresh"), amplicon_fasta, resume=False, **parameters
+    )
+    assert resumed_output == fresh_output
+    assert count_runs(vsearch_runs, "--derep_fulllength") == 0
+    for command in redone_commands:
+        assert count_runs(vsearch_runs, command) > 0
+
+
+@pytest.mark.parametrize("manifest_text", [None, '{"collection": ', "[]"])
+def test_a_missing_or_corrupt_manifest_redoes_the_run(
+    tmp_path, fake_vsearch, amplicon_fasta, manifest_text
+):
+    """
+    The test_a_missing_or_corrupt_manifest_redoes_the_run function:
+        This function removes or damages the manifest of a finished run and
+        checks that the resumed run does every step again, without counting
+        the reads of the umi files of the earlier run twice.
+    """
+    fresh_output = run_collection(
+        str(tmp_path / "run"), amplicon_fasta, derep_method="native"
+    )
+    manifest_file = tmp_path / "run" / "zip" / "manifest.json"
+    if manifest_text == None:
+        manifest_file.unlink()
+    else:
+        manifest_file.write_text(manifest_text)
+    get_vsearch_runs(fake_vsearch)
+    assert (
+        run_collection(
+            str(tmp_path / "run"), amplicon_fasta, derep_method="native"
+        )
+        == fresh_output
+    )
+    assert count_runs(get_vsearch_runs(fake_vsearch), "--cluster_size") > 0
+
+
+def test_the_checkpoint_is_emptied_for_another_fingerprint(tmp_path):
+    """
+    The test_the_checkpoint_is_emptied_for_another_fingerprint function:
+        This function checks that the finished umi files of a step are kept
+        for the same fingerprint and forgotten for another one, and that
+        nothing is written when the run is not resumed.
+    """
+    zip_file = str(tmp_path) + "/"
+    run_manifest = RunManifest(zip_file, True)
+    run_manifest.get_checkpoint("cluster", ["a", 1]).add("UMI#1.fasta")
+    run_manifest = RunManifest(zip_file, True)
+    assert run_manifest.get_checkpoint("cluster", ["a", 1]).units == {
+        "UMI#1.fasta"
+    }
+    assert not run_manifest.is_complete("cluster", ["a", 1])
+    run_manifest.set_complete("cluster", ["a", 1])
+    assert RunManifest(zip_file, True).is_complete("cluster", ["a", 1])
+    assert not RunManifest(zip_file, True).is_complete("cluster", ["a", 2])
+    assert not RunManifest(zip_file, False).is_complete("cluster", ["a", 1])
+    run_manifest = RunManifest(zip_file, True)
+    assert run_manifest.get_checkpoint("cluster", ["a", 2]).units == set()
+    assert StageCheckpoint(zip_file + "cluster.checkpoint").units == set()
+    with open(zip_file + "manifest.json") as input:
+        assert json.load(input)["cluster"]["complete"] == False
+    assert (
+        RunManifest(str(tmp_path / "other") + "/").get_checkpoint(
+            "cluster", ["a", 1]
+        )
+        == None
+    )
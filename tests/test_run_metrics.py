@@ -0,0 +1,75 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import pytest
+from umi_isolation.isolation import RunMetrics, VsearchError, run_vsearch_pool
+
+
+def run_fake_vsearch(exit_status):
+    """
+    The run_fake_vsearch function:
+        This function stands in for run_vsearch, it raises a VsearchError
+        with exit_status unless exit_status is 0.
+    """
+    if exit_status != 0:
+        raise VsearchError("vsearch failed", exit_status)
+    else:
+        return b""
+
+
+def test_run_vsearch_pool_counts_exit_statuses():
+    """
+    The test_run_vsearch_pool_counts_exit_statuses function:
+        This function checks that run_vsearch_pool returns the exit statuses
+        of the jobs and that the run metrics report them.
+    """
+    exit_statuses = run_vsearch_pool(run_fake_vsearch, [(0,)] * 5, 2, 1)
+    run_metrics = RunMetrics()
+    run_metrics.add_vsearch_runs("vsearch_derep", exit_statuses)
+    assert run_metrics.get_metrics()["vsearch"] == {
+        "vsearch_derep": {"runs": 5, "exit_statuses": {"0": 5}}
+    }
+
+
+def test_failed_exit_statuses_are_recorded():
+    """
+    The test_failed_exit_statuses_are_recorded function:
+        This function checks that the exit statuses of the jobs that ran
+        before a job failed, including other failed jobs, are added to the
+        VsearchError and to the run metrics of the failed step.
+    """
+    run_metrics = RunMetrics()
+    with pytest.raises(VsearchError) as error_info:
+        with run_metrics.get_stage("vsearch_cluster_size"):
+            run_vsearch_pool(run_fake_vsearch, [(0,), (3,), (0,), (5,)], 1, 1)
+    error = error_info.value
+    assert error.returncode == 3
+    assert error.exit_statuses["3"] == 1
+    assert error.exit_statuses["0"] >= 1
+    assert sum(error.exit_statuses.values()) <= 4
+    run_metrics.set_failure(error)
+    metrics = run_metrics.get_metrics()
+    assert metrics["failure"]["stage"] == "vsearch_cluster_size"
+    assert metrics["failure"]["exit_status"] == 3
+    assert metrics["vsearch"]["vsearch_cluster_size"]["exit_statuses"] == (
+        dict(sorted(error.exit_statuses.items()))
+    )
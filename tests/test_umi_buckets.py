@@ -0,0 +1,329 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import os
+import random
+import zipfile
+import pytest
+from conftest import FORWARD, REVERSE, get_amplicon_reads
+from umi_isolation.isolation import (
+    RunMetrics,
+    RunOptions,
+    UmiBucket,
+    UmiMatcher,
+    UmiSortedRuns,
+    get_umi_buckets,
+    get_umi_collection,
+)
+
+
+def write_shuffled_reads(tmp_path):
+    """
+    The write_shuffled_reads function:
+        This function writes the reads of get_amplicon_reads in a random
+        order to a fasta file, so the reads of every umi are spread over the
+        input. It returns the location of the fasta file.
+    """
+    reads = get_amplicon_reads(umi_count=40)
+    random.Random(1).shuffle(reads)
+    fasta_file = tmp_path / "shuffled.fasta"
+    fasta_file.write_text(
+        "".join(">" + header + "\n" + read + "\n" for header, read in reads)
+    )
+    return str(fasta_file)
+
+
+def collect_buckets(
+    input_file,
+    zip_file,
+    minimal_size_abundance="1",
+    bucket_mode="disk",
+    max_memory_size=268435456,
+    bucket_storage="files",
+    abundance_filter="none",
+    max_open_files=256,
+    max_buffer_size=33554432,
+):
+    """
+    The collect_buckets function:
+        This function runs get_umi_buckets on a fasta file with 5' umis of
+        length 6 and returns what it returns.
+    """
+    os.makedirs(zip_file, exist_ok=True)
+    return get_umi_buckets(
+        input_file,
+        zip_file,
+        ">",
+        UmiMatcher("primer", 6, "umi5", FORWARD, REVERSE),
+        minimal_size_abundance,
+        max_open_files,
+        max_buffer_size,
+        bucket_mode,
+        max_memory_size,
+        bucket_storage,
+        1,
+        67108864,
+        "none",
+        1,
+        abundance_filter,
+        RunMetrics(),
+    )
+
+
+def read_umi_files(zip_file):
+    """
+    The read_umi_files function:
+        This function returns the content of every umi file in a directory
+        by file name.
+    """
+    umi_files = {}
+    for file_name in os.listdir(zip_file):
+        if file_name.startswith("UMI#"):
+            with open(os.path.join(zip_file, file_name), "rb") as input_file:
+                umi_files[file_name] = input_file.read()
+        else:
+            pass
+    return umi_files
+
+
+def test_a_umi_bucket_keeps_the_order_of_its_reads():
+    """
+    The test_a_umi_bucket_keeps_the_order_of_its_reads function:
+        This function checks that a UmiBucket stores every distinct read
+        once and gives the reads back in the order in which they were added.
+    """
+    records = [
+        (b">read1", b"ACGT"),
+        (b">read2", b"ACGA"),
+        (b">read3", b"ACGT"),
+        (b">read4", b"ACGT"),
+    ]
+    umi_bucket = UmiBucket()
+    for header, read in records:
+        umi_bucket.add(header, read)
+    assert umi_bucket.reads == {b"ACGT": 0, b"ACGA": 1}
+    assert umi_bucket.read_counts == [3, 1]
+    assert umi_bucket.get_records() == records
+    assert umi_bucket.get_fasta() == b"".join(
+        header + b"\n" + read + b"\n" for header, read in records
+    )
+
+
+@pytest.mark.parametrize("max_memory_size", [268435456, 300])
+def test_the_memory_buckets_write_the_umi_files_of_the_disk_mode(
+    tmp_path, max_memory_size
+):
+    """
+    The test_the_memory_buckets_write_the_umi_files_of_the_disk_mode function:
+        This function checks that UmiMemoryBuckets write the same umi files
+        and trivial reads as the disk bucket mode, when every umi fits in
+        memory and when a small memory budget spills umis to disk.
+    """
+    input_file = write_shuffled_reads(tmp_path)
+    disk_collection = collect_buckets(input_file, str(tmp_path / "disk") + "/")
+    memory_collection = collect_buckets(
+        input_file,
+        str(tmp_path / "memory") + "/",
+        bucket_mode="memory",
+        max_memory_size=max_memory_size,
+    )
+    assert read_umi_files(str(tmp_path / "memory") + "/") == read_umi_files(
+        str(tmp_path / "disk") + "/"
+    )
+    assert memory_collection[1].buckets == disk_collection[1].buckets
+
+
+def test_the_abundance_filters_write_the_same_umi_files(tmp_path):
+    """
+    The test_the_abundance_filters_write_the_same_umi_files function:
+        This function checks that the stream and count abundance filters
+        write the same umi files with a memory budget that is far too small
+        to hold the pending umis, and that these are the umi files of the
+        umis with enough reads.
+    """
+    input_file = write_shuffled_reads(tmp_path)
+    umi_files = {}
+    for abundance_filter in ["none", "count", "stream"]:
+        zip_file = str(tmp_path / abundance_filter) + "/"
+        collect_buckets(
+            input_file,
+            zip_file,
+            minimal_size_abundance="3",
+            max_memory_size=200,
+            abundance_filter=abundance_filter,
+        )
+        umi_files[abundance_filter] = read_umi_files(zip_file)
+    abundant_files = {
+        file_name: content
+        for file_name, content in umi_files["none"].items()
+        if content.count(b">") >= 3
+    }
+    assert len(abundant_files) < len(umi_files["none"])
+    assert umi_files["stream"] == umi_files["count"] == abundant_files
+
+
+def test_sorted_runs_merge_many_runs(tmp_path):
+    """
+    The test_sorted_runs_merge_many_runs function:
+        This function writes interleaved reads of many umis to UmiSortedRuns
+        with a memory budget that spills a run every few reads and at most
+        two open runs. It checks that every umi is yielded once, in the order
+        of the umi numbers, with its reads in the order in which they were
+        written, and that no run files are left afterwards.
+    """
+    zip_file = str(tmp_path) + "/"
+    generator = random.Random(2)
+    umi_reads = {}
+    with UmiSortedRuns(zip_file, 300, 2) as umi_runs:
+        for read_number in range(500):
+            umi_number = generator.randint(1, 30)
+            header = b">read" + str(read_number).encode()
+            read = b"ACGT" * generator.randint(1, 5)
+            umi_runs.write(umi_number, header, read)
+            umi_reads.setdefault(umi_number, []).append((header, read))
+    assert umi_runs.run_count > 10
+    assert len(umi_runs.run_files) <= 2
+    umi_groups = list(umi_runs.get_umi_groups())
+    assert [umi_number for umi_number, records in umi_groups] == sorted(
+        umi_reads
+    )
+    assert dict(umi_groups) == umi_reads
+    assert not [
+        file_name
+        for file_name in os.listdir(zip_file)
+        if file_name.endswith(".umi")
+    ]
+
+
+@pytest.mark.parametrize("max_buffer_size", [33554432, 100])
+def test_the_container_holds_the_umi_files(tmp_path, max_buffer_size):
+    """
+    The test_the_container_holds_the_umi_files function:
+        This function checks that every umi file in the container has the
+        content of the umi file written by the files bucket storage, also
+        when small buffers split umis over several blocks, and that umis with
+        a single block are memoryviews of the container.
+    """
+    input_file = write_shuffled_reads(tmp_path)
+    collect_buckets(input_file, str(tmp_path / "files") + "/")
+    umi_files = read_umi_files(str(tmp_path / "files") + "/")
+    umi_table, bucket_summary, bucket_container, umi_runs = collect_buckets(
+        input_file,
+        str(tmp_path / "container") + "/",
+        bucket_storage="container",
+        max_buffer_size=max_buffer_size,
+    )
+    assert bucket_container.get_file_names() == sorted(
+        umi_files, key=lambda file_name: int(file_name.split("_")[0][4:])
+    )
+    container_files = {}
+    for umi_number, file_name in zip(
+        sorted(bucket_container.umi_blocks), bucket_container.get_file_names()
+    ):
+        fasta = bucket_container.get_fasta(file_name)
+        umi_blocks = bucket_container.umi_blocks[umi_number]
+        assert isinstance(fasta, memoryview) == (len(umi_blocks) == 1)
+        container_files[file_name] = bytes(fasta)
+    assert container_files == umi_files
+    assert (
+        bucket_container.open_umi_file(file_name).read()
+        == umi_files[file_name].decode()
+    )
+    bucket_container.close_map()
+    assert bucket_container.container_map == None
+
+
+def test_a_memoryview_outlives_the_container_map(tmp_path):
+    """
+    The test_a_memoryview_outlives_the_container_map function:
+        This function checks that the memory map of the container can be
+        closed while a memoryview of a umi file is still in use.
+    """
+    umi_table, bucket_summary, bucket_container, umi_runs = collect_buckets(
+        write_shuffled_reads(tmp_path),
+        str(tmp_path) + "/",
+        bucket_storage="container",
+    )
+    file_name = bucket_container.get_file_names()[0]
+    fasta = bucket_container.get_fasta(file_name)
+    bucket_container.close_map()
+    assert bytes(fasta).startswith(b">read")
+
+
+def run_storage(run_directory, input_file, bucket_storage):
+    """
+    The run_storage function:
+        This function runs get_umi_collection with a bucket storage and a zip
+        archive. It returns the content of the tabular file, the blast file
+        and every file in the zip archive.
+    """
+    zip_file = os.path.join(run_directory, "zip") + "/"
+    cluster_directory = os.path.join(run_directory, "cluster") + "/"
+    os.makedirs(zip_file)
+    os.makedirs(cluster_directory)
+    tabular_file = os.path.join(run_directory, "output.tabular")
+    output_blast_file = os.path.join(run_directory, "output.blast.fasta")
+    zip_archive = os.path.join(run_directory, "umis.zip")
+    get_umi_collection(
+        input_file,
+        cluster_directory,
+        tabular_file,
+        zip_file,
+        output_blast_file,
+        "primer",
+        6,
+        "umi5",
+        FORWARD,
+        REVERSE,
+        "fasta",
+        ">",
+        "0.97",
+        "1",
+        RunOptions(bucket_storage=bucket_storage),
+        zip_archive,
+    )
+    with zipfile.ZipFile(zip_archive) as archive:
+        archive_files = {
+            file_name: archive.read(file_name)
+            for file_name in archive.namelist()
+        }
+    with open(tabular_file) as tabular_input, open(
+        output_blast_file
+    ) as blast_input:
+        return tabular_input.read(), blast_input.read(), archive_files
+
+
+def test_the_container_storage_gives_the_same_output(tmp_path, fake_vsearch):
+    """
+    The test_the_container_storage_gives_the_same_output function:
+        This function checks that a run with the container bucket storage
+        writes the same output files and zip archive as a run with a file for
+        every umi, with vsearch reading the umi files from the container.
+    """
+    input_file = write_shuffled_reads(tmp_path)
+    files_output = run_storage(str(tmp_path / "files"), input_file, "files")
+    container_output = run_storage(
+        str(tmp_path / "container"), input_file, "container"
+    )
+    assert len(container_output[2]) > 10
+    assert container_output == files_output
+    assert "--derep_fulllength -" in fake_vsearch.read_text()
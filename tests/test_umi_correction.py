@@ -0,0 +1,219 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import itertools
+import random
+import pytest
+from umi_isolation.isolation import (
+    UmiTable,
+    get_masked_umis,
+    get_umi_key,
+    get_umi_parents,
+    get_umi_string,
+)
+
+
+def get_umi_table(umi_counts):
+    """
+    The get_umi_table function:
+        This function returns a UmiTable with the (umi, count) pairs, the
+        umis are numbered in the given order.
+    """
+    umi_table = UmiTable()
+    for umi_string, umi_count in umi_counts:
+        for read_number in range(umi_count):
+            umi_table.add(get_umi_key(umi_string.encode()))
+    return umi_table
+
+
+def get_parents(umi_counts, umi_distance=1):
+    """
+    The get_parents function:
+        This function runs get_umi_parents on the (umi, count) pairs and
+        returns the parent of every collapsed umi as umi strings.
+    """
+    umi_parents = get_umi_parents(get_umi_table(umi_counts), umi_distance)
+    return {
+        get_umi_string(umi_key): get_umi_string(parent_key)
+        for umi_key, parent_key in umi_parents.items()
+    }
+
+
+def get_hamming_distance(umi_string, other_umi_string):
+    """
+    The get_hamming_distance function:
+        This function counts the positions in which two umis differ.
+    """
+    return sum(
+        nucleotide != other_nucleotide
+        for nucleotide, other_nucleotide in zip(umi_string, other_umi_string)
+    )
+
+
+def get_reference_parents(umi_counts, umi_distance):
+    """
+    The get_reference_parents function:
+        This function is the pair by pair reference of the directional
+        method. The umis are taken by decreasing count, ties in the order in
+        which they were found. Every umi that is not collapsed yet becomes a
+        parent and takes every umi it reaches through connections of at most
+        umi_distance differences, where the child has at most half of the
+        reads plus one of the umi it is connected to.
+    """
+    order = sorted(
+        range(len(umi_counts)), key=lambda position: -umi_counts[position][1]
+    )
+    collapsed = set()
+    parents = {}
+    for parent_position in order:
+        if parent_position in collapsed:
+            continue
+        else:
+            collapsed.add(parent_position)
+        umi_queue = [parent_position]
+        while umi_queue:
+            umi_string, umi_count = umi_counts[umi_queue.pop(0)]
+            for position, (other_string, other_count) in enumerate(umi_counts):
+                if (
+                    position not in collapsed
+                    and len(other_string) == len(umi_string)
+                    and get_hamming_distance(umi_string, other_string)
+                    <= umi_distance
+                    and umi_count >= 2 * other_count - 1
+                ):
+                    collapsed.add(position)
+                    parents[other_string] = umi_counts[parent_position][0]
+                    umi_queue.append(position)
+                else:
+                    pass
+    return parents
+
+
+@pytest.mark.parametrize("umi_distance", [1, 2, 3])
+def test_masked_umis_share_a_key_within_distance(umi_distance):
+    """
+    The test_masked_umis_share_a_key_within_distance function:
+        This function checks that get_masked_umis makes every combination of
+        umi_distance dots once, and that two umis share a masked umi exactly
+        when they differ in at most umi_distance positions.
+    """
+    umi_strings = [
+        "".join(nucleotides)
+        for nucleotides in itertools.product("ACG", repeat=4)
+    ]
+    masked_umis = {
+        umi_string: get_masked_umis(umi_string, umi_distance)
+        for umi_string in umi_strings
+    }
+    for umi_string in umi_strings:
+        assert len(masked_umis[umi_string]) == len(
+            set(masked_umis[umi_string])
+        )
+        assert all(
+            masked_umi.count(".") == min(umi_distance, 4)
+            for masked_umi in masked_umis[umi_string]
+        )
+        for other_string in umi_strings:
+            assert bool(
+                set(masked_umis[umi_string]) & set(masked_umis[other_string])
+            ) == (
+                get_hamming_distance(umi_string, other_string) <= umi_distance
+            )
+
+
+@pytest.mark.parametrize(
+    "parent_count, child_count, collapsed",
+    [(1, 1, True), (3, 2, True), (4, 2, True), (2, 2, False), (4, 3, False)],
+)
+def test_count_rule(parent_count, child_count, collapsed):
+    """
+    The test_count_rule function:
+        This function checks that a neighbour is only collapsed when the
+        parent has at least twice its reads minus one.
+    """
+    parents = get_parents([("AAAAAA", parent_count), ("AAAAAT", child_count)])
+    if collapsed:
+        assert parents == {"AAAAAT": "AAAAAA"}
+    else:
+        assert parents == {}
+
+
+def test_ties_go_to_the_first_umi():
+    """
+    The test_ties_go_to_the_first_umi function:
+        This function checks that of two neighbours with the same count, the
+        umi that was found first becomes the parent.
+    """
+    assert get_parents([("AAAAAA", 1), ("AAAAAT", 1)]) == {"AAAAAT": "AAAAAA"}
+    assert get_parents([("AAAAAT", 1), ("AAAAAA", 1)]) == {"AAAAAA": "AAAAAT"}
+
+
+def test_chained_umis_take_the_first_parent():
+    """
+    The test_chained_umis_take_the_first_parent function:
+        This function checks that umis that are connected through another
+        umi are collapsed into the parent at the start of the chain, and that
+        the chain stops where the count rule fails.
+    """
+    assert get_parents([("AAAAAA", 10), ("AAAAAT", 4), ("AAAATT", 2)]) == {
+        "AAAAAT": "AAAAAA",
+        "AAAATT": "AAAAAA",
+    }
+    assert get_parents([("AAAAAA", 10), ("AAAAAT", 4), ("AAAATT", 3)]) == {
+        "AAAAAT": "AAAAAA"
+    }
+    assert get_parents([("AAAATT", 3), ("AAAAAA", 10), ("AAAAAT", 4)]) == {
+        "AAAAAT": "AAAAAA"
+    }
+
+
+def test_umis_of_different_length_are_not_connected():
+    """
+    The test_umis_of_different_length_are_not_connected function:
+        This function checks that umis of a different length, for example
+        truncated umis, are never collapsed into each other.
+    """
+    assert get_parents([("AAAAAA", 10), ("AAAAA", 1)]) == {}
+
+
+@pytest.mark.parametrize("umi_distance", [1, 2])
+@pytest.mark.parametrize("seed", range(5))
+def test_umi_parents_match_reference(seed, umi_distance):
+    """
+    The test_umi_parents_match_reference function:
+        This function checks get_umi_parents against the pair by pair
+        reference on random umi tables.
+    """
+    random_state = random.Random(seed)
+    umi_strings = list(
+        dict.fromkeys(
+            "".join(random_state.choice("ACGT") for position in range(5))
+            for umi_number in range(150)
+        )
+    )
+    umi_counts = [
+        (umi_string, random_state.choice([1, 1, 1, 2, 3, 5, 8, 20]))
+        for umi_string in umi_strings
+    ]
+    assert get_parents(umi_counts, umi_distance) == get_reference_parents(
+        umi_counts, umi_distance
+    )
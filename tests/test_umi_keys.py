@@ -0,0 +1,115 @@
+# -----------------------------------------------------------------------------
+# Naturalis internship repository for UMI isolation tool.
+# Copyright (C) 2019 Jasper Boom
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Contact information: info@jboom.org.
+# -----------------------------------------------------------------------------
+
+
+# Imports:
+import itertools
+import random
+import re
+import pytest
+from umi_isolation.isolation import UmiTable, get_umi_key, get_umi_string
+
+
+@pytest.mark.parametrize("umi_length", [0, 1, 2, 3, 4, 8, 16, 31, 32, 33])
+def test_every_umi_of_a_length_round_trips(umi_length):
+    """
+    The test_every_umi_of_a_length_round_trips function:
+        This function packs umis of every length, all of them for the short
+        lengths, and checks that they unpack to the same umi and that
+        different umis never get the same key.
+    """
+    if umi_length <= 4:
+        umis = [
+            "".join(nucleotides)
+            for nucleotides in itertools.product("ACGT", repeat=umi_length)
+        ]
+    else:
+        generator = random.Random(umi_length)
+        umis = [
+            "".join(generator.choice("ACGT") for position in range(umi_length))
+            for umi_number in range(500)
+        ]
+    umi_keys = [get_umi_key(umi.encode()) for umi in umis]
+    assert all(isinstance(umi_key, int) for umi_key in umi_keys)
+    assert [get_umi_string(umi_key) for umi_key in umi_keys] == umis
+    assert len(set(umi_keys)) == len(set(umis))
+
+
+def test_umis_of_different_lengths_get_different_keys():
+    """
+    The test_umis_of_different_lengths_get_different_keys function:
+        This function checks that the leading 1 keeps the length of a umi, so
+        umis that only differ in leading A nucleotides are not mixed up.
+    """
+    umis = ["", "A", "AA", "AAA", "AAAC", "AC", "C"]
+    umi_keys = [get_umi_key(umi.encode()) for umi in umis]
+    assert len(set(umi_keys)) == len(umis)
+    assert [get_umi_string(umi_key) for umi_key in umi_keys] == umis
+
+
+def test_long_umis_pack_into_one_integer():
+    """
+    The test_long_umis_pack_into_one_integer function:
+        This function checks that umis longer than a machine word, like the
+        umis of a double umi search, pack into one integer with 2 bits per
+        nucleotide and unpack to the same umi.
+    """
+    umi = "ACGT" * 50
+    umi_key = get_umi_key(umi.encode())
+    assert umi_key.bit_length() == 2 * len(umi) + 1
+    assert get_umi_string(umi_key) == umi
+
+
+@pytest.mark.parametrize(
+    "umi", ["ACNGT", "NNNNNN", "ACGTR", "WSKMBDHV", "acgt", "AC-GT"]
+)
+def test_umis_with_other_characters_stay_strings(umi):
+    """
+    The test_umis_with_other_characters_stay_strings function:
+        This function checks that umis with N, other iupac codes or other
+        characters are kept as strings, that they round trip and that they
+        never get the key of a umi of only A, C, G and T.
+    """
+    umi_key = get_umi_key(umi.encode())
+    assert umi_key == umi
+    assert get_umi_string(umi_key) == umi
+    assert umi_key != get_umi_key(re.sub("[^ACGT]", "A", umi).encode())
+
+
+def test_umi_table_numbers_and_counts():
+    """
+    The test_umi_table_numbers_and_counts function:
+        This function checks that the UmiTable numbers umis from 1 in the
+        order they are found, counts every read, keeps the counts in an
+        unsigned array and names the umi files after the umi strings.
+    """
+    umi_table = UmiTable()
+    umis = ["ACGTAC", "TTTTTT", "ACGTAC", "ACNTAC", "TTTTTT", "ACGTAC"]
+    umi_numbers = [umi_table.add(get_umi_key(umi.encode())) for umi in umis]
+    assert umi_numbers == [1, 2, 1, 3, 2, 1]
+    assert umi_table.umi_counts.typecode == "I"
+    assert umi_table.umi_counts.tolist() == [3, 2, 1]
+    assert [
+        umi_table.get_file_identifier(umi_number) for umi_number in [1, 2, 3]
+    ] == [
+        "UMI#1_ACGTAC.fasta",
+        "UMI#2_TTTTTT.fasta",
+        "UMI#3_ACNTAC.fasta",
+    ]